@@ -0,0 +1,8 @@
+"""Benchmarks of the swarp_wrapper on synthetic data.
+
+Run a benchmark with
+
+    python -m swarp_wrapper.benchmark <path_benchmark>
+
+which generates overlapping synthetic cubes (or images), mosaics them with the settings of a parameter sweep and saves the wall time, peak memory and I/O of every stage as JSON. By default SWarp is replaced by the stand-in 'standin_swarp', so no SWarp installation is needed.
+"""
@@ -0,0 +1,99 @@
+import argparse
+import ast
+import os
+import sys
+
+from .runner import compare_results, load_results, run_benchmark, save_results, summarize_runs
+
+
+def parse_value(string):
+    """Interpret a value of the command line as Python literal, or else as string."""
+    try:
+        return ast.literal_eval(string)
+    except (ValueError, SyntaxError):
+        return string
+
+
+def parse_assignments(assignments, multiple=False):
+    """Parse 'name=value' (or 'name=value1,value2' if 'multiple') arguments."""
+    parameters = {}
+    for assignment in assignments:
+        if '=' not in assignment:
+            raise Exception("Expected 'name=value' instead of '{}'".format(assignment))
+        name, values = assignment.split('=', 1)
+        if multiple:
+            parameters[name] = [parse_value(value) for value in values.split(',')]
+        else:
+            parameters[name] = parse_value(values)
+    return parameters
+
+
+def print_summary(results):
+    for key, stages in summarize_runs(results).items():
+        print(key)
+        for name, measurement in sorted(
+                stages.items(), key=lambda item: -item[1]['wall_time']):
+            print("  {:<24} {:>9.3f} s {:>9.1f} MB rss {:>9.1f} MB rss (children) {:>9.1f} MB read {:>9.1f} MB written".format(
+                name, measurement['wall_time'], measurement['peak_rss'] / 1e6,
+                measurement['peak_rss_children'] / 1e6,
+                measurement['bytes_read'] / 1e6,
+                measurement['bytes_written'] / 1e6))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m swarp_wrapper.benchmark',
+        description="Benchmark the swarp_wrapper on synthetic cubes or images.")
+    parser.add_argument('path_benchmark', help="directory for the synthetic data and mosaics")
+    parser.add_argument('--kind', choices=['cubes', 'images'], default='cubes')
+    parser.add_argument('--n-inputs', type=int, default=4, help="number of cubes or images")
+    parser.add_argument('--size', type=int, default=64, help="spatial size of the inputs in pixels")
+    parser.add_argument('--n-channels', type=int, default=32, help="number of channels of the cubes")
+    parser.add_argument('--overlap', type=float, default=0.25, help="fraction by which neighbouring inputs overlap")
+    parser.add_argument('--aligned', action='store_true', help="put all inputs on a common pixel grid")
+    parser.add_argument('--sweep', nargs='*', default=[], metavar='NAME=VALUES',
+                        help="settings of 'Swarp' to sweep, e.g. n_workers=1,4 stream_assembly=False,True")
+    parser.add_argument('--set', nargs='*', default=[], metavar='NAME=VALUE',
+                        help="settings of 'Swarp' used for all runs")
+    parser.add_argument('--swarp-executable', default=None,
+                        help="SWarp executable (default: the stand-in of the benchmark package)")
+    parser.add_argument('--repeat', type=int, default=1, help="number of runs per combination of settings")
+    parser.add_argument('--output', default=None, help="JSON file for the results (default: <path_benchmark>/results.json)")
+    parser.add_argument('--compare', default=None, metavar='BASELINE', help="JSON file of earlier results to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative increase that counts as regression")
+    parser.add_argument('--keep-files', action='store_true', help="keep the synthetic data and mosaics")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(
+        args.path_benchmark, sweep=parse_assignments(args.sweep, multiple=True),
+        kind=args.kind,
+        dataset={'n_inputs': args.n_inputs, 'size': args.size,
+                 'n_channels': args.n_channels, 'overlap': args.overlap,
+                 'aligned': args.aligned},
+        settings=parse_assignments(args.set),
+        swarp_executable=args.swarp_executable, repeat=args.repeat,
+        keep_files=args.keep_files)
+
+    path_output = args.output
+    if path_output is None:
+        path_output = os.path.join(args.path_benchmark, 'results.json')
+    save_results(results, path_output)
+    print_summary(results)
+    print("saved results in {}".format(path_output))
+
+    if args.compare is not None:
+        regressions = compare_results(
+            load_results(args.compare), results, tolerance=args.tolerance)
+        for regression in regressions:
+            print("regression in '{}' ({}) of {}: {:.4g} -> {:.4g}".format(
+                regression['stage'], regression['field'],
+                regression['settings'], regression['baseline'],
+                regression['current']))
+        if regressions:
+            return 1
+        print("no regressions compared to {}".format(args.compare))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import itertools
+import json
+import os
+import platform
+import shutil
+import time
+
+from .standin_swarp import get_standin_command
+from .synthetic import make_dataset
+from ..swarp_wrapper import Swarp
+
+
+#  SWarp configuration of the benchmarks, which also works with SWarp itself
+SWARP_CONFIGURATION = """\
+IMAGEOUT_NAME    coadd.fits
+WEIGHTOUT_NAME   coadd.weight.fits
+HEADER_ONLY      N
+HEADER_SUFFIX    .head
+WEIGHT_TYPE      NONE
+COMBINE          Y
+COMBINE_TYPE     WEIGHTED
+CELESTIAL_TYPE   NATIVE
+PROJECTION_TYPE  CAR
+CENTER_TYPE      ALL
+PIXELSCALE_TYPE  MEDIAN
+IMAGE_SIZE       0
+RESAMPLE         Y
+RESAMPLING_TYPE  NEAREST
+SUBTRACT_BACK    N
+WRITE_XML        N
+VERBOSE_TYPE     QUIET
+NTHREADS         0
+"""
+
+
+def get_stage_measurements(report):
+    """Measurements of the stages of a run report, accumulated by the name of the stage."""
+    stages = {}
+    for record in report['stages']:
+        stage = stages.setdefault(record['name'], {
+            'calls': 0, 'wall_time': 0., 'peak_rss': 0, 'peak_rss_children': 0,
+            'bytes_read': 0, 'bytes_written': 0})
+        stage['calls'] += 1
+        for key in ['wall_time', 'bytes_read', 'bytes_written']:
+            stage[key] += record[key]
+        for key in ['peak_rss', 'peak_rss_children']:
+            stage[key] = max(stage[key], record[key])
+    return stages
+
+
+def get_sweep(parameters):
+    """Expand a dict of lists of values into a list of all combinations of settings."""
+    names = sorted(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(
+        *[parameters[name] for name in names])]
+
+
+def run_benchmark(path_benchmark, sweep={}, kind='cubes', dataset={},
+                  settings={}, swarp_executable=None, repeat=1,
+                  keep_files=False):
+    """Mosaic synthetic data for all combinations of settings of a parameter sweep.
+
+    Parameters
+    ----------
+    path_benchmark : str
+        Directory in which the data and the mosaics are written.
+    sweep : dict
+        Names of 'Swarp' settings and lists of values, whose combinations are benchmarked (e.g. {'n_workers': [1, 4], 'stream_assembly': [False, True]}).
+    kind : str
+        Either 'cubes' or 'images'.
+    dataset : dict
+        Keyword arguments of 'make_dataset' (e.g. 'n_inputs', 'size', 'n_channels', 'overlap').
+    settings : dict
+        'Swarp' settings that are used for all runs.
+    swarp_executable : str or list
+        SWarp executable. By default the stand-in of 'standin_swarp' is used.
+    repeat : int
+        Number of runs of each combination of settings.
+    keep_files : bool
+        Default is `False`. If set to `True`, the synthetic data and the mosaics are kept.
+
+    Returns
+    -------
+    dict
+        The 'metadata' of the benchmark and the list of 'runs', each with its 'settings', the measurements of its 'stages' and the 'total' measurement taken from the run report of the mosaic (see 'Instrumentation').
+
+    """
+    if swarp_executable is None:
+        swarp_executable = get_standin_command()
+    path_benchmark = os.path.abspath(path_benchmark)
+    path_data = os.path.join(path_benchmark, 'data')
+    list_paths = make_dataset(path_data, kind=kind, **dataset)
+
+    path_configuration = os.path.join(path_benchmark, 'benchmark.swarp')
+    with open(path_configuration, 'w') as fobj:
+        fobj.write(SWARP_CONFIGURATION)
+
+    runs = []
+    for idx, combination in enumerate(get_sweep(sweep)):
+        for iteration in range(repeat):
+            path_swarp = os.path.join(
+                path_benchmark, 'run_{:04d}_{:02d}'.format(idx, iteration))
+            if os.path.exists(path_swarp):
+                shutil.rmtree(path_swarp)
+
+            swarp = Swarp()
+            swarp.path_swarp = path_swarp
+            swarp.swarp_configuration_file = path_configuration
+            swarp.swarp_executable = swarp_executable
+            swarp.filename_final = 'benchmark_mosaic'
+            swarp.verbose = False
+            if kind == 'cubes':
+                swarp.list_cubes = list_paths
+            else:
+                swarp.list_images = list_paths
+            for name, value in dict(settings, **combination).items():
+                setattr(swarp, name, value)
+
+            if kind == 'cubes':
+                swarp.mosaic_cubes()
+            else:
+                swarp.mosaic_images()
+            report = swarp.instrumentation.report()
+            runs.append({'settings': combination, 'iteration': iteration,
+                         'stages': get_stage_measurements(report),
+                         'total': report['total']})
+
+            if not keep_files:
+                shutil.rmtree(path_swarp, ignore_errors=True)
+
+    if not keep_files:
+        shutil.rmtree(path_data, ignore_errors=True)
+        os.remove(path_configuration)
+
+    return {
+        'metadata': {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'kind': kind,
+            'dataset': dataset,
+            'settings': settings,
+            'swarp_executable': swarp_executable,
+            'repeat': repeat},
+        'runs': runs}
+
+
+def save_results(results, path_to_file):
+    with open(path_to_file, 'w') as fobj:
+        json.dump(results, fobj, indent=1, sort_keys=True, default=str)
+
+
+def load_results(path_to_file):
+    with open(path_to_file, 'r') as fobj:
+        return json.load(fobj)
+
+
+def summarize_runs(results):
+    """Best wall time and largest peak memory and I/O of each combination of settings and stage.
+
+    Returns
+    -------
+    dict
+        For each combination of settings (as JSON string) a dict of stages (including 'total') with their measurements.
+
+    """
+    summary = {}
+    for run in results['runs']:
+        key = json.dumps(run['settings'], sort_keys=True, default=str)
+        stages = dict(run['stages'], total=run['total'])
+        for name, measurement in stages.items():
+            entry = summary.setdefault(key, {}).setdefault(name, {})
+            for field, value in measurement.items():
+                if field == 'calls':
+                    continue
+                #  the fastest repetition is the least affected by noise
+                combine = min if field == 'wall_time' else max
+                entry[field] = combine(entry[field], value) if field in entry else value
+    return summary
+
+
+def compare_results(baseline, results, tolerance=0.2, min_wall_time=0.1):
+    """Compare benchmark results with a baseline.
+
+    Parameters
+    ----------
+    baseline : dict
+        Results of an earlier benchmark (see 'run_benchmark').
+    results : dict
+        Results of the current benchmark.
+    tolerance : float
+        Relative increase of a measurement that is considered a regression.
+    min_wall_time : float
+        Wall times shorter than this number of seconds in the baseline are not compared, since they are dominated by noise.
+
+    Returns
+    -------
+    list
+        For each regression a dict with the 'settings', 'stage', 'field', and the 'baseline' and 'current' value.
+
+    """
+    summary_baseline = summarize_runs(baseline)
+    regressions = []
+    for key, stages in summarize_runs(results).items():
+        for name, measurement in stages.items():
+            reference = summary_baseline.get(key, {}).get(name)
+            if reference is None:
+                continue
+            for field, value in measurement.items():
+                value_baseline = reference.get(field)
+                if not value_baseline:
+                    continue
+                if field == 'wall_time' and value_baseline < min_wall_time:
+                    continue
+                if value > value_baseline * (1 + tolerance):
+                    regressions.append({
+                        'settings': json.loads(key), 'stage': name,
+                        'field': field, 'baseline': value_baseline,
+                        'current': value})
+    return regressions
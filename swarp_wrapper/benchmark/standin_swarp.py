@@ -0,0 +1,190 @@
+"""Lightweight stand-in for the SWarp executable.
+
+It understands the subset of the SWarp command line used by the swarp_wrapper (configuration file, '@list' inputs, '.head' header templates, HEADER_ONLY, IMAGEOUT_NAME, WEIGHTOUT_NAME, MAP_WEIGHT with WEIGHT_IMAGE, CENTER_TYPE MANUAL) and co-adds the inputs with nearest-neighbour resampling and a weighted average. Its results are not a replacement for SWarp, but its I/O pattern is the same, which makes it suitable for benchmarks without a SWarp installation. Use it with
+
+    swarp.swarp_executable = standin_swarp.get_standin_command()
+"""
+import os
+import sys
+
+import numpy as np
+
+from astropy.io import fits
+from astropy.wcs import WCS
+
+
+def get_standin_command():
+    """Command that runs the stand-in, to be used as 'swarp_executable'.
+
+    The stand-in is run as a script and does not import the swarp_wrapper, so it also works in scratch directories from which the package cannot be imported.
+    """
+    return [sys.executable, os.path.abspath(__file__)]
+
+
+def read_configuration(path_to_file):
+    configuration = {}
+    with open(path_to_file, 'r') as fobj:
+        for line in fobj:
+            line = line.split('#')[0].strip()
+            if line:
+                parts = line.split(None, 1)
+                configuration[parts[0].upper()] = parts[1].strip() if len(parts) > 1 else ''
+    return configuration
+
+
+def parse_arguments(argv):
+    """Return the input files and the settings given on the command line."""
+    inputs, options, path_configuration = [], {}, None
+    idx = 0
+    while idx < len(argv):
+        argument = argv[idx]
+        if argument == '-c':
+            path_configuration = argv[idx + 1]
+            idx += 2
+        elif argument.startswith('-'):
+            options[argument[1:].upper()] = argv[idx + 1]
+            idx += 2
+        elif argument.startswith('@'):
+            with open(argument[1:], 'r') as fobj:
+                inputs += [line.strip() for line in fobj if line.strip()]
+            idx += 1
+        else:
+            inputs.append(argument)
+            idx += 1
+
+    configuration = {}
+    if path_configuration is not None:
+        configuration = read_configuration(path_configuration)
+    configuration.update(options)
+    return inputs, configuration
+
+
+def read_input(path_to_file):
+    with fits.open(path_to_file) as hdul:
+        hdu = hdul[0]
+        if hdu.data is None and len(hdul) > 1:
+            #  tile-compressed files
+            hdu = hdul[1]
+        return np.asarray(hdu.data, dtype=float), hdu.header.copy()
+
+
+def get_output_header(inputs, configuration):
+    """Size and celestial WCS of the output grid."""
+    path_template = os.path.splitext(configuration.get(
+        'IMAGEOUT_NAME', 'coadd.fits'))[0] + configuration.get(
+            'HEADER_SUFFIX', '.head')
+    if os.path.exists(path_template):
+        header = fits.Header.fromtextfile(path_template)
+    elif configuration.get('CENTER_TYPE', '').upper() == 'MANUAL':
+        wcs_ref = WCS(inputs[0][1]).celestial
+        naxis1, naxis2 = [int(value) for value in
+                          configuration['IMAGE_SIZE'].split(',')]
+        scale = float(configuration['PIXEL_SCALE'].split(',')[0]) / 3600
+        projection = configuration.get('PROJECTION_TYPE', 'TAN')
+        header = fits.Header()
+        header['NAXIS1'] = naxis1
+        header['NAXIS2'] = naxis2
+        for axis, ctype in enumerate(wcs_ref.wcs.ctype, start=1):
+            header['CTYPE{}'.format(axis)] = ctype[:5] + projection
+        header['CRVAL1'], header['CRVAL2'] = [
+            float(value) for value in configuration['CENTER'].split(',')]
+        header['CDELT1'] = -scale
+        header['CDELT2'] = scale
+        header['CRPIX1'] = (naxis1 + 1) / 2
+        header['CRPIX2'] = (naxis2 + 1) / 2
+    else:
+        #  union of the inputs on the pixel grid of the first input
+        wcs_ref = WCS(inputs[0][1]).celestial
+        xpix, ypix = [], []
+        for data, header in inputs:
+            ny, nx = data.shape
+            corners = WCS(header).celestial.all_pix2world(
+                [[0, 0], [nx - 1, 0], [0, ny - 1], [nx - 1, ny - 1]], 0)
+            pixels = wcs_ref.all_world2pix(corners, 0)
+            xpix += list(pixels[:, 0])
+            ypix += list(pixels[:, 1])
+        x0, x1 = [int(np.floor(value + 0.5)) for value in (min(xpix), max(xpix))]
+        y0, y1 = [int(np.floor(value + 0.5)) for value in (min(ypix), max(ypix))]
+        header = wcs_ref.to_header()
+        header['CRPIX1'] -= x0
+        header['CRPIX2'] -= y0
+        header['NAXIS1'] = x1 - x0 + 1
+        header['NAXIS2'] = y1 - y0 + 1
+
+    header_out = fits.Header()
+    header_out['NAXIS'] = 2
+    header_out['NAXIS1'] = header['NAXIS1']
+    header_out['NAXIS2'] = header['NAXIS2']
+    header_out.extend(WCS(header).celestial.to_header())
+    return header_out
+
+
+def coadd(inputs, header, weight_images=None):
+    """Nearest-neighbour resampling and weighted average of the inputs."""
+    ny, nx = header['NAXIS2'], header['NAXIS1']
+    ypix, xpix = np.mgrid[0:ny, 0:nx]
+    lon, lat = WCS(header).all_pix2world(xpix.ravel(), ypix.ravel(), 0)
+
+    total = np.zeros(nx * ny)
+    weight = np.zeros(nx * ny)
+    covered = np.zeros(nx * ny, dtype=bool)
+    for idx, (data, header_input) in enumerate(inputs):
+        xin, yin = WCS(header_input).celestial.all_world2pix(lon, lat, 0)
+        xin = np.floor(xin + 0.5).astype(int)
+        yin = np.floor(yin + 0.5).astype(int)
+        inside = (xin >= 0) & (yin >= 0) & (xin < data.shape[1]) & \
+            (yin < data.shape[0])
+        covered |= inside
+
+        values = np.full(nx * ny, np.nan)
+        values[inside] = data[yin[inside], xin[inside]]
+        weights = np.isfinite(values).astype(float)
+        if weight_images:
+            weight_map = fits.getdata(
+                weight_images[min(idx, len(weight_images) - 1)]).astype(float)
+            weights[inside] *= weight_map[yin[inside], xin[inside]]
+            weights[~inside] = 0
+        total += np.where(weights > 0, np.nan_to_num(values) * weights, 0)
+        weight += weights
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = np.where(weight > 0, total / weight, 0.)
+    #  like SWarp, flag pixels that are covered but have no valid data
+    result[covered & (weight == 0)] = -1e30
+    return result.reshape(ny, nx), weight.reshape(ny, nx)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    list_inputs, configuration = parse_arguments(argv)
+    inputs = [read_input(path) for path in list_inputs]
+    header = get_output_header(inputs, configuration)
+    imageout_name = configuration.get('IMAGEOUT_NAME', 'coadd.fits')
+
+    if configuration.get('HEADER_ONLY', 'N').upper().startswith('Y'):
+        header_only = fits.Header()
+        header_only['SIMPLE'] = True
+        header_only['BITPIX'] = -32
+        header_only.extend(header, strip=False)
+        header_only.tofile(imageout_name, overwrite=True)
+        return 0
+
+    weight_images = []
+    if configuration.get('WEIGHT_TYPE', 'NONE').upper() == 'MAP_WEIGHT' and \
+            configuration.get('WEIGHT_IMAGE'):
+        weight_images = configuration['WEIGHT_IMAGE'].split(',')
+    data, weight = coadd(inputs, header, weight_images)
+
+    fits.PrimaryHDU(data.astype(np.float32), header=header).writeto(
+        imageout_name, overwrite=True)
+    fits.PrimaryHDU(weight.astype(np.float32), header=header).writeto(
+        configuration.get('WEIGHTOUT_NAME', 'coadd.weight.fits'),
+        overwrite=True)
+    with open(configuration.get('XML_NAME', 'swarp.xml'), 'w') as fobj:
+        fobj.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import os
+
+import numpy as np
+
+from astropy.io import fits
+from astropy.wcs import WCS
+
+from ..fits_io_functions import create_fits_file
+
+
+def make_header(center, size, n_channels=None, pixel_scale=10., v_start=-50e3,
+                dv=500., reference=None):
+    """FITS header of a synthetic PPV cube or image in Galactic coordinates.
+
+    Parameters
+    ----------
+    center : tuple
+        Galactic longitude and latitude of the center in degrees.
+    size : int
+        Number of pixels along both spatial axes.
+    n_channels : int
+        Number of spectral channels. If `None`, the header of an image is returned.
+    pixel_scale : float
+        Pixel scale in arcseconds.
+    v_start : float
+        Radio velocity of the first channel in m/s.
+    dv : float
+        Channel width in m/s.
+    reference : tuple
+        Galactic longitude and latitude of the reference point of a common pixel grid. If given, the projection of all inputs shares this reference point, so their pixels are aligned; otherwise each input is projected around its own center.
+
+    Returns
+    -------
+    astropy.io.fits.Header
+
+    """
+    scale = pixel_scale / 3600
+    header = fits.Header()
+    header['SIMPLE'] = True
+    header['BITPIX'] = -32
+    header['NAXIS'] = 2 if n_channels is None else 3
+    header['NAXIS1'] = size
+    header['NAXIS2'] = size
+    if n_channels is not None:
+        header['NAXIS3'] = n_channels
+    header['CTYPE1'] = 'GLON-CAR'
+    header['CTYPE2'] = 'GLAT-CAR'
+    header['CDELT1'] = -scale
+    header['CDELT2'] = scale
+    header['CUNIT1'] = 'deg'
+    header['CUNIT2'] = 'deg'
+    if reference is None:
+        header['CRVAL1'], header['CRVAL2'] = center
+        header['CRPIX1'] = (size + 1) / 2
+        header['CRPIX2'] = (size + 1) / 2
+    else:
+        header['CRVAL1'], header['CRVAL2'] = reference
+        header['CRPIX1'] = (size + 1) / 2 - round(
+            (center[0] - reference[0]) / -scale)
+        header['CRPIX2'] = (size + 1) / 2 - round(
+            (center[1] - reference[1]) / scale)
+    if n_channels is not None:
+        header['CTYPE3'] = 'VRAD'
+        header['CRVAL3'] = v_start
+        header['CDELT3'] = dv
+        header['CRPIX3'] = 1
+        header['CUNIT3'] = 'm/s'
+    header['BUNIT'] = 'K'
+    return header
+
+
+def get_clouds(center, extent, n_clouds=20, velocity_range=(-40e3, 40e3),
+               seed=0):
+    """Random Gaussian clouds (l, b, v, amplitude, size, line width) in world coordinates."""
+    rng = np.random.RandomState(seed)
+    return np.column_stack([
+        center[0] + rng.uniform(-0.5, 0.5, n_clouds) * extent,
+        center[1] + rng.uniform(-0.5, 0.5, n_clouds) * extent,
+        rng.uniform(velocity_range[0], velocity_range[1], n_clouds),
+        rng.uniform(1., 10., n_clouds),
+        rng.uniform(0.05, 0.2, n_clouds) * extent,
+        rng.uniform(1e3, 5e3, n_clouds)])
+
+
+def write_synthetic_file(path_to_file, header, clouds, noise=0.1, seed=0):
+    """Write a cube or image with the emission of 'clouds' plus Gaussian noise.
+
+    The emission is evaluated at the world coordinates of the pixels, so overlapping inputs contain the same signal. Cubes are written channel by channel into a memory-mapped file, so also large cubes can be created with little memory.
+    """
+    rng = np.random.RandomState(seed)
+    wcs = WCS(header)
+    ny, nx = header['NAXIS2'], header['NAXIS1']
+    ypix, xpix = np.mgrid[0:ny, 0:nx]
+    lon, lat = wcs.celestial.wcs_pix2world(xpix, ypix, 0)
+    lon = (lon - clouds[0, 0] + 180) % 360 - 180 + clouds[0, 0]
+
+    #  spatial profiles of the clouds are shared by all channels
+    profiles = [amplitude * np.exp(-0.5 * ((lon - l) ** 2 + (lat - b) ** 2) / size ** 2)
+                for l, b, v, amplitude, size, width in clouds]
+
+    if header['NAXIS'] == 2:
+        shape = (ny, nx)
+        velocities = [None]
+    else:
+        shape = (header['NAXIS3'], ny, nx)
+        velocities = wcs.spectral.wcs_pix2world(
+            np.arange(header['NAXIS3']), 0)[0]
+
+    data = create_fits_file(path_to_file, header, shape, overwrite=True)
+    for idx, velocity in enumerate(velocities):
+        plane = rng.normal(0., noise, (ny, nx))
+        for profile, cloud in zip(profiles, clouds):
+            if velocity is None:
+                plane += profile
+            else:
+                plane += profile * np.exp(
+                    -0.5 * (velocity - cloud[2]) ** 2 / cloud[5] ** 2)
+        if velocity is None:
+            data[:] = plane
+        else:
+            data[idx] = plane
+    data.flush()
+    del data
+
+
+def make_dataset(path_data, kind='cubes', n_inputs=4, size=64, n_channels=32,
+                 overlap=0.25, pixel_scale=10., noise=0.1, aligned=False,
+                 center=(30., 0.), seed=0):
+    """Create overlapping synthetic cubes or images on a regular grid of pointings.
+
+    Parameters
+    ----------
+    path_data : str
+        Directory in which the FITS files are written.
+    kind : str
+        Either 'cubes' or 'images'.
+    n_inputs : int
+        Number of cubes or images, which are arranged in rows of ceil(sqrt(n_inputs)) pointings.
+    size : int
+        Number of pixels along both spatial axes of the inputs.
+    n_channels : int
+        Number of spectral channels of the cubes.
+    overlap : float
+        Fraction of 'size' by which neighbouring inputs overlap.
+    pixel_scale : float
+        Pixel scale in arcseconds.
+    noise : float
+        Standard deviation of the Gaussian noise.
+    aligned : bool
+        If set to `True`, all inputs are on a common pixel grid.
+    center : tuple
+        Galactic longitude and latitude of the center of the dataset in degrees.
+    seed : int
+        Seed of the random number generator.
+
+    Returns
+    -------
+    list
+        Paths to the FITS files.
+
+    """
+    if kind not in ['cubes', 'images']:
+        raise Exception("'kind' needs to be 'cubes' or 'images'")
+    if not 0 <= overlap < 1:
+        raise Exception("'overlap' needs to be in the range [0, 1)")
+    if not os.path.exists(path_data):
+        os.makedirs(path_data)
+
+    n_columns = int(np.ceil(np.sqrt(n_inputs)))
+    n_rows = int(np.ceil(n_inputs / n_columns))
+    step = size * (1 - overlap) * pixel_scale / 3600
+    extent = (max(n_columns, n_rows) - 1) * step + size * pixel_scale / 3600
+    clouds = get_clouds(center, extent, seed=seed)
+
+    list_paths = []
+    for idx in range(n_inputs):
+        row, column = divmod(idx, n_columns)
+        pointing = (center[0] - (column - (n_columns - 1) / 2) * step,
+                    center[1] + (row - (n_rows - 1) / 2) * step)
+        header = make_header(
+            pointing, size, n_channels=n_channels if kind == 'cubes' else None,
+            pixel_scale=pixel_scale, reference=center if aligned else None)
+        path_to_file = os.path.join(
+            path_data, '{}_{:04d}.fits'.format(kind[:-1], idx))
+        write_synthetic_file(path_to_file, header, clouds, noise=noise,
+                             seed=seed + idx + 1)
+        list_paths.append(path_to_file)
+    return list_paths
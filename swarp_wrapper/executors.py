@@ -0,0 +1,281 @@
+import os
+import pickle
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def get_queue_path(path_swarp):
+    """Directory of the work queue of a mosaic."""
+    return os.path.join(os.path.abspath(path_swarp), 'queue')
+
+
+def write_pickle(path_to_file, item):
+    """Pickle an item to a file atomically, so readers never see partial files."""
+    path_tmp = os.path.join(os.path.dirname(path_to_file), '.{}.{}'.format(
+        os.path.basename(path_to_file), uuid.uuid4().hex))
+    with open(path_tmp, 'wb') as fobj:
+        pickle.dump(item, fobj)
+    os.replace(path_tmp, path_to_file)
+
+
+def read_pickle(path_to_file):
+    with open(path_to_file, 'rb') as fobj:
+        return pickle.load(fobj)
+
+
+class SerialExecutor(object):
+    """Run tasks one after another in the current process."""
+    def map(self, function, tasks):
+        """Yield the results of 'function' for all tasks."""
+        for task in tasks:
+            yield function(task)
+
+    def close(self):
+        pass
+
+
+class PoolExecutor(object):
+    """Run tasks on a pool of local processes.
+
+    Parameters
+    ----------
+    n_workers : int
+        Number of processes.
+
+    """
+    def __init__(self, n_workers):
+        self.n_workers = n_workers
+
+    def map(self, function, tasks):
+        """Yield the results of 'function' for all tasks as they complete."""
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            futures = [executor.submit(function, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def close(self):
+        pass
+
+
+class WorkQueueExecutor(object):
+    """Run tasks on independent worker processes through a work queue on a shared filesystem.
+
+    The tasks are written in chunks of 'chunk_size' tasks to the directory 'tasks' of the queue. Worker processes, which can be started on any host that mounts the queue (`python -m swarp_wrapper.worker <path_swarp>`), claim a chunk by atomically creating its lock file in 'locks', run its tasks and write the results to 'results'. The results are yielded as soon as they appear. Chunks whose lock file was not refreshed by its worker for 'stale_timeout' seconds are claimed again by other workers.
+
+    Parameters
+    ----------
+    path_queue : str
+        Directory of the work queue (see 'get_queue_path').
+    chunk_size : int
+        Number of tasks (e.g. channels) that are claimed by a worker at once.
+    poll_interval : float
+        Interval in seconds in which the queue is checked for results.
+    n_local_workers : int
+        Number of worker processes that are started on the local host.
+    stale_timeout : float
+        Chunks whose lock was not refreshed for this number of seconds are claimed again by the local workers.
+
+    """
+    def __init__(self, path_queue, chunk_size=1, poll_interval=1.0,
+                 n_local_workers=0, stale_timeout=60):
+        self.path_queue = path_queue
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.n_local_workers = n_local_workers
+        self.stale_timeout = stale_timeout
+        self.local_workers = []
+
+        for name in ['tasks', 'locks', 'results']:
+            path = os.path.join(path_queue, name)
+            if not os.path.exists(path):
+                os.makedirs(path)
+
+    def start_local_workers(self):
+        #  the workers need to import this package, even if it is not installed
+        env = os.environ.copy()
+        path_package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(
+            [path_package] + [path for path in [env.get('PYTHONPATH')] if path])
+        path_swarp = os.path.dirname(self.path_queue)
+        while len(self.local_workers) < self.n_local_workers:
+            self.local_workers.append(subprocess.Popen(
+                [sys.executable, '-m', 'swarp_wrapper.worker', path_swarp,
+                 '--poll-interval', str(self.poll_interval),
+                 '--stale-timeout', str(self.stale_timeout)], env=env))
+
+    def map(self, function, tasks):
+        """Yield the results of 'function' for all tasks as they complete."""
+        tasks = list(tasks)
+        batch = uuid.uuid4().hex[:8]
+        pending = []
+        for start in range(0, len(tasks), self.chunk_size):
+            name = '{}_{:06d}.pkl'.format(batch, len(pending))
+            write_pickle(os.path.join(self.path_queue, 'tasks', name), {
+                'function': function,
+                'tasks': tasks[start:start + self.chunk_size]})
+            pending.append(name)
+        if pending:
+            self.start_local_workers()
+
+        while pending:
+            for name in list(pending):
+                path_result = os.path.join(self.path_queue, 'results', name)
+                if not os.path.exists(path_result):
+                    continue
+                result = read_pickle(path_result)
+                for path in [os.path.join(self.path_queue, 'tasks', name),
+                             os.path.join(self.path_queue, 'locks', name),
+                             path_result]:
+                    if os.path.exists(path):
+                        os.remove(path)
+                pending.remove(name)
+
+                for item in result['results']:
+                    yield item
+                if result['error'] is not None:
+                    raise Exception("Task failed on worker {}:\n{}".format(
+                        result['worker'], result['error']))
+
+            if pending:
+                if self.local_workers and all(
+                        worker.poll() is not None for worker in self.local_workers):
+                    raise Exception("All local workers of the work queue exited with {} unfinished task(s).".format(
+                        len(pending)))
+                time.sleep(self.poll_interval)
+
+    def close(self):
+        """Remove the work queue, which also makes all workers exit."""
+        shutil.rmtree(self.path_queue, ignore_errors=True)
+        for worker in self.local_workers:
+            try:
+                worker.wait(timeout=10 * self.poll_interval + 10)
+            except subprocess.TimeoutExpired:
+                worker.terminate()
+        self.local_workers = []
+
+
+def claim_task(path_queue, worker_id, stale_timeout=None):
+    """Claim the next unclaimed chunk of the work queue.
+
+    Returns
+    -------
+    str
+        Name of the claimed chunk or `None` if there is none.
+
+    """
+    path_tasks = os.path.join(path_queue, 'tasks')
+    try:
+        names = sorted(os.listdir(path_tasks))
+    except FileNotFoundError:
+        return None
+
+    for name in names:
+        if name.startswith('.') or os.path.exists(
+                os.path.join(path_queue, 'results', name)):
+            continue
+        path_lock = os.path.join(path_queue, 'locks', name)
+        if stale_timeout is not None:
+            try:
+                if time.time() - os.path.getmtime(path_lock) > stale_timeout:
+                    #  only one worker succeeds in moving the stale lock away
+                    os.rename(path_lock, '{}.stale.{}'.format(
+                        path_lock, uuid.uuid4().hex))
+            except OSError:
+                pass
+        try:
+            fd = os.open(path_lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError:
+            continue
+        with os.fdopen(fd, 'w') as fobj:
+            fobj.write(worker_id)
+        return name
+    return None
+
+
+def run_task(path_queue, name, worker_id, heartbeat_interval=1.0):
+    """Run a claimed chunk of the work queue and write its results."""
+    path_lock = os.path.join(path_queue, 'locks', name)
+    stop = threading.Event()
+
+    def heartbeat():
+        #  keep the lock fresh, so the chunk is not considered stale
+        while not stop.wait(heartbeat_interval):
+            try:
+                os.utime(path_lock)
+            except OSError:
+                return
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+
+    results, error = [], None
+    try:
+        item = read_pickle(os.path.join(path_queue, 'tasks', name))
+        for task in item['tasks']:
+            results.append(item['function'](task))
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        stop.set()
+        thread.join()
+
+    write_pickle(os.path.join(path_queue, 'results', name), {
+        'results': results, 'error': error, 'worker': worker_id})
+
+
+def run_worker(path_queue, poll_interval=1.0, idle_timeout=300,
+               stale_timeout=60):
+    """Process chunks of the work queue until it is removed or stays idle.
+
+    Parameters
+    ----------
+    path_queue : str
+        Directory of the work queue.
+    poll_interval : float
+        Interval in seconds in which the queue is checked for new chunks.
+    idle_timeout : float
+        The worker exits if it did not find any work for this number of seconds.
+    stale_timeout : float
+        Chunks whose lock was not refreshed for this number of seconds are claimed again.
+
+    Returns
+    -------
+    int
+        Number of processed chunks.
+
+    """
+    worker_id = '{}:{}'.format(socket.gethostname(), os.getpid())
+    heartbeat_interval = poll_interval
+    if stale_timeout is not None:
+        heartbeat_interval = min(poll_interval, stale_timeout / 4)
+    seen_queue = False
+    last_work = time.time()
+    n_chunks = 0
+    while True:
+        if os.path.isdir(path_queue):
+            seen_queue = True
+        elif seen_queue:
+            #  the queue was removed after the mosaic was finished
+            break
+
+        name = claim_task(path_queue, worker_id, stale_timeout=stale_timeout)
+        if name is None:
+            if time.time() - last_work > idle_timeout:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        run_task(path_queue, name, worker_id,
+                 heartbeat_interval=heartbeat_interval)
+        n_chunks += 1
+        last_work = time.time()
+
+    return n_chunks
@@ -4,6 +4,7 @@ import warnings
 
 import numpy as np
 
+from astropy import units as u
 from astropy.io import fits
 from astropy.wcs import WCS
 from datetime import datetime
@@ -149,34 +150,83 @@ def remove_additional_axes(data, header, max_dim=3,
     if header['NAXIS'] <= max_dim and wcs.wcs.naxis <= max_dim:
         return data, header
 
-    warnings.warn('remove additional axes (Stokes, etc.) from cube and/or header')
-
     while data.ndim > max_dim:
         data = np.squeeze(data, axis=(0,))
 
+    if keep_only_wcs_keywords:
+        warnings.warn('remove additional axes (Stokes, etc.) from cube and/or header')
+        while wcs.wcs.naxis > max_dim:
+            axes = range(wcs.wcs.naxis)
+            wcs = wcs.dropaxis(axes[-1])
+        hdu = fits.PrimaryHDU(data=data, header=wcs.to_header())
+        return hdu.data, hdu.header
+
+    header = remove_additional_axes_from_header(header, max_dim=max_dim)
+
+    return data, header
+
+
+def remove_additional_axes_from_header(header, max_dim=3):
+    """Remove additional axes (Stokes, etc.) from the FITS header of a spectral cube.
+
+    Header-only counterpart of `remove_additional_axes`, which can be used if the data is read in plane by plane and thus never has to be squeezed.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        Header of the FITS array.
+    max_dim : int
+        Maximum number of dimensions the WCS of the header should have. The default value is '3'.
+
+    Returns
+    -------
+    header : astropy.io.fits.Header
+        Updated FITS header.
+
+    """
+    wcs = WCS(header)
+
+    if header['NAXIS'] <= max_dim and wcs.wcs.naxis <= max_dim:
+        return header
+
+    warnings.warn('remove additional axes (Stokes, etc.) from cube and/or header')
+
     wcs_header_old = wcs.to_header()
     while wcs.wcs.naxis > max_dim:
         axes = range(wcs.wcs.naxis)
         wcs = wcs.dropaxis(axes[-1])
     wcs_header_new = wcs.to_header()
 
-    if keep_only_wcs_keywords:
-        hdu = fits.PrimaryHDU(data=data, header=wcs_header_new)
-        return hdu.data, hdu.header
-
     wcs_header_diff = fits.HeaderDiff(wcs_header_old, wcs_header_new)
     header_diff = fits.HeaderDiff(header, wcs_header_new)
     update_header(header, remove_keywords=wcs_header_diff.diff_keywords[0],
                   update_keywords=header_diff.diff_keyword_values,
                   write_meta=False)
 
-    return data, header
+    return header
+
+
+#  keys of a cube header that describe its spectral axis and the unit of the data
+SPECTRAL_AXIS_KEYS = ['CTYPE3', 'CRVAL3', 'CDELT3', 'CRPIX3', 'CUNIT3', 'CD3_3',
+                      'PC3_3', 'SPECSYS', 'RESTFRQ', 'RESTFREQ', 'BUNIT']
+
+
+def restore_spectral_axis_keys(header_new, header_old):
+    """Copy the keys describing the spectral axis and the unit of the data from a cube header."""
+    for key in SPECTRAL_AXIS_KEYS:
+        if key in header_old.keys():
+            header_new[key] = header_old[key]
+            header_new.comments[key] = header_old.comments[key]
+    return header_new
 
 
 def restore_header_keys(header_new, header_old, remove_keys=[]):
     diff = fits.HeaderDiff(header_old, header_new)
     diff_keys = diff.diff_keywords[0]
     for key in diff_keys:
+        #  the data axes are described by the new header only
+        if key.startswith('NAXIS'):
+            continue
         header_new[key] = header_old[key]
         header_new.comments[key] = header_old.comments[key]
 
@@ -218,3 +268,186 @@ def transform_header_from_crota_to_pc(header):
             header.remove(key)
 
     return header
+
+
+def get_channels_within(pixels, tolerance=1e-6):
+    """Range of channels (start, stop) whose centers lie within the lowest and highest of the positions 'pixels' on a spectral axis.
+
+    The 'tolerance' (in channels) keeps channels whose centers lie exactly on the limits despite rounding errors of the WCS transformation.
+    """
+    start = int(np.ceil(min(pixels) - tolerance))
+    stop = int(np.floor(max(pixels) + tolerance)) + 1
+    return start, stop
+
+
+def get_channel_range(header, spectral_range, unit='channel'):
+    """Convert a spectral range into a range of channels of a spectral cube.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        Header of the spectral cube.
+    spectral_range : tuple
+        Start and end of the range, either as channels or in world coordinates of the spectral axis. Channel ranges include the start but not the end channel (like 'range'); either value can be `None` to select all channels from the first or up to the last channel. Ranges in world coordinates include all channels whose centers lie within the range, regardless of the order of the values.
+    unit : str
+        'channel' or a unit of the spectral axis (e.g. 'km/s', 'GHz').
+
+    Returns
+    -------
+    start, stop : int
+        First and last + 1 channel of the range, clipped to the channels of the cube.
+
+    """
+    n_channels = header['NAXIS3']
+    if unit == 'channel':
+        start, stop = spectral_range
+        start = 0 if start is None else int(start)
+        stop = n_channels if stop is None else int(stop)
+    else:
+        wcs_spectral = WCS(header).spectral
+        unit_spectral = u.Unit(wcs_spectral.wcs.cunit[0])
+        values = u.Quantity(spectral_range, unit).to_value(
+            unit_spectral, equivalencies=u.spectral())
+        pixels = wcs_spectral.wcs_world2pix(values, 0)[0]
+        start, stop = get_channels_within(pixels)
+    return max(start, 0), min(stop, n_channels)
+
+
+def select_spectral_channels(header, start, n_channels, binning=1):
+    """Update the spectral axis of a cube header for a range of (binned) channels.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        Header of the spectral cube, which is updated in place.
+    start : int
+        First channel of the range.
+    n_channels : int
+        Number of channels after binning.
+    binning : int
+        Number of channels that are averaged into one channel.
+
+    Returns
+    -------
+    astropy.io.fits.Header
+        Updated FITS header.
+
+    """
+    header['NAXIS3'] = n_channels
+    #  the center of a binned channel is the mean of the centers of its channels
+    header['CRPIX3'] = (header.get('CRPIX3', 1.) - start - (binning + 1) / 2) / binning + 1
+    if 'CD3_3' in header.keys():
+        header['CD3_3'] = header['CD3_3'] * binning
+    else:
+        header['CDELT3'] = header.get('CDELT3', 1.) * binning
+    return header
+
+
+def get_common_spectral_grid(headers, channel_range=None, binning=1):
+    """Common spectral grid of cubes, with the channel width and channel positions of the first cube.
+
+    Parameters
+    ----------
+    headers : list
+        FITS headers of the spectral cubes, which need to have the same type of spectral axis (e.g. all velocity or all frequency).
+    channel_range : tuple
+        Range of channels (start, stop) of the first cube that is covered by the grid. By default the grid extends over the channels of all cubes.
+    binning : int
+        Number of channels of the grid that are averaged into one channel.
+
+    Returns
+    -------
+    dict
+        The 'ctype' and 'unit' of the spectral axis, the world coordinate of the center of the first (unbinned) channel 'start', the channel width 'step', the number of binned channels 'n_channels' and the 'binning' factor.
+
+    """
+    wcs_ref = WCS(headers[0]).spectral
+    if wcs_ref.naxis == 0:
+        raise Exception("Aligning the spectral axes requires cubes with a spectral WCS")
+    ctype = wcs_ref.wcs.ctype[0][:4]
+    unit = u.Unit(wcs_ref.wcs.cunit[0])
+    world_start, world_next = wcs_ref.pixel_to_world_values(np.array([0., 1.]))
+
+    if channel_range is None:
+        pixels = []
+        for header in headers:
+            wcs = WCS(header).spectral
+            if wcs.naxis == 0 or wcs.wcs.ctype[0][:4] != ctype:
+                raise Exception("Cannot align the spectral axes of type {} and {}".format(
+                    ctype, wcs.wcs.ctype[0][:4] if wcs.naxis else None))
+            world = wcs.pixel_to_world_values(
+                np.array([0., header['NAXIS3'] - 1.]))
+            world = (world * u.Unit(wcs.wcs.cunit[0])).to_value(unit)
+            pixels += list(wcs_ref.world_to_pixel_values(world))
+        start, stop = get_channels_within(pixels)
+    else:
+        start, stop = channel_range
+
+    return {'ctype': ctype, 'unit': unit.to_string('fits'),
+            'start': float(world_start + start * (world_next - world_start)),
+            'step': float(world_next - world_start),
+            'n_channels': max(stop - start, 0) // binning,
+            'binning': binning}
+
+
+def get_spectral_positions(header, grid):
+    """Pixel positions on the spectral axis of a cube of all (unbinned) channels of a spectral grid."""
+    wcs = WCS(header).spectral
+    if wcs.naxis == 0 or wcs.wcs.ctype[0][:4] != grid['ctype']:
+        raise Exception("Cannot align the spectral axes of type {} and {}".format(
+            grid['ctype'], wcs.wcs.ctype[0][:4] if wcs.naxis else None))
+    world = grid['start'] + grid['step'] * np.arange(
+        grid['n_channels'] * grid['binning'])
+    world = u.Quantity(world, grid['unit']).to_value(u.Unit(wcs.wcs.cunit[0]))
+    return wcs.world_to_pixel_values(world)
+
+
+def get_channel_coverage(header, grid, tolerance=1e-3):
+    """Range of channels (start, stop) of a spectral grid that lie within the spectral axis of a cube.
+
+    A binned channel is covered if all of its channels lie within the centers of the first and last channel of the cube (within 'tolerance' channels), so that they can be interpolated.
+    """
+    positions = get_spectral_positions(header, grid)
+    inside = (positions > -tolerance) & (
+        positions < header['NAXIS3'] - 1 + tolerance)
+    covered = np.flatnonzero(inside.reshape(-1, grid['binning']).all(axis=1))
+    if len(covered) == 0:
+        return 0, 0
+    return int(covered[0]), int(covered[-1]) + 1
+
+
+def set_spectral_grid(header, grid):
+    """Update the spectral axis of a cube header to a (binned) spectral grid.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        Header of the spectral cube, which is updated in place.
+    grid : dict
+        Spectral grid (see 'get_common_spectral_grid').
+
+    Returns
+    -------
+    astropy.io.fits.Header
+        Updated FITS header.
+
+    """
+    binning = grid['binning']
+    #  the values are given in the unit that WCS uses for the spectral axis,
+    #  which is also the unit of headers without 'CUNIT3'
+    unit = u.Unit(WCS(header).spectral.wcs.cunit[0])
+    start, step = u.Quantity([grid['start'], grid['step']],
+                             grid['unit']).to_value(unit)
+    if 'CUNIT3' in header.keys():
+        header['CUNIT3'] = unit.to_string('fits')
+    header['NAXIS3'] = grid['n_channels']
+    header['CRPIX3'] = 1.
+    #  the center of a binned channel is the mean of the centers of its channels
+    header['CRVAL3'] = start + (binning - 1) / 2 * step
+    if 'CD3_3' in header.keys():
+        header['CD3_3'] = step * binning
+    else:
+        header['CDELT3'] = step * binning
+        if 'PC3_3' in header.keys():
+            header['PC3_3'] = 1.
+    return header
@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+
+from astropy.io import fits
+
+
+def get_padded_size(n_bytes):
+    """Size of a FITS data unit of 'n_bytes' padded to multiples of 2880 bytes."""
+    return -(-n_bytes // 2880) * 2880
+
+
+def order_primary_keys(header, bitpix=None):
+    """Move the mandatory keys of a primary FITS header to its start, in the order required by the FITS standard.
+
+    SIMPLE, BITPIX, NAXIS and NAXISn are placed before all other keys, since headers of SWarp templates or headers built from a WCS can have them anywhere. The header is updated in place.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        FITS header with the NAXIS* keywords of the data.
+    bitpix : int
+        Value of BITPIX. By default the value of the header (or -32) is kept.
+
+    Returns
+    -------
+    astropy.io.fits.Header
+        Updated FITS header.
+
+    """
+    if bitpix is None:
+        bitpix = header.get('BITPIX', -32)
+    naxis = header.get('NAXIS', 0)
+    cards = [('SIMPLE', True), ('BITPIX', bitpix), ('NAXIS', naxis)]
+    cards += [('NAXIS{}'.format(axis), header['NAXIS{}'.format(axis)])
+              for axis in range(1, naxis + 1)]
+    for key, value in cards:
+        header.remove(key, ignore_missing=True)
+    for idx, card in enumerate(cards):
+        header.insert(idx, card)
+    return header
+
+
+def create_fits_file(path_to_file, header, shape, dtype=np.float32,
+                     overwrite=False):
+    """Write a FITS header and preallocate its data unit on disk.
+
+    The data unit is created as a sparse, zero-filled file, so no memory is needed for the data array. The data can then be filled in plane by plane via the returned memory-mapped array.
+
+    Parameters
+    ----------
+    path_to_file : str
+        Path to the FITS file.
+    header : astropy.io.fits.Header
+        FITS header. The BITPIX and NAXIS* keywords are updated to match 'dtype' and 'shape'.
+    shape : tuple
+        Shape of the data array in NumPy order (i.e. (NAXIS3, NAXIS2, NAXIS1)).
+    dtype : numpy.dtype
+        Floating point data type of the data array. The default is 'numpy.float32'.
+    overwrite : bool
+        Default is `False`. If set to `True`, an already existing file is overwritten.
+
+    Returns
+    -------
+    numpy.memmap
+        Writable memory-mapped data array of the FITS file.
+
+    """
+    if os.path.exists(path_to_file) and not overwrite:
+        raise OSError("File '{}' already exists.".format(path_to_file))
+
+    dtype = np.dtype(dtype)
+    header = header.copy()
+    header['NAXIS'] = len(shape)
+    for axis, size in enumerate(shape[::-1], start=1):
+        header['NAXIS{}'.format(axis)] = size
+    for key in list(header.keys()):
+        if key.startswith('NAXIS') and key[5:].isdigit() and int(key[5:]) > len(shape):
+            header.remove(key)
+    header = order_primary_keys(header, bitpix=-8 * dtype.itemsize)
+    for key in ['BSCALE', 'BZERO', 'BLANK']:
+        if key in header.keys():
+            header.remove(key)
+
+    header.tofile(path_to_file, overwrite=True)
+    header_size = os.path.getsize(path_to_file)
+
+    padded_size = get_padded_size(int(np.prod(shape)) * dtype.itemsize)
+    with open(path_to_file, 'rb+') as fobj:
+        fobj.truncate(header_size + padded_size)
+
+    return np.memmap(path_to_file, dtype=dtype.newbyteorder('>'), mode='r+',
+                     offset=header_size, shape=tuple(shape))
+
+
+def get_data_and_header(hdu):
+    """Return the data array and a primary FITS header of an HDU or a tuple (data, header).
+
+    The BITPIX and NAXIS* keywords of the header are set from the data, so the headers of image extensions or headers without the data keywords can be used as well. The data is not copied.
+
+    Parameters
+    ----------
+    hdu : astropy.io.fits.ImageHDU or tuple
+        HDU object (anything with 'data' and 'header' attributes) or tuple (data, header).
+
+    Returns
+    -------
+    data : numpy.ndarray
+        Data array.
+    header : astropy.io.fits.Header
+        Copy of the header, updated to match the data.
+
+    """
+    if isinstance(hdu, (tuple, list)):
+        data, header = hdu
+    else:
+        data, header = hdu.data, hdu.header
+    if data is None:
+        raise Exception("The HDU of an input does not contain any data")
+
+    header = fits.Header() if header is None else header.copy()
+    for key in ['XTENSION', 'PCOUNT', 'GCOUNT']:
+        if key in header.keys():
+            header.remove(key)
+    hdu = fits.PrimaryHDU(data=np.asarray(data), header=header)
+    return hdu.data, hdu.header
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from astropy.coordinates import SkyCoord
+from astropy.io import fits
+from astropy.wcs import WCS
+
+from .swarp_helper import get_edge_coordinates
+from .tiling import FootprintIndex
+
+
+def read_header_entry(path_to_file, n_edge_points=50):
+    """Read the FITS header of a file and the sky coordinates of its borders.
+
+    Returns
+    -------
+    dict
+        Contains the 'size' and modification time 'mtime_ns' of the file, its 'header' as string and its celestial 'footprint' as 'frame' name and 'lon' and 'lat' of 'n_edge_points' points along each border (`None` if the header has no celestial WCS).
+
+    """
+    stat = os.stat(path_to_file)
+    header = fits.getheader(path_to_file)
+    footprint = None
+    if WCS(header).has_celestial:
+        coords = get_edge_coordinates(header, n_edge_points)
+        footprint = {'frame': coords.frame.name,
+                     'lon': coords.spherical.lon.deg.tolist(),
+                     'lat': coords.spherical.lat.deg.tolist()}
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'header': header.tostring(), 'footprint': footprint,
+            'n_edge_points': n_edge_points}
+
+
+def get_footprint_coordinates(entry):
+    """Sky coordinates of the border points of an index entry (`None` without celestial WCS)."""
+    footprint = entry['footprint']
+    if footprint is None:
+        return None
+    return SkyCoord(footprint['lon'], footprint['lat'], unit='deg',
+                    frame=footprint['frame'])
+
+
+class HeaderIndex(object):
+    """Index of the FITS headers and footprints of input files.
+
+    Reading the header of a FITS file means opening it, which on network filesystems can take longer than the work done with it. The index reads the header of each input once, together with the sky coordinates of its borders, and keeps them in memory for all stages of a mosaic; the output grid and the inputs of each tile are determined from these footprints. If 'path_to_file' is given, the index is also saved as JSON file and reused by later mosaics; entries of files whose size or modification time changed are read again.
+
+    Parameters
+    ----------
+    path_to_file : str
+        Path to the JSON file of the index. By default the index is only kept in memory.
+    n_workers : int
+        Number of threads that read headers in parallel.
+    n_edge_points : int
+        Number of points sampled along each border of an input for its footprint.
+
+    """
+    def __init__(self, path_to_file=None, n_workers=1, n_edge_points=50):
+        self.path_to_file = path_to_file
+        self.n_workers = n_workers
+        self.n_edge_points = n_edge_points
+        self.entries = {}
+        self.headers = {}
+        #  paths whose entry was checked against the file in this session
+        self.checked = set()
+        self.lock = threading.RLock()
+
+        if path_to_file is not None and os.path.exists(path_to_file):
+            with open(path_to_file, 'r') as fobj:
+                self.entries = json.load(fobj)
+
+    def save(self):
+        """Write the index atomically (if it has a file)."""
+        if self.path_to_file is None:
+            return
+        with self.lock:
+            path_tmp = self.path_to_file + '.tmp'
+            with open(path_tmp, 'w') as fobj:
+                json.dump(self.entries, fobj, sort_keys=True)
+            os.replace(path_tmp, self.path_to_file)
+
+    def is_current(self, path_to_file):
+        entry = self.entries.get(path_to_file)
+        if entry is None:
+            return False
+        stat = os.stat(path_to_file)
+        return entry['size'] == stat.st_size and \
+            entry['mtime_ns'] == stat.st_mtime_ns and \
+            entry.get('n_edge_points') == self.n_edge_points
+
+    def check(self, path_to_file):
+        """Read the entry of a file if it is missing or stale; return whether it was read."""
+        if self.is_current(path_to_file):
+            updated = False
+        else:
+            entry = read_header_entry(path_to_file, self.n_edge_points)
+            with self.lock:
+                self.entries[path_to_file] = entry
+                self.headers.pop(path_to_file, None)
+            updated = True
+        with self.lock:
+            self.checked.add(path_to_file)
+        return updated
+
+    def update(self, paths):
+        """Make sure the entries of all files in 'paths' are current.
+
+        The files are checked (and read if necessary) in parallel, and the index file is saved if any entry changed.
+
+        Returns
+        -------
+        int
+            Number of files whose header had to be read.
+
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        paths = [path for path in dict.fromkeys(paths) if path not in self.checked]
+        if self.n_workers > 1 and len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+                n_read = sum(executor.map(self.check, paths))
+        else:
+            n_read = sum(self.check(path) for path in paths)
+        if n_read > 0:
+            self.save()
+        return n_read
+
+    def get_header(self, path_to_file):
+        """Return a copy of the FITS header of a file."""
+        path_to_file = os.path.abspath(path_to_file)
+        if path_to_file not in self.checked:
+            self.update([path_to_file])
+        with self.lock:
+            header = self.headers.get(path_to_file)
+            if header is None:
+                header = fits.Header.fromstring(
+                    self.entries[path_to_file]['header'])
+                self.headers[path_to_file] = header
+        return header.copy()
+
+    def get_footprint(self, path_to_file):
+        """Return the sky coordinates of points along the borders of a file (`None` without celestial WCS)."""
+        path_to_file = os.path.abspath(path_to_file)
+        if path_to_file not in self.checked:
+            self.update([path_to_file])
+        return get_footprint_coordinates(self.entries[path_to_file])
+
+    def select_overlapping(self, header, paths=None, margin=0):
+        """Return the indexed files whose footprint overlaps an output grid.
+
+        Parameters
+        ----------
+        header : astropy.io.fits.Header
+            FITS header describing the size and celestial WCS of the output grid.
+        paths : list
+            Files to select from. By default all files of the index are considered, without checking whether their entries are current.
+        margin : float
+            Number of pixels by which the output grid is enlarged.
+
+        Returns
+        -------
+        list
+            Paths of the overlapping files.
+
+        """
+        if paths is None:
+            paths = sorted(self.entries)
+        else:
+            self.update(paths)
+            paths = [os.path.abspath(path) for path in paths]
+
+        #  a single tile covering the output grid
+        index = FootprintIndex(header, max(header['NAXIS1'], header['NAXIS2']),
+                               margin=margin)
+        for path in paths:
+            index.insert(path, get_footprint_coordinates(self.entries[path]))
+        return index.query((0, 0))
@@ -0,0 +1,206 @@
+import json
+import os
+import platform
+import resource
+import threading
+import time
+
+from tqdm import tqdm
+
+
+def read_process_io():
+    """Bytes read and written by this process and its finished child processes.
+
+    On Linux the character counts of '/proc/self/io' are used, which include reads served from the page cache; elsewhere the block I/O counts of 'getrusage' are used.
+    """
+    try:
+        with open('/proc/self/io', 'r') as fobj:
+            counters = dict(line.split(':') for line in fobj if ':' in line)
+        return int(counters['rchar']), int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        n_read, n_written = 0, 0
+        for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]:
+            usage = resource.getrusage(who)
+            n_read += usage.ru_inblock * 512
+            n_written += usage.ru_oublock * 512
+        return n_read, n_written
+
+
+def read_rss():
+    """Current resident set size of this process in bytes (`None` if unknown)."""
+    try:
+        with open('/proc/self/statm', 'r') as fobj:
+            return int(fobj.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def get_maxrss(who=resource.RUSAGE_SELF):
+    """Peak resident set size in bytes reported by 'getrusage'."""
+    maxrss = resource.getrusage(who).ru_maxrss
+    #  ru_maxrss is given in kilobytes on Linux, but in bytes on macOS
+    return maxrss if platform.system() == 'Darwin' else maxrss * 1024
+
+
+class Instrumentation(object):
+    """Record the stages and tasks of a mosaic and pass them on as events.
+
+    Every stage (e.g. slicing, swarping, assembly) is measured with its wall time, the peak resident memory of the process during the stage (sampled every 'sample_interval' seconds), the peak memory of the largest finished child process (e.g. SWarp) and the bytes read and written by the process and its finished children. Tasks of a stage (e.g. the SWarp run of a channel) are recorded with their duration, exit code and FITS I/O.
+
+    Each stage, task and progress update is also passed on as event to the 'callbacks', which allows to monitor a mosaic from a job monitoring system. An event is a dict with the type of the 'event' ('stage_start', 'stage_end', 'task' or 'progress'), the 'time' and further fields of the event.
+
+    Parameters
+    ----------
+    callbacks : list
+        Functions that are called with every event.
+    progress_bars : bool
+        Default is `True`. If set to `False`, no tqdm progress bars are shown.
+    sample_interval : float
+        Interval in seconds in which the memory is sampled during a stage.
+
+    """
+    def __init__(self, callbacks=(), progress_bars=True, sample_interval=0.1):
+        self.callbacks = list(callbacks)
+        self.progress_bars = progress_bars
+        self.sample_interval = sample_interval
+        self.stages = []
+        self.tasks = []
+        self.current_stage = None
+        self.lock = threading.RLock()
+        self.time_start = time.time()
+        self.perf_start = time.perf_counter()
+        self.io_start = read_process_io()
+
+    def emit(self, event, **fields):
+        fields['event'] = event
+        fields['time'] = time.time()
+        with self.lock:
+            for callback in self.callbacks:
+                callback(fields)
+
+    def stage(self, name):
+        """Context manager that measures a stage of the mosaic."""
+        return Stage(self, name)
+
+    def record_task(self, key, **fields):
+        """Record a task (e.g. the SWarp run of a channel) of the current stage."""
+        fields['stage'] = self.current_stage
+        fields['key'] = key
+        with self.lock:
+            self.tasks.append(fields)
+        self.emit('task', **fields)
+
+    def progress(self, total):
+        """Progress indicator of the current stage with 'total' steps."""
+        return Progress(self, self.current_stage, total)
+
+    def summarize_tasks(self, name):
+        tasks = [task for task in self.tasks if task['stage'] == name]
+        summary = {'n_tasks': len(tasks),
+                   'n_failed': sum(1 for task in tasks
+                                   if task.get('returncode', 0) != 0)}
+        for field in ['duration', 'bytes_read', 'bytes_written']:
+            summary['task_{}'.format(field)] = sum(
+                task.get(field, 0) for task in tasks)
+        return summary
+
+    def report(self, **info):
+        """Return the run report as dict, with 'info' added to it."""
+        io_end = read_process_io()
+        with self.lock:
+            stages = [dict(stage, **self.summarize_tasks(stage['name']))
+                      for stage in self.stages]
+            tasks = [dict(task) for task in self.tasks]
+        report = {
+            'start': time.strftime(
+                '%Y-%m-%dT%H:%M:%S', time.localtime(self.time_start)),
+            'host': platform.node(),
+            'total': {
+                'wall_time': time.perf_counter() - self.perf_start,
+                'peak_rss': get_maxrss(resource.RUSAGE_SELF),
+                'peak_rss_children': get_maxrss(resource.RUSAGE_CHILDREN),
+                'bytes_read': io_end[0] - self.io_start[0],
+                'bytes_written': io_end[1] - self.io_start[1]},
+            'stages': stages,
+            'tasks': tasks}
+        report.update(info)
+        return report
+
+    def write_report(self, path_to_file, **info):
+        """Write the run report as JSON file."""
+        path_tmp = path_to_file + '.tmp'
+        with open(path_tmp, 'w') as fobj:
+            json.dump(self.report(**info), fobj, indent=1, sort_keys=True,
+                      default=str)
+        os.replace(path_tmp, path_to_file)
+
+
+class Stage(object):
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def sample(self):
+        while not self.stop.wait(self.instrumentation.sample_interval):
+            self.peak_rss = max(self.peak_rss, read_rss() or 0)
+
+    def __enter__(self):
+        self.previous_stage = self.instrumentation.current_stage
+        self.instrumentation.current_stage = self.name
+        self.instrumentation.emit('stage_start', stage=self.name)
+
+        self.peak_rss = read_rss() or 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        self.io_start = read_process_io()
+        self.time_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter() - self.time_start
+        io_end = read_process_io()
+        self.stop.set()
+        self.thread.join()
+        if read_rss() is None:
+            #  no sampling possible, use the peak of the whole run instead
+            self.peak_rss = get_maxrss(resource.RUSAGE_SELF)
+
+        record = {
+            'name': self.name,
+            'start': self.time_start - self.instrumentation.perf_start,
+            'wall_time': wall_time,
+            'peak_rss': self.peak_rss,
+            'peak_rss_children': get_maxrss(resource.RUSAGE_CHILDREN),
+            'bytes_read': io_end[0] - self.io_start[0],
+            'bytes_written': io_end[1] - self.io_start[1],
+            'status': 'ok' if exc_type is None else 'failed'}
+        if exc_type is not None:
+            record['error'] = '{}: {}'.format(exc_type.__name__, exc_value)
+        with self.instrumentation.lock:
+            self.instrumentation.stages.append(record)
+        self.instrumentation.current_stage = self.previous_stage
+        self.instrumentation.emit('stage_end', stage=self.name, **{
+            key: value for key, value in record.items() if key != 'name'})
+        return False
+
+
+class Progress(object):
+    """Progress of a stage, shown as tqdm bar and passed on as 'progress' events."""
+    def __init__(self, instrumentation, stage, total):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.total = total
+        self.n = 0
+        self.pbar = tqdm(total=total) if instrumentation.progress_bars else None
+
+    def update(self, n=1):
+        self.n += n
+        if self.pbar is not None:
+            self.pbar.update(n)
+        self.instrumentation.emit(
+            'progress', stage=self.stage, n_done=self.n, total=self.total)
+
+    def close(self):
+        if self.pbar is not None:
+            self.pbar.close()
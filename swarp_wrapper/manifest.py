@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def file_fingerprint(path_to_file):
+    """Identify a file by its path, size and modification time."""
+    stat = os.stat(path_to_file)
+    return [os.path.abspath(path_to_file), stat.st_size, stat.st_mtime_ns]
+
+
+def hash_fingerprint(*items):
+    """Return a hash of JSON serializable items."""
+    string = json.dumps(items, sort_keys=True, default=str)
+    return hashlib.sha256(string.encode()).hexdigest()
+
+
+class Manifest(object):
+    """Record of the completed work of the individual stages of a mosaic.
+
+    For each stage (e.g. 'slices' or 'swarp') and key (e.g. a cube or a channel) the manifest stores the fingerprint of the inputs and settings the work was done with, together with the items (e.g. channels) that are complete. Work is only considered complete if its fingerprint matches, so stale entries are redone.
+
+    Parameters
+    ----------
+    path_to_file : str
+        Path to the JSON file of the manifest.
+    resume : bool
+        Default is `True`. If set to `False`, the entries of an already existing manifest file are discarded.
+    save_interval : float
+        Minimum number of seconds between two saves of the manifest by 'set_complete'. Entries recorded in between are written by the next save or by 'flush', so at most the work of the last 'save_interval' seconds is redone if the run dies.
+
+    """
+    def __init__(self, path_to_file, resume=True, save_interval=10.):
+        self.path_to_file = path_to_file
+        self.save_interval = save_interval
+        self.stages = {}
+        self.lock = threading.RLock()
+        self.unsaved = False
+        self.time_saved = time.monotonic()
+
+        if resume and os.path.exists(path_to_file):
+            with open(path_to_file, 'r') as fobj:
+                self.stages = json.load(fobj)
+
+    def save(self):
+        """Write the manifest atomically, so it stays valid if the run dies."""
+        with self.lock:
+            path_tmp = self.path_to_file + '.tmp'
+            with open(path_tmp, 'w') as fobj:
+                json.dump(self.stages, fobj, indent=1, sort_keys=True)
+            os.replace(path_tmp, self.path_to_file)
+            self.unsaved = False
+            self.time_saved = time.monotonic()
+
+    def flush(self):
+        """Save the manifest if it has entries that are not written yet."""
+        with self.lock:
+            if self.unsaved:
+                self.save()
+
+    def is_complete(self, stage, key, fingerprint):
+        entry = self.stages.get(stage, {}).get(key)
+        return entry is not None and entry['fingerprint'] == fingerprint
+
+    def completed_items(self, stage, key, fingerprint):
+        if not self.is_complete(stage, key, fingerprint):
+            return set()
+        return set(self.stages[stage][key]['items'])
+
+    def set_complete(self, stage, key, fingerprint, items=(), save=True):
+        with self.lock:
+            entries = self.stages.setdefault(stage, {})
+            if not self.is_complete(stage, key, fingerprint):
+                entries[key] = {'fingerprint': fingerprint, 'items': []}
+            entries[key]['items'] = sorted(
+                set(entries[key]['items']) | set(items))
+            self.unsaved = True
+            if save and time.monotonic() - self.time_saved >= self.save_interval:
+                self.save()
+
+    def remove(self):
+        self.stages = {}
+        self.unsaved = False
+        if os.path.exists(self.path_to_file):
+            os.remove(self.path_to_file)
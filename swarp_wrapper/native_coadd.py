@@ -0,0 +1,158 @@
+import numpy as np
+
+from astropy.io import fits
+from astropy.wcs import WCS
+
+
+#  celestial systems of SWarp and the longitude axis types they correspond to
+CELESTIAL_TYPES = {'EQUATORIAL': 'RA', 'GALACTIC': 'GLON', 'ECLIPTIC': 'ELON',
+                   'SUPERGALACTIC': 'SLON'}
+
+#  memory per output pixel used by 'coadd_aligned' for the co-added data
+#  (float64), the weights (float32) and the coverage (bool)
+BYTES_PER_OUTPUT_PIXEL = 8 + 4 + 1
+
+
+def get_native_coadd_blocker(configuration, header):
+    """Check whether SWarp would only co-add grid-aligned inputs without changing their grid.
+
+    This is the case if SWarp resamples the inputs with nearest-neighbour interpolation and combines them with a plain (weighted) average without weight maps and background subtraction, and keeps the projection, celestial system and pixel scale of the inputs. The grid of the inputs is then kept as output grid, cropped to their union; SWarp itself would center its output grid on the union (CENTER_TYPE ALL), which can be offset from the grid of the inputs by a fraction of a pixel.
+
+    Parameters
+    ----------
+    configuration : dict
+        Settings of the SWarp configuration file (see 'read_swarp_configuration').
+    header : astropy.io.fits.Header
+        FITS header of one of the inputs.
+
+    Returns
+    -------
+    str
+        Reason why the inputs need to be resampled by SWarp, or `None` if SWarp can be skipped.
+
+    """
+    def get(key, default):
+        value = configuration.get(key, '') or default
+        return value.split(',')[0].strip().upper()
+
+    ctype = WCS(header).celestial.wcs.ctype[0]
+    if not get('COMBINE', 'Y').startswith('Y'):
+        return "COMBINE is not set"
+    if get('COMBINE_TYPE', 'MEDIAN') not in ['WEIGHTED', 'AVERAGE']:
+        return "COMBINE_TYPE is {}".format(get('COMBINE_TYPE', 'MEDIAN'))
+    if get('WEIGHT_TYPE', 'BACKGROUND') != 'NONE':
+        return "WEIGHT_TYPE is {}".format(get('WEIGHT_TYPE', 'BACKGROUND'))
+    if not get('RESAMPLE', 'Y').startswith('Y'):
+        return "RESAMPLE is not set"
+    if get('RESAMPLING_TYPE', 'LANCZOS3') != 'NEAREST':
+        return "RESAMPLING_TYPE is {}".format(get('RESAMPLING_TYPE', 'LANCZOS3'))
+    if get('SUBTRACT_BACK', 'Y').startswith('Y'):
+        return "SUBTRACT_BACK is set"
+    if get('PROJECTION_TYPE', 'TAN') not in ['NONE', ctype[5:].strip('-')]:
+        return "PROJECTION_TYPE {} differs from the projection of the inputs".format(
+            get('PROJECTION_TYPE', 'TAN'))
+    celestial_type = get('CELESTIAL_TYPE', 'NATIVE')
+    if celestial_type not in ['NATIVE', 'PIXEL'] and \
+            CELESTIAL_TYPES.get(celestial_type) != ctype[:4].strip('-'):
+        return "CELESTIAL_TYPE {} differs from the coordinate system of the inputs".format(
+            celestial_type)
+    for key, default in [('PIXELSCALE_TYPE', 'MEDIAN'),
+                         ('CENTER_TYPE', 'ALL')]:
+        if get(key, default) == 'MANUAL':
+            return "{} is MANUAL".format(key)
+    if get('IMAGE_SIZE', '0') != '0':
+        return "IMAGE_SIZE is fixed"
+    return None
+
+
+def get_grid_offsets(headers, tolerance=1e-3):
+    """Determine whether 2D inputs lie on a common pixel grid, and where.
+
+    Each input is grid-aligned if the world coordinates of its corner and center pixels fall onto the same integer pixel offset in the grid of the first input (within 'tolerance' pixels), i.e. the inputs share projection, pixel scale and rotation and are only shifted by whole pixels.
+
+    Parameters
+    ----------
+    headers : list
+        FITS headers describing the size and celestial WCS of the inputs.
+    tolerance : float
+        Maximum deviation from an integer pixel offset in pixels.
+
+    Returns
+    -------
+    header : astropy.io.fits.Header
+        FITS header describing the size and celestial WCS of the union of the inputs on the common grid.
+    offsets : list
+        Lower left pixel (y0, x0) of each input in the output grid.
+
+    Both are `None` if the inputs are not grid-aligned.
+
+    """
+    wcs_ref = WCS(headers[0]).celestial
+    positions = []
+    for header in headers:
+        wcs = WCS(header).celestial
+        if list(wcs.wcs.ctype) != list(wcs_ref.wcs.ctype):
+            return None, None
+        nx, ny = header['NAXIS1'], header['NAXIS2']
+        xpix, ypix = [array.ravel() for array in np.meshgrid(
+            [0, nx // 2, nx - 1], [0, ny // 2, ny - 1])]
+        with np.errstate(invalid='ignore'):
+            xref, yref = wcs_ref.all_world2pix(
+                *wcs.all_pix2world(xpix, ypix, 0), 0)
+        dx, dy = xref - xpix, yref - ypix
+        if not (np.all(np.isfinite(dx)) and np.all(np.isfinite(dy))):
+            return None, None
+        x0, y0 = np.round(dx[0]), np.round(dy[0])
+        if np.max(np.abs(dx - x0)) > tolerance or \
+                np.max(np.abs(dy - y0)) > tolerance:
+            return None, None
+        positions.append((int(y0), int(x0), ny, nx))
+
+    ymin = min(y0 for y0, x0, ny, nx in positions)
+    xmin = min(x0 for y0, x0, ny, nx in positions)
+    header = fits.Header()
+    header['NAXIS'] = 2
+    header['NAXIS1'] = max(x0 + nx for y0, x0, ny, nx in positions) - xmin
+    header['NAXIS2'] = max(y0 + ny for y0, x0, ny, nx in positions) - ymin
+    header.extend(wcs_ref.to_header())
+    header['CRPIX1'] -= xmin
+    header['CRPIX2'] -= ymin
+    return header, [(y0 - ymin, x0 - xmin) for y0, x0, ny, nx in positions]
+
+
+def coadd_aligned(inputs, shape):
+    """Average grid-aligned inputs on the output grid, like SWarp with nearest-neighbour resampling.
+
+    Pixels are weighted by one if they are finite and by zero otherwise. As in the output of SWarp, pixels that are not covered by any input are set to zero, and pixels that are covered but have no valid data are flagged with -1e30.
+
+    Parameters
+    ----------
+    inputs : list
+        Tuples of the data of an input and its lower left pixel (y0, x0) in the output grid, optionally preceded by its offsets along the leading axes of 'shape' (e.g. (z0, y0, x0)).
+    shape : tuple
+        Shape of the output, the last two axes being the output grid.
+
+    Returns
+    -------
+    data : numpy.ndarray
+        Co-added data.
+    weights : numpy.ndarray
+        Sum of the weights of the inputs.
+
+    """
+    total = np.zeros(shape, dtype=np.float64)
+    weights = np.zeros(shape, dtype=np.float32)
+    covered = np.zeros(shape, dtype=bool)
+    for data, offset in inputs:
+        offset = (0, ) * (data.ndim - len(offset)) + tuple(offset)
+        section = tuple(slice(start, start + size)
+                        for start, size in zip(offset, data.shape))
+        valid = np.isfinite(data)
+        total[section] += np.where(valid, data, 0)
+        weights[section] += valid
+        covered[section] = True
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        data = np.where(weights > 0, total / weights, 0.)
+    data[covered & (weights == 0)] = -1e30
+    return data, weights
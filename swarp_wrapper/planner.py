@@ -0,0 +1,199 @@
+import os
+import shutil
+
+import numpy as np
+
+from .native_coadd import BYTES_PER_OUTPUT_PIXEL
+
+
+def get_available_resources(path):
+    """Memory, disk space and cores available to a mosaic.
+
+    Returns
+    -------
+    dict
+        Contains the available 'memory' in bytes (MemAvailable of '/proc/meminfo', or else the free physical memory), the free 'disk' space in bytes of the filesystem of 'path' (or of its nearest existing parent directory, if 'path' is not created yet) and the number of 'cores' the process may run on.
+
+    """
+    memory = None
+    try:
+        with open('/proc/meminfo', 'r') as fobj:
+            for line in fobj:
+                if line.startswith('MemAvailable:'):
+                    memory = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if memory is None:
+        try:
+            memory = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (ValueError, OSError, AttributeError):
+            memory = 0
+
+    if hasattr(os, 'sched_getaffinity'):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+
+    return {'memory': memory, 'disk': shutil.disk_usage(path).free,
+            'cores': cores}
+
+
+def format_size(n_bytes):
+    return '{:.1f} MB'.format(n_bytes / 1024**2)
+
+
+def plan_cube_mosaic(cubes, n_channels, n_pixels, budget, n_workers=None,
+                     stream_assembly=None, channel_batch_size=None,
+                     save_weights=True, slice_itemsize=4, stream_slicing=True,
+                     write_output=True, native=False):
+    """Estimate the memory and disk space needed for a cube mosaic and choose the execution settings.
+
+    The estimates are derived from the shapes of the cubes and the output grid only: the output cube (and weight cube) as float32, the channel slices and swarped channel maps on the scratch disk, one channel of all cubes plus the output plane and its weights for each SWarp process, and a block of channels of the cubes and the output for the co-addition without SWarp.
+
+    Settings that are given are kept and only accounted for; settings that are `None` are chosen within the 'budget': the output cube is assembled in memory if it needs at most half of the memory budget (and streamed to disk otherwise), as many SWarp processes are run as there are cores and memory left, and the channel blocks of the co-addition without SWarp use half of the remaining memory.
+
+    Parameters
+    ----------
+    cubes : list
+        For each cube a tuple of its number of channels (after selecting and binning them), its number of pixels per channel and the number of bytes read from it per channel.
+    n_channels : int
+        Number of channels of the mosaic.
+    n_pixels : int
+        Number of pixels of the output grid.
+    budget : dict
+        Available 'memory' and 'disk' in bytes and number of 'cores'.
+    n_workers, stream_assembly, channel_batch_size
+        Settings of 'Swarp' that are fixed, or `None` if they should be chosen.
+    save_weights : bool
+        Whether the weight cube is saved.
+    slice_itemsize : int
+        Number of bytes per pixel of the channel slices.
+    stream_slicing : bool
+        Whether the cubes are sliced in streaming mode, or fully loaded into memory.
+    write_output : bool
+        Whether the output cube is written to disk.
+    native : bool
+        Whether the cubes may be co-added without SWarp, in blocks of 'channel_batch_size' channels.
+
+    Returns
+    -------
+    dict
+        The 'settings' (n_workers, stream_assembly, channel_batch_size), the 'estimates' in bytes ('output', 'scratch', 'disk', 'memory' and the memory of a single SWarp process 'swarp_process') and a list of 'warnings' if the budget is exceeded.
+
+    """
+    plane = n_pixels * 4
+    n_maps = 2 if save_weights else 1
+    output = n_channels * plane * n_maps
+    slices_per_channel = sum(n_pixels_cube * slice_itemsize
+                             for n, n_pixels_cube, n_read in cubes)
+    scratch = 3 * sum(min(n, n_channels) * n_pixels_cube * slice_itemsize
+                      for n, n_pixels_cube, n_read in cubes)
+    if stream_slicing:
+        slicing = max(n_read for n, n_pixels_cube, n_read in cubes)
+    else:
+        slicing = max(n * n_read for n, n_pixels_cube, n_read in cubes)
+    swarp_process = slices_per_channel + 3 * plane
+
+    if stream_assembly is None:
+        stream_assembly = output > budget['memory'] / 2
+    assembly = 2 * plane * n_maps if stream_assembly else output
+    available = budget['memory'] - assembly - slicing
+
+    if n_workers is None:
+        n_workers = int(max(1, min(budget['cores'], n_channels,
+                                   available // max(swarp_process, 1))))
+
+    per_channel = BYTES_PER_OUTPUT_PIXEL * n_pixels + sum(n_read for n, n_pixels_cube, n_read in cubes)
+    if channel_batch_size is None:
+        channel_batch_size = int(max(1, (budget['memory'] - assembly) // 2 // per_channel))
+    channel_batch_size = min(channel_batch_size, n_channels)
+
+    memory = assembly + slicing + n_workers * swarp_process
+    if native:
+        memory = max(memory, assembly + channel_batch_size * per_channel)
+    disk = scratch + (output if stream_assembly or write_output else 0)
+
+    warnings = []
+    if memory > budget['memory']:
+        warnings.append("the estimated memory of {} exceeds the memory budget of {}".format(
+            format_size(memory), format_size(budget['memory'])))
+    if disk > budget['disk']:
+        warnings.append("the estimated disk space of {} exceeds the disk budget of {}".format(
+            format_size(disk), format_size(budget['disk'])))
+
+    return {'settings': {'n_workers': n_workers,
+                         'stream_assembly': bool(stream_assembly),
+                         'channel_batch_size': channel_batch_size},
+            'estimates': {'output': output, 'scratch': scratch, 'disk': disk,
+                          'memory': memory, 'swarp_process': swarp_process},
+            'warnings': warnings}
+
+
+def plan_image_mosaic(images, n_pixels, budget, n_workers=None, tile_size=None,
+                      parallel=False, save_weights=True, allow_tiling=True):
+    """Estimate the memory and disk space needed for an image mosaic and choose the execution settings.
+
+    A single SWarp run needs all inputs and the output image and its weights in memory. If this exceeds the memory budget, 'tile_size' is `None` and 'allow_tiling' is set, a tile size is chosen such that the SWarp runs of the tiles (with their share of the inputs) fit into the memory per core.
+
+    Parameters
+    ----------
+    images : list
+        For each image its number of pixels.
+    n_pixels : int
+        Number of pixels of the output grid.
+    budget : dict
+        Available 'memory' and 'disk' in bytes and number of 'cores'.
+    n_workers, tile_size
+        Settings of 'Swarp' that are fixed, or `None` if they should be chosen.
+    parallel : bool
+        Whether the images are co-added in batches, which are run in parallel like tiles.
+    save_weights : bool
+        Whether the weight map is saved.
+    allow_tiling : bool
+        Whether the output grid may be split into tiles.
+
+    Returns
+    -------
+    dict
+        The 'settings' (n_workers, tile_size), the 'estimates' in bytes ('output', 'scratch', 'disk', 'memory' and the memory of a single SWarp process 'swarp_process') and a list of 'warnings' if the budget is exceeded.
+
+    """
+    inputs = 4 * sum(images)
+    output = 4 * n_pixels * (2 if save_weights else 1)
+    #  bytes of inputs, output and weights per output pixel
+    density = inputs / max(n_pixels, 1) + 12
+    swarp_process = int(density * n_pixels)
+
+    if tile_size is None and allow_tiling and swarp_process > budget['memory']:
+        memory_per_core = budget['memory'] / max(budget['cores'], 1)
+        tile_size = int(max(64, np.sqrt(memory_per_core / density)))
+    if tile_size is not None:
+        swarp_process = int(density * min(tile_size**2, n_pixels))
+        parallel = True
+
+    if n_workers is None:
+        n_workers = 1
+        if parallel:
+            n_workers = int(max(1, min(budget['cores'],
+                                       budget['memory'] // max(swarp_process, 1))))
+
+    memory = n_workers * swarp_process
+    scratch = output if parallel else 0
+    disk = scratch + output
+
+    warnings = []
+    if memory > budget['memory']:
+        warnings.append("the estimated memory of {} exceeds the memory budget of {}".format(
+            format_size(memory), format_size(budget['memory'])))
+    if disk > budget['disk']:
+        warnings.append("the estimated disk space of {} exceeds the disk budget of {}".format(
+            format_size(disk), format_size(budget['disk'])))
+
+    return {'settings': {'n_workers': n_workers, 'tile_size': tile_size},
+            'estimates': {'output': output, 'scratch': scratch, 'disk': disk,
+                          'memory': memory, 'swarp_process': swarp_process},
+            'warnings': warnings}
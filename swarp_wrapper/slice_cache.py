@@ -0,0 +1,93 @@
+import os
+import shutil
+
+from .manifest import file_fingerprint, hash_fingerprint
+
+
+def link_file(path_source, path_destination):
+    """Hard link a file or copy it if linking is not possible."""
+    if os.path.exists(path_destination):
+        os.remove(path_destination)
+    try:
+        os.link(path_source, path_destination)
+    except OSError:
+        shutil.copyfile(path_source, path_destination)
+
+
+class SliceCache(object):
+    """Persistent cache of the channel slices of spectral cubes.
+
+    Each cube gets its own directory in the cache, named after a hash of the identity of the file (path, size and modification time) and the parameters the slices were produced with. Unchanged cubes thus never have to be sliced again, and different mosaics sharing the same input cubes can reuse the same channel slices. Slices are hard linked into the working directory of a mosaic, so evicting an entry never breaks a running mosaic.
+
+    If the total size of the cache exceeds 'max_size' bytes, the least recently used entries are removed.
+
+    Parameters
+    ----------
+    path_cache : str
+        Directory of the cache.
+    max_size : int
+        Maximum size of the cache in bytes. The default is `None`, which means that the size of the cache is not limited.
+
+    """
+    def __init__(self, path_cache, max_size=None):
+        self.path_cache = os.path.abspath(path_cache)
+        self.max_size = max_size
+
+        if not os.path.exists(self.path_cache):
+            os.makedirs(self.path_cache)
+
+    def get_entry(self, path_to_cube, parameters={}):
+        """Return the cache directory for the slices of a cube."""
+        key = hash_fingerprint(file_fingerprint(path_to_cube), parameters)
+        path_entry = os.path.join(self.path_cache, key)
+        if not os.path.exists(path_entry):
+            os.makedirs(path_entry)
+        #  mark the entry as recently used
+        os.utime(path_entry)
+        return path_entry
+
+    def get_size(self, path_entry):
+        size = 0
+        for filename in os.listdir(path_entry):
+            size += os.path.getsize(os.path.join(path_entry, filename))
+        return size
+
+    def evict(self, keep=[]):
+        """Remove least recently used entries until the cache fits into 'max_size'.
+
+        Parameters
+        ----------
+        keep : list
+            Paths of entries that should not be removed.
+
+        Files in the cache directory that are not entries (e.g. lock files) are left alone.
+
+        Returns
+        -------
+        int
+            Number of removed entries.
+
+        """
+        if self.max_size is None:
+            return 0
+
+        entries = []
+        for key in os.listdir(self.path_cache):
+            path_entry = os.path.join(self.path_cache, key)
+            if not os.path.isdir(path_entry):
+                continue
+            entries.append((os.path.getmtime(path_entry), path_entry,
+                            self.get_size(path_entry)))
+        total = sum(entry[2] for entry in entries)
+
+        removed = 0
+        for mtime, path_entry, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            if path_entry in keep:
+                continue
+            shutil.rmtree(path_entry, ignore_errors=True)
+            total -= size
+            removed += 1
+
+        return removed
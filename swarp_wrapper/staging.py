@@ -0,0 +1,106 @@
+import hashlib
+import os
+import shutil
+
+
+class DiskStaging(object):
+    """Stage the temporary files of a mosaic in a directory on disk.
+
+    The staging backend keeps track of all directories it created, so it can remove them again with 'clean_up'.
+
+    Parameters
+    ----------
+    path_root : str
+        Directory in which the temporary directories are created.
+
+    """
+    def __init__(self, path_root):
+        self.path_root = os.path.abspath(path_root)
+        self.list_directories = []
+
+    def make_directory(self, name):
+        """Create (if necessary) and return a temporary directory."""
+        path = os.path.join(self.path_root, name)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        if path not in self.list_directories:
+            self.list_directories.append(path)
+        return path
+
+    def clean_up(self):
+        """Remove all temporary directories created by the backend."""
+        for path in self.list_directories:
+            shutil.rmtree(path, ignore_errors=True)
+        self.list_directories = []
+
+
+class MemoryStaging(DiskStaging):
+    """Stage the temporary files of a mosaic on a node-local memory filesystem.
+
+    Staging the many small temporary files on a tmpfs (e.g. '/dev/shm') instead of a shared (network) filesystem avoids the metadata load of creating and removing them there.
+
+    Parameters
+    ----------
+    path_root : str
+        Directory in which the temporary directories are created.
+
+    """
+    def clean_up(self):
+        super(MemoryStaging, self).clean_up()
+        if os.path.exists(self.path_root) and not os.listdir(self.path_root):
+            os.rmdir(self.path_root)
+
+
+def get_staging(staging, path_swarp, n_bytes, path_tmpfs='/dev/shm',
+                memory_budget=None):
+    """Choose the staging backend for the temporary files of a mosaic.
+
+    Parameters
+    ----------
+    staging : 'disk' or 'tmpfs'
+        Requested staging backend.
+    path_swarp : str
+        Directory of the mosaic. Temporary files are staged here if 'staging' is 'disk' or if they do not fit into the tmpfs.
+    n_bytes : int
+        Estimated size of all temporary files in bytes.
+    path_tmpfs : str
+        Mount point of the tmpfs.
+    memory_budget : int
+        Maximum number of bytes that may be staged on the tmpfs. By default, the free space of the tmpfs is used as limit.
+
+    Returns
+    -------
+    staging : DiskStaging or MemoryStaging
+        Staging backend.
+    message : str
+        Description of the chosen staging backend.
+
+    """
+    if staging == 'disk':
+        return DiskStaging(path_swarp), "staging temporary files in {}".format(
+            path_swarp)
+
+    if staging != 'tmpfs':
+        raise Exception("'staging' needs to be 'disk' or 'tmpfs'")
+
+    if not os.path.isdir(path_tmpfs) or not os.access(path_tmpfs, os.W_OK):
+        return DiskStaging(path_swarp), \
+            "'{}' does not exist or is not writable, staging temporary files in {}".format(
+                path_tmpfs, path_swarp)
+
+    budget = shutil.disk_usage(path_tmpfs).free
+    if memory_budget is not None:
+        budget = min(budget, memory_budget)
+    if n_bytes > budget:
+        return DiskStaging(path_swarp), \
+            "temporary files ({:.1f} MB) exceed the memory budget, staging them in {}".format(
+                n_bytes / 1024**2, path_swarp)
+
+    #  the same mosaic always uses the same directory, so interrupted
+    #  runs can be resumed on the same node
+    name = 'swarp_wrapper_{}'.format(
+        hashlib.sha256(path_swarp.encode()).hexdigest()[:16])
+    path_root = os.path.join(path_tmpfs, name)
+    return MemoryStaging(path_root), \
+        "staging {:.1f} MB of temporary files in {}".format(
+            n_bytes / 1024**2, path_root)
@@ -1,18 +1,50 @@
 import os
+import subprocess
 import numpy as np
 
-from astropy.wcs import WCS
+from astropy.coordinates import SkyCoord
 from astropy.io import fits
+from astropy.wcs import WCS
+from astropy.wcs.utils import celestial_frame_to_wcs, proj_plane_pixel_scales, wcs_to_celestial_frame
+
+
+#  celestial frames corresponding to the CELESTIAL_TYPE setting of SWarp
+CELESTIAL_FRAMES = {
+    'EQUATORIAL': 'fk5',
+    'GALACTIC': 'galactic',
+    'ECLIPTIC': 'barycentrictrueecliptic',
+    'SUPERGALACTIC': 'supergalactic',
+}
 
 
 def sequence_of_leading_zeros(array):
-    count_zeros = 0
-    for item in array:
-        if item == 0:
-            count_zeros += 1
-        else:
-            break
-    return count_zeros
+    nonzero = np.flatnonzero(np.asarray(array) != 0)
+    return int(nonzero[0]) if nonzero.size > 0 else len(array)
+
+
+def get_valid_mask(data):
+    """Mask of the spatial pixels that contain valid (finite, non-zero) data in any plane of 'data'."""
+    valid = np.isfinite(data) & (data != 0)
+    if valid.ndim > 2:
+        valid = valid.reshape((-1, ) + valid.shape[-2:]).any(axis=0)
+    return valid
+
+
+def get_bounding_box(valid):
+    """Bounding box of the valid pixels of a 2D mask.
+
+    Returns
+    -------
+    tuple
+        First and last + 1 row and column (ymin, ymax, xmin, xmax) containing valid pixels, or `None` if there are none.
+
+    """
+    rows = np.flatnonzero(valid.any(axis=1))
+    columns = np.flatnonzero(valid.any(axis=0))
+    if rows.size == 0:
+        return None
+    return (int(rows[0]), int(rows[-1]) + 1,
+            int(columns[0]), int(columns[-1]) + 1)
 
 
 def astrometry_info(filepath):
@@ -21,20 +53,17 @@ def astrometry_info(filepath):
 
     wcs = WCS(header)
 
-    sum_cols = np.sum(data, axis=0)
-    sum_rows = np.sum(data, axis=1)
-
-    zero_cols_start = sequence_of_leading_zeros(sum_cols)
-    zero_cols_end = sequence_of_leading_zeros(sum_cols[::-1])
+    bounding_box = get_bounding_box(get_valid_mask(data))
+    if bounding_box is None:
+        print('no valid data in {}'.format(filepath))
+        return
+    ymin, ymax, xmin, xmax = bounding_box
 
-    zero_rows_start = sequence_of_leading_zeros(sum_rows)
-    zero_rows_end = sequence_of_leading_zeros(sum_rows[::-1])
+    size_x = xmax - xmin
+    size_y = ymax - ymin
 
-    size_x = sum_cols.size - zero_cols_start - zero_cols_end
-    size_y = sum_rows.size - zero_rows_start - zero_rows_end
-
-    xpix_center = zero_cols_start + (size_x - 1) / 2
-    ypix_center = zero_rows_start + (size_y - 1) / 2
+    xpix_center = xmin + (size_x - 1) / 2
+    ypix_center = ymin + (size_y - 1) / 2
 
     xcoord_center, ycoord_center = wcs.all_pix2world(
         xpix_center, ypix_center, 0)
@@ -54,3 +83,182 @@ def get_center_coordinates_for_swarp(header):
     y_wcs_ctr = (y_wcs_min + y_wcs_max) / 2
 
     return x_wcs_ctr, y_wcs_ctr
+
+
+def run_swarp(list_inputs, swarp_configuration_file, imageout_name,
+              cwd=None, options={}, list_file=None, executable='swarp'):
+    """Run SWarp as a subprocess.
+
+    Parameters
+    ----------
+    list_inputs : list
+        Paths to the input FITS files.
+    swarp_configuration_file : str
+        Path to the SWarp configuration file.
+    imageout_name : str
+        Path to the output FITS file.
+    cwd : str
+        Working directory of the SWarp process. Relative output names in the configuration file (e.g. 'coadd.weight.fits', 'swarp.xml') are written to this directory.
+    options : dict
+        Additional SWarp settings that are passed on the command line and override the values of the configuration file.
+    list_file : str
+        If given, the paths to the input files are written to this file, which is passed to SWarp as '@list_file'. This keeps the command line short for a large number of inputs.
+    executable : str or list
+        Name of or path to the SWarp executable, or a list with a command and its first arguments (e.g. a script run by a Python interpreter).
+
+    Returns
+    -------
+    returncode : int
+        Exit code of the SWarp process.
+    stderr : str
+        Error messages of the SWarp process.
+
+    """
+    list_inputs = list(list_inputs)
+    if list_file is not None:
+        with open(list_file, 'w') as fobj:
+            fobj.write('\n'.join(list_inputs) + '\n')
+        list_inputs = ['@{}'.format(list_file)]
+
+    if isinstance(executable, str):
+        executable = [executable]
+    command = list(executable) + list_inputs + [
+        '-c', swarp_configuration_file,
+        '-IMAGEOUT_NAME', imageout_name,
+        '-VERBOSE_TYPE', 'QUIET']
+    for key, value in options.items():
+        command += ['-{}'.format(key), str(value)]
+
+    process = subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE)
+    return process.returncode, process.stderr.decode(errors='replace')
+
+
+def read_swarp_configuration(path_to_file):
+    """Read the settings of a SWarp configuration file into a dictionary."""
+    configuration = {}
+    with open(path_to_file, 'r') as fobj:
+        for line in fobj:
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            parts = line.split(None, 1)
+            value = parts[1].strip() if len(parts) > 1 else ''
+            configuration[parts[0].upper()] = value
+    return configuration
+
+
+def get_edge_pixels(naxis1, naxis2, n_edge_points=50):
+    """Pixel coordinates (0-based) along the outer border of an image."""
+    x = np.linspace(-0.5, naxis1 - 0.5, n_edge_points)
+    y = np.linspace(-0.5, naxis2 - 0.5, n_edge_points)
+    xpix = np.concatenate([x, x, np.full(y.size, -0.5),
+                           np.full(y.size, naxis1 - 0.5)])
+    ypix = np.concatenate([np.full(x.size, -0.5), np.full(x.size, naxis2 - 0.5),
+                           y, y])
+    return xpix, ypix
+
+
+def get_edge_coordinates(header, n_edge_points=50):
+    """Sky coordinates of points along the borders of an image or cube.
+
+    The border pixels are converted with one batched call of 'all_pix2world'.
+    """
+    wcs = WCS(header).celestial
+    xpix, ypix = get_edge_pixels(
+        header['NAXIS1'], header['NAXIS2'], n_edge_points)
+    world = wcs.all_pix2world(np.column_stack([xpix, ypix]), 0)
+    return SkyCoord(world[:, 0], world[:, 1], unit='deg',
+                    frame=wcs_to_celestial_frame(wcs))
+
+
+def get_mosaic_footprint(headers, projection_type='TAN',
+                         celestial_type='NATIVE', pixel_scale=None,
+                         n_edge_points=50, footprints=None):
+    """Determine the output grid of a mosaic from the FITS headers of its inputs.
+
+    Only the headers are needed. The borders of each input are projected with one batched call of 'all_pix2world' and the output grid is chosen to contain the union of all footprints, analogous to the CENTER_TYPE ALL setting of SWarp.
+
+    Parameters
+    ----------
+    headers : list
+        FITS headers (astropy.io.fits.Header) of the input images or cubes.
+    projection_type : str
+        WCS projection code of the output grid (PROJECTION_TYPE setting of SWarp).
+    celestial_type : str
+        Celestial coordinate system of the output grid (CELESTIAL_TYPE setting of SWarp). For 'NATIVE' the coordinate system of the first input is used.
+    pixel_scale : float
+        Pixel scale of the output grid in degrees. By default the median pixel scale of the inputs is used.
+    n_edge_points : int
+        Number of points sampled along each border of an input.
+    footprints : list
+        Sky coordinates of the points along the borders of each input (see 'get_edge_coordinates'), e.g. taken from a 'HeaderIndex'. By default they are computed from 'headers'.
+
+    Returns
+    -------
+    dict
+        Contains the 'center' coordinates (in degrees), the 'image_size' (NAXIS1, NAXIS2), the 'pixel_scale' (in degrees) and the 'header' describing the celestial WCS of the output grid.
+
+    """
+    celestial_type = celestial_type.upper()
+    if celestial_type == 'PIXEL' or projection_type.upper() == 'NONE':
+        raise Exception("Output grids without celestial projection are not supported.")
+
+    frame = CELESTIAL_FRAMES.get(celestial_type)
+    list_lon, list_lat, list_scales = [], [], []
+    if footprints is None:
+        footprints = [get_edge_coordinates(header, n_edge_points)
+                      for header in headers]
+    for header, coords in zip(headers, footprints):
+        if coords is None:
+            raise Exception("The output grid can only be determined from inputs with a celestial WCS.")
+        wcs = WCS(header).celestial
+        if frame is None:
+            frame = coords.frame.replicate_without_data()
+        coords = coords.transform_to(frame)
+
+        list_lon.append(coords.spherical.lon.deg)
+        list_lat.append(coords.spherical.lat.deg)
+        list_scales.append(np.mean(proj_plane_pixel_scales(wcs)))
+
+    lon = np.concatenate(list_lon)
+    lat = np.concatenate(list_lat)
+    if pixel_scale is None:
+        pixel_scale = np.median(list_scales)
+
+    #  provisional projection around the mean direction of all borders
+    vector = np.array([np.cos(np.radians(lat)) * np.cos(np.radians(lon)),
+                       np.cos(np.radians(lat)) * np.sin(np.radians(lon)),
+                       np.sin(np.radians(lat))]).mean(axis=1)
+    center = [np.degrees(np.arctan2(vector[1], vector[0])) % 360,
+              np.degrees(np.arctan2(vector[2], np.hypot(vector[0], vector[1])))]
+
+    for iteration in range(2):
+        wcs = celestial_frame_to_wcs(
+            SkyCoord(0, 0, unit='deg', frame=frame).frame,
+            projection=projection_type.upper())
+        wcs.wcs.crval = center
+        #  the reference point is at the 0-based pixel coordinates (0, 0)
+        wcs.wcs.crpix = [1, 1]
+        wcs.wcs.cdelt = [-pixel_scale, pixel_scale]
+        xpix, ypix = wcs.all_world2pix(lon, lat, 0)
+
+        if iteration == 0:
+            #  center the output grid on the union of all footprints
+            center = wcs.all_pix2world(
+                (xpix.min() + xpix.max()) / 2, (ypix.min() + ypix.max()) / 2, 0)
+            center = [float(center[0]) % 360, float(center[1])]
+
+    #  the borders of the inputs are at most half the image size away from
+    #  the center (with a small tolerance for rounding errors)
+    naxis1 = max(1, int(np.ceil(2 * np.abs(xpix).max() - 1e-6)))
+    naxis2 = max(1, int(np.ceil(2 * np.abs(ypix).max() - 1e-6)))
+    wcs.wcs.crpix = [(naxis1 + 1) / 2, (naxis2 + 1) / 2]
+
+    header = wcs.to_header()
+    header['NAXIS'] = 2
+    header['NAXIS1'] = naxis1
+    header['NAXIS2'] = naxis2
+
+    return {'center': center, 'image_size': (naxis1, naxis2),
+            'pixel_scale': pixel_scale, 'header': header}
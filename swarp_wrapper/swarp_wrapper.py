@@ -1,15 +1,356 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import glob
+import itertools
 import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+
+from contextlib import contextmanager
 
 import numpy as np
 
 from astropy.io import fits
+from astropy.wcs import WCS
 from pprint import pprint
-from tqdm import tqdm
 
-from .fits_header_functions import remove_additional_axes, change_header, restore_header_keys, transform_header_from_crota_to_pc
+from .fits_header_functions import remove_additional_axes, remove_additional_axes_from_header, change_header, restore_header_keys, transform_header_from_crota_to_pc, restore_spectral_axis_keys, get_channel_range, select_spectral_channels, get_common_spectral_grid, get_spectral_positions, get_channel_coverage, set_spectral_grid
+from .executors import PoolExecutor, SerialExecutor, WorkQueueExecutor, get_queue_path
+from .fits_io_functions import create_fits_file, get_data_and_header, get_padded_size, order_primary_keys
+from .header_index import HeaderIndex
+from .instrumentation import Instrumentation
+from .planner import format_size, get_available_resources, plan_cube_mosaic, plan_image_mosaic
+from .native_coadd import BYTES_PER_OUTPUT_PIXEL, coadd_aligned, get_grid_offsets, get_native_coadd_blocker
+from .manifest import Manifest, file_fingerprint, hash_fingerprint
+from .slice_cache import SliceCache, link_file
+from .staging import DiskStaging, get_staging
+from .swarp_helper import get_bounding_box, get_edge_coordinates, get_mosaic_footprint, get_valid_mask, read_swarp_configuration, run_swarp
+from .tiling import FootprintIndex, get_footprint_window, split_output_grid
+
+
+def get_slice_filename(path_to_cube, channel):
+    """Filename of the 2D FITS file of a single channel of a cube."""
+    filename = os.path.splitext(os.path.basename(path_to_cube))[0]
+    return '{}_channel_{:04d}.fits'.format(filename, channel)
+
+
+def get_weight_filename(path_to_file):
+    """Filename of the SWarp weight map belonging to a swarped FITS file."""
+    return '{}.weight.fits'.format(os.path.splitext(path_to_file)[0])
+
+
+def get_total_size(paths):
+    """Total size in bytes of all existing files in 'paths'."""
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+def bin_channels(data, axis=0):
+    """Average the channels along 'axis' of 'data', ignoring NaN values.
+
+    Pixels without any finite value in the channels are set to NaN.
+    """
+    valid = np.isfinite(data)
+    n_valid = valid.sum(axis=axis)
+    total = np.where(valid, data, 0).sum(axis=axis, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        binned = total / n_valid
+    return binned.astype(np.result_type(data.dtype, np.float32), copy=False)
+
+
+def interpolate_channels(data, lower, fraction):
+    """Linearly interpolate a block of channels at fractional channel positions.
+
+    Channel i of the result lies at channel 'lower[i] + fraction[i]' of 'data' (along the first axis). Channels with a fraction of zero are copied, so that blank neighbouring channels do not spread into them.
+    """
+    fraction = fraction.reshape((-1, ) + (1, ) * (data.ndim - 1))
+    below = data[lower]
+    above = data[np.minimum(lower + 1, len(data) - 1)]
+    interpolated = np.where(fraction > 0, below + fraction * (above - below), below)
+    return interpolated.astype(np.result_type(data.dtype, np.float32), copy=False)
+
+
+class CubeSlicer(object):
+    """Write the individual channels of a spectral cube to 2D FITS files.
+
+    If 'stream' is set, the cube is opened only once with memory mapping and read in one channel plane at a time, so the memory needed stays close to that of a single plane. Additional degenerate axes (Stokes, etc.) are then indexed away instead of squeezing the full data array.
+
+    Channels beyond the spectral axis of the cube are not written, so they are left out of the SWarp inputs of that channel.
+
+    If the parameter 'crop' is set, the bounding box of the valid (finite and non-zero) data of all channels is determined once, and all slices are cropped to it, with their reference pixel adjusted accordingly. Blank borders of the cube are then neither written nor resampled by SWarp.
+
+    Only the channels in the 'channel_range' (start, stop) are written, and every 'binning' consecutive channels are averaged into a single slice while they are read. Channel k of the slices thus corresponds to the channels start + k * binning ... start + (k + 1) * binning - 1 of the cube; incomplete bins at the end of the range are left out.
+
+    If a 'spectral_grid' is given (see 'get_common_spectral_grid'), the channel range is ignored and the cube is instead resampled onto the channels of the grid while it is read: each block of channels is linearly interpolated from the few neighbouring channels of the cube, and then binned. Only the channels of the grid that lie within the spectral axis of the cube are written.
+
+    If the cube is already held in memory, it can be given as 'hdu' tuple (data, header); 'path_to_cube' then only names the slices and the cube is not read from disk.
+
+    Parameters
+    ----------
+    path_to_cube : str
+        Path to the spectral cube.
+    stream : bool
+        Default is `True`. If set to `False`, the full cube is loaded into memory.
+    parameters : dict
+        Parameters for the slices: 'change_header' keyword arguments, the 'dtype' of the slices, whether they should be tile-'compress'ed, whether blank borders should be 'crop'ped, the 'channel_range' of the cube, the spectral 'binning' factor and optionally the 'spectral_grid' of the slices.
+    hdu : tuple
+        Data array and FITS header of a cube held in memory.
+
+    Attributes
+    ----------
+    header : astropy.io.fits.Header
+        Header of the spectral cube with additional axes removed and the spectral axis describing the selected and binned channels.
+    channels : range
+        Channels of the slices that are covered by the cube.
+    bytes_written : int
+        Number of bytes written for the slices.
+    bytes_uncompacted : int
+        Number of bytes the slices would have needed without skipping, cropping and compacting them.
+    crop_box : tuple
+        Rows and columns (ymin, ymax, xmin, xmax) of the cube that are written to the slices.
+
+    """
+    def __init__(self, path_to_cube, stream=True, parameters={}, hdu=None):
+        self.path_to_cube = path_to_cube
+        self.parameters = parameters
+
+        if hdu is not None:
+            self.hdul = None
+            self.data, header = hdu
+            self.index = (0, ) * (header['NAXIS'] - 3)
+            self.header = remove_additional_axes_from_header(header.copy())
+        elif stream:
+            self.hdul = fits.open(path_to_cube, memmap=True)
+            self.data = self.hdul[0].section
+            header = self.hdul[0].header.copy()
+            #  index the leading degenerate axes instead of squeezing them
+            self.index = (0, ) * (header['NAXIS'] - 3)
+            self.header = remove_additional_axes_from_header(header)
+        else:
+            self.hdul = None
+            self.data = fits.getdata(path_to_cube)
+            self.header = fits.getheader(path_to_cube)
+            self.index = ()
+
+            if len(self.data.shape) == 4:
+                self.data, self.header = remove_additional_axes(
+                    self.data, self.header)
+
+        #  all slices of a cube share the same 2D header
+        self.slice_header = change_header(
+            self.header.copy(), **parameters['change_header'])
+
+        self.binning = parameters['binning']
+        grid = parameters.get('spectral_grid')
+        if grid is None:
+            self.channel_start = parameters['channel_range'][0]
+            channel_stop = min(parameters['channel_range'][1], self.header['NAXIS3'])
+            n_channels = max(channel_stop - self.channel_start, 0) // self.binning
+            self.channels = range(n_channels)
+            self.channel_range = parameters['channel_range']
+            self.lower = None
+        else:
+            self.set_interpolation(grid)
+
+        self.crop_box = None
+        if parameters['crop']:
+            self.crop_box = self.get_crop_box()
+        if self.crop_box is not None:
+            ymin, ymax, xmin, xmax = self.crop_box
+            self.slice_header['NAXIS1'] = xmax - xmin
+            self.slice_header['NAXIS2'] = ymax - ymin
+            self.slice_header['CRPIX1'] -= xmin
+            self.slice_header['CRPIX2'] -= ymin
+        self.size_header = len(self.slice_header.tostring())
+
+        if grid is None:
+            self.header = select_spectral_channels(
+                self.header, self.channel_start, n_channels, binning=self.binning)
+        else:
+            self.header = set_spectral_grid(self.header, grid)
+
+        self.bytes_written = 0
+        self.bytes_uncompacted = 0
+
+    def set_interpolation(self, grid, tolerance=1e-3):
+        """Determine the channels of the cube from which each channel of a spectral grid is interpolated."""
+        self.channels = range(*get_channel_coverage(
+            self.header, grid, tolerance=tolerance))
+        n = self.header['NAXIS3']
+        positions = np.clip(get_spectral_positions(self.header, grid), 0, n - 1)
+        #  channels of the grid within 'tolerance' of a channel of the cube
+        #  are copied instead of interpolated
+        self.lower = np.floor(positions + tolerance).astype(int)
+        self.fraction = positions - self.lower
+        self.fraction[np.abs(self.fraction) < tolerance] = 0.
+
+        used = slice(self.channels.start * self.binning,
+                     self.channels.stop * self.binning)
+        if self.channels:
+            self.channel_range = (int(self.lower[used].min()), int(
+                (self.lower[used] + (self.fraction[used] > 0)).max()) + 1)
+        else:
+            self.channel_range = (0, 0)
+
+    def get_crop_box(self):
+        """Bounding box of the valid data of the selected channels (`None` if they are blank)."""
+        start, stop = self.channel_range
+        if self.hdul is None:
+            return get_bounding_box(get_valid_mask(
+                self.data[self.index + (slice(start, stop), )]))
+
+        valid = np.zeros((self.header['NAXIS2'], self.header['NAXIS1']),
+                         dtype=bool)
+        for channel in range(start, min(stop, self.header['NAXIS3'])):
+            valid |= get_valid_mask(self.data[self.index + (channel, )])
+        return get_bounding_box(valid)
+
+    def read_channel(self, channel):
+        """Read a (binned) channel, cropped to 'crop_box'."""
+        return self.read_channels(channel, channel + 1)[0]
+
+    def read_channels(self, start, stop):
+        """Read the (binned) channels 'start' to 'stop' - 1 as a single block, cropped to 'crop_box'.
+
+        With a spectral grid, only the channels of the cube between the first and last channel that are interpolated are read.
+        """
+        if self.lower is not None:
+            lower = self.lower[start * self.binning:stop * self.binning]
+            fraction = self.fraction[start * self.binning:stop * self.binning]
+            first = lower.min()
+            channels = slice(first, (lower + (fraction > 0)).max() + 1)
+        else:
+            channels = slice(self.channel_start + start * self.binning,
+                             self.channel_start + stop * self.binning)
+        index = self.index + (channels, )
+        if self.crop_box is not None:
+            ymin, ymax, xmin, xmax = self.crop_box
+            index += (slice(ymin, ymax), slice(xmin, xmax))
+        data = self.data[index]
+        if self.lower is not None:
+            data = interpolate_channels(data, lower - first, fraction)
+        if self.binning == 1:
+            return data
+        return bin_channels(data.reshape(
+            (stop - start, self.binning) + data.shape[1:]), axis=1)
+
+    def skip_channels(self, n_channels):
+        """Account for 'n_channels' channels of the mosaic that the cube does not cover and that are not written.
+
+        Such channels were formerly written as float64 slices of NaN values.
+        """
+        self.bytes_uncompacted += n_channels * (self.size_header + get_padded_size(
+            self.header['NAXIS1'] * self.header['NAXIS2'] * 8))
+
+    def write_channel(self, channel, path_channels, overwrite=True):
+        """Write a single channel to the directory 'path_channels'."""
+        slice_data = self.read_channel(channel)
+        self.bytes_uncompacted += self.size_header + get_padded_size(
+            self.header['NAXIS1'] * self.header['NAXIS2'] *
+            slice_data.itemsize)
+        if self.parameters['dtype'] is not None:
+            slice_data = slice_data.astype(self.parameters['dtype'], copy=False)
+
+        filename = get_slice_filename(self.path_to_cube, channel)
+        path_to_file = os.path.join(path_channels, filename)
+        if os.path.exists(path_to_file) and not overwrite:
+            raise OSError("File '{}' already exists.".format(path_to_file))
+
+        #  write to a hidden temporary file first, so that an interrupted
+        #  run never leaves incomplete slices behind
+        path_tmp = os.path.join(path_channels, '.{}'.format(filename))
+        if self.parameters['compress']:
+            #  lossless tile compression
+            hdu = fits.CompImageHDU(
+                slice_data, header=self.slice_header,
+                compression_type='GZIP_2', quantize_level=0.0)
+            fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(
+                path_tmp, overwrite=True)
+        else:
+            fits.writeto(path_tmp, slice_data, header=self.slice_header,
+                         overwrite=True)
+        self.bytes_written += os.path.getsize(path_tmp)
+        os.replace(path_tmp, path_to_file)
+
+    def close(self):
+        if self.hdul is not None:
+            self.hdul.close()
+
+
+def slice_cube(task):
+    """Write the channels of a spectral cube to 2D FITS files (see 'CubeSlicer').
+
+    Parameters
+    ----------
+    task : dict
+        Contains the 'path_to_cube', the 'path_channels' directory, the list of 'channels' that should be written, the number of channels of the mosaic that the cube does not cover ('n_skipped'), the 'overwrite' and 'stream' settings and the 'parameters' for the slices. Cubes held in memory are passed on as 'hdu' tuple (data, header).
+
+    Returns
+    -------
+    dict
+        Contains the 'path_to_cube', the 'header' of the spectral cube with additional axes removed, the number of 'bytes_written' for the slices, the number of 'bytes_uncompacted' that the slices would have needed without skipping and compacting them and the 'duration' of the slicing in seconds.
+
+    """
+    time_start = time.perf_counter()
+    slicer = CubeSlicer(task['path_to_cube'], stream=task['stream'],
+                        parameters=task['parameters'], hdu=task.get('hdu'))
+    for channel in task['channels']:
+        slicer.write_channel(channel, task['path_channels'],
+                             overwrite=task['overwrite'])
+    slicer.skip_channels(task['n_skipped'])
+    slicer.close()
+
+    return {'path_to_cube': task['path_to_cube'], 'header': slicer.header,
+            'bytes_written': slicer.bytes_written,
+            'bytes_uncompacted': slicer.bytes_uncompacted,
+            'duration': time.perf_counter() - time_start}
+
+
+def swarp_channel(task):
+    """Resample and co-add all slices of a single channel with SWarp.
+
+    Each channel is run in its own scratch directory so that the SWarp log file and weight map of simultaneously running channels do not overwrite each other.
+
+    Parameters
+    ----------
+    task : dict
+        Contains the 'channel' name, the 'key' of the task (the channel name or, for tiles, the channel and tile name), the list of 'inputs', the 'path_scratch' directory, the 'imageout_name' and the 'swarp_configuration_file', and optional SWarp command line 'options' and 'swarp_executable'. If a 'header_template' is given, it is used as the '.head' file (with the 'header_suffix') of the output image, which fixes the output grid of SWarp.
+
+    Returns
+    -------
+    dict
+        Contains the 'channel' name, the 'key' of the task, the 'returncode', 'stderr' and 'duration' (in seconds) of the SWarp process, and the number of 'bytes_read' from the inputs and 'bytes_written' to the output image and weight map.
+
+    """
+    if not os.path.exists(task['path_scratch']):
+        os.makedirs(task['path_scratch'])
+
+    if task.get('header_template') is not None:
+        link_file(task['header_template'], os.path.splitext(
+            task['imageout_name'])[0] + task['header_suffix'])
+
+    time_start = time.perf_counter()
+    returncode, stderr = run_swarp(
+        task['inputs'], task['swarp_configuration_file'],
+        task['imageout_name'], cwd=task['path_scratch'],
+        options=task.get('options', {}),
+        list_file=os.path.join(task['path_scratch'], 'inputs.list'),
+        executable=task.get('swarp_executable', 'swarp'))
+
+    duration = time.perf_counter() - time_start
+
+    imageout_name = task['imageout_name']
+    if not os.path.isabs(imageout_name):
+        imageout_name = os.path.join(task['path_scratch'], imageout_name)
+    path_weights = task.get('options', {}).get(
+        'WEIGHTOUT_NAME', os.path.join(task['path_scratch'], 'coadd.weight.fits'))
+    return {'channel': task['channel'], 'key': task['key'],
+            'returncode': returncode, 'stderr': stderr, 'duration': duration,
+            'bytes_read': get_total_size(task['inputs']),
+            'bytes_written': get_total_size([imageout_name, path_weights])}
 
 
 class Swarp(object):
@@ -19,8 +360,46 @@ class Swarp(object):
         self.list_images = None
         self.swarp_configuration_file = None
         self.filename_final = None
+        self.swarp_executable = 'swarp'
 
         self.max_channels = None
+        self.n_workers = 1
+        self.stream_slicing = True
+        self.stream_assembly = False
+        self.resume = False
+        self.path_slice_cache = None
+        self.path_header_index = None
+        self.slice_cache_max_size = None
+        self.plan_footprint = False
+        self.output_grid = 'swarp'
+        self.slice_dtype = 'float32'
+        self.compress_slices = False
+        self.crop_slices = False
+        self.spectral_range = None
+        self.spectral_range_unit = 'channel'
+        self.channel_binning = 1
+        self.align_spectral_axis = False
+        self.staging = 'disk'
+        self.path_tmpfs = '/dev/shm'
+        self.tmpfs_memory_budget = None
+        self.pipeline = False
+        self.queue_depth = 4
+        self.tile_size = None
+        self.image_batch_size = None
+        self.executor = None
+        self.queue_chunk_size = 1
+        self.queue_poll_interval = 1.0
+        self.queue_local_workers = 0
+        self.callbacks = []
+        self.save_run_report = True
+        self.return_hdu = None
+        self.native_coadd = False
+        self.channel_batch_size = None
+        self.plan_resources = False
+        self.memory_budget = None
+        self.disk_budget = None
+        self.core_budget = None
+        self.dry_run = False
 
         self.verbose = True
         self.overwrite = True
@@ -32,6 +411,9 @@ class Swarp(object):
         self.convert_zeros_to_nans = False
         self.list_of_keys_to_remove = []
 
+        #  inputs given as arrays, registered by 'check_settings'
+        self.memory_inputs = {}
+
     def say(self, message):
         """Diagnostic messages."""
         if self.verbose:
@@ -40,198 +422,1701 @@ class Swarp(object):
     def check_settings(self):
         if self.path_swarp is None:
             raise Exception("Need to specify 'path_swarp'")
-        if not os.path.exists(self.path_swarp):
+        self.path_swarp = os.path.abspath(self.path_swarp)
+        #  a dry run leaves the filesystem untouched
+        if not os.path.exists(self.path_swarp) and not self.dry_run:
             os.makedirs(self.path_swarp)
         if self.swarp_configuration_file is None:
             raise Exception("Need to specify 'swarp_configuration_file', i.e. the path to the SWarp configuration file.")
+        self.swarp_configuration_file = os.path.abspath(
+            self.swarp_configuration_file)
+        if self.n_workers < 1:
+            raise Exception("'n_workers' needs to be at least 1")
+        if self.queue_depth < 1:
+            raise Exception("'queue_depth' needs to be at least 1")
+        if int(self.channel_binning) != self.channel_binning or self.channel_binning < 1:
+            raise Exception("'channel_binning' needs to be a positive integer")
+        self.channel_binning = int(self.channel_binning)
+        if self.spectral_range is not None and len(self.spectral_range) != 2:
+            raise Exception("'spectral_range' needs to be a tuple (start, end)")
+        if self.output_grid not in [None, 'swarp', 'wcs']:
+            raise Exception("'output_grid' needs to be None, 'swarp' or 'wcs'")
+        if self.tile_size is not None and self.output_grid is None:
+            raise Exception("Tiling requires a fixed output grid, 'output_grid' needs to be 'swarp' or 'wcs'")
+        if self.image_batch_size is not None:
+            if self.image_batch_size < 2:
+                raise Exception("'image_batch_size' needs to be at least 2")
+            if self.output_grid is None:
+                raise Exception("Batched co-addition requires a fixed output grid, 'output_grid' needs to be 'swarp' or 'wcs'")
+        if self.return_hdu not in [None, 'memory', 'memmap']:
+            raise Exception("'return_hdu' needs to be None, 'memory' or 'memmap'")
+        if self.executor not in [None, 'serial', 'process', 'queue']:
+            raise Exception("'executor' needs to be None, 'serial', 'process' or 'queue'")
+        if self.executor == 'queue':
+            if self.staging != 'disk':
+                raise Exception("The 'queue' executor needs the temporary files on the shared filesystem, 'staging' needs to be 'disk'")
+            if self.pipeline:
+                raise Exception("The 'queue' executor cannot be used in 'pipeline' mode")
         if (self.list_cubes is None) and (self.list_images is None):
             raise Exception("Need to supply either 'list_cubes' (= list of paths to spectral cubes) or 'list_images' (list of paths to images)")
+        if self.list_cubes is not None:
+            self.list_cubes = self.register_inputs(self.list_cubes, 'cube')
+        if self.list_images is not None:
+            if isinstance(self.list_images, str):
+                self.list_images = self.list_images.split()
+            self.list_images = self.register_inputs(self.list_images, 'image')
         if self.filename_final is not None:
             if self.filename_final.endswith('.fits'):
                 self.filename_final = self.filename_final[:-5]
 
         self.restore_cdelt_keys = False
+        self.output_grid_options = {}
+        self.executor_backend = None
+        self.output_hdu = None
+        self.manifest = None
+        self.header_index = HeaderIndex(
+            self.path_header_index, n_workers=self.n_workers)
+        self.instrumentation = Instrumentation(
+            callbacks=self.callbacks, progress_bars=not self.callbacks)
+
+    def register_inputs(self, list_inputs, kind):
+        """Return the paths of the inputs, with inputs held in memory replaced by placeholder paths.
+
+        Inputs given as HDU objects or tuples (data, header) are registered in 'memory_inputs' under a path in the directory 'memory_inputs' of 'path_swarp', which names their slices and is used as their key in all stages. Input cubes are sliced directly from memory; input images are only written to their placeholder path, since SWarp needs them as files.
+        """
+        paths = []
+        for item in list_inputs:
+            if isinstance(item, str):
+                #  the tasks may run in other working directories or on other hosts
+                paths.append(item if item in self.memory_inputs
+                             else os.path.abspath(item))
+                continue
+            data, header = get_data_and_header(item)
+            if kind == 'cube' and header['NAXIS'] < 3:
+                raise Exception("Input cubes need at least 3 axes, got an array of shape {}".format(
+                    data.shape))
+            path = os.path.join(
+                self.path_swarp, 'memory_inputs', 'memory_{}_{:04d}.fits'.format(
+                    kind, len(self.memory_inputs)))
+            #  arrays are not fingerprinted, so their work is never resumed
+            self.memory_inputs[path] = {
+                'data': data, 'header': header,
+                'fingerprint': [path, uuid.uuid4().hex]}
+            paths.append(path)
+        return paths
+
+    def get_memory_input(self, path):
+        """Data and header of an input held in memory (`None` for input files)."""
+        entry = self.memory_inputs.get(path)
+        if entry is None:
+            return None
+        return entry['data'], entry['header']
+
+    def get_input_header(self, path):
+        """FITS header of an input file or of an input held in memory."""
+        if path in self.memory_inputs:
+            return self.memory_inputs[path]['header'].copy()
+        return self.header_index.get_header(path)
+
+    def get_input_footprint(self, path):
+        """Sky coordinates of points along the borders of an input file or of an input held in memory (see 'HeaderIndex.get_footprint')."""
+        if path in self.memory_inputs:
+            return get_edge_coordinates(self.memory_inputs[path]['header'],
+                                        self.header_index.n_edge_points)
+        return self.header_index.get_footprint(path)
+
+    def index_inputs(self, list_inputs):
+        """Read the FITS headers of all input files that are not indexed yet, in parallel with 'n_workers' threads."""
+        paths = [path for path in list_inputs if path not in self.memory_inputs]
+        n_read = self.header_index.update(paths)
+        if self.path_header_index is not None:
+            self.say("read the FITS headers of {} of {} input file(s), the others were taken from the header index".format(
+                n_read, len(paths)))
+
+    def get_input_fingerprint(self, path):
+        if path in self.memory_inputs:
+            return self.memory_inputs[path]['fingerprint']
+        return file_fingerprint(path)
+
+    def write_memory_inputs(self, paths):
+        """Write the inputs held in memory among 'paths' to their placeholder paths for SWarp."""
+        for path in paths:
+            entry = self.memory_inputs.get(path)
+            if entry is None:
+                continue
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            fits.writeto(path, entry['data'], header=entry['header'],
+                         overwrite=True)
+
+    def remove_memory_inputs(self):
+        """Remove the files written for inputs held in memory."""
+        for path in self.memory_inputs:
+            if os.path.exists(path):
+                os.remove(path)
+        path_inputs = os.path.join(self.path_swarp, 'memory_inputs')
+        if os.path.exists(path_inputs) and not os.listdir(path_inputs):
+            os.rmdir(path_inputs)
 
     def clean_up(self):
+        move = 'mv'
+        path_log_file = None
+        path_weighted_coadditon_map = None
         if self.list_cubes is not None:
-            path_log_file = os.path.join(self.path_slices, 'swarp.xml')
-            path_weighted_coadditon_map = os.path.join(
-                self.path_slices, 'coadd.weight.fits')
-        elif self.list_images is not None:
-            path_log_file = os.path.join(self.path_swarp, 'swarp.xml')
+            if not self.remove_temporary_files:
+                #  keep the files of the channel for resumed runs
+                move = 'cp'
+
+            #  keep the SWarp log file of the last channel, the weight maps
+            #  of all channels are assembled into a weight cube
+            if self.tile_size is None:
+                path_log_file = os.path.join(
+                    self.path_slices, self.list_of_channels[-1], 'swarp.xml')
+        elif self.list_images is not None and self.tile_size is None:
+            if self.image_batch_size is None:
+                path_log_file = os.path.join(self.path_swarp, 'swarp.xml')
             path_weighted_coadditon_map = os.path.join(
                 self.path_swarp, 'coadd.weight.fits')
 
-        if self.save_swarp_log:
-            path_log_file_new = os.path.join(
-                self.path_swarp, '{}.xml'.format(self.filename_final))
-            os.system('mv {} {}'.format(path_log_file, path_log_file_new))
-        else:
-            os.system('rm {}'.format(path_log_file))
+        if self.tile_size is not None:
+            #  every tile has its own log file
+            self.say("SWarp log files of the tiles are not kept")
+        elif self.list_images is not None and self.image_batch_size is not None:
+            self.say("SWarp log files of the batches are not kept")
 
-        if self.save_weighted_coaddition_map:
-            path_weighted_coadditon_map_new = os.path.join(
-                self.path_swarp, '{}.coadd.weight.fits'.format(
-                    self.filename_final))
-            os.system('mv {} {}'.format(path_weighted_coadditon_map,
-                                        path_weighted_coadditon_map_new))
-        else:
-            os.system('rm {}'.format(path_weighted_coadditon_map))
+        if path_log_file is not None:
+            if self.save_swarp_log:
+                path_log_file_new = os.path.join(
+                    self.path_swarp, '{}.xml'.format(self.filename_final))
+                os.system('{} {} {}'.format(
+                    move, path_log_file, path_log_file_new))
+            else:
+                os.system('rm {}'.format(path_log_file))
+
+        if path_weighted_coadditon_map is not None:
+            if self.save_weighted_coaddition_map:
+                path_weighted_coadditon_map_new = os.path.join(
+                    self.path_swarp, '{}.coadd.weight.fits'.format(
+                        self.filename_final))
+                os.system('{} {} {}'.format(
+                    move, path_weighted_coadditon_map,
+                    path_weighted_coadditon_map_new))
+            else:
+                os.system('rm {}'.format(path_weighted_coadditon_map))
 
     def initialize_cube_mosaicking(self):
         if self.list_cubes is None:
             raise Exception("Need to supply either 'list_cubes' (= list of paths to spectral cubes)")
 
-        self.path_channels = os.path.join(self.path_swarp, 'channels')
-        if not os.path.exists(self.path_channels):
-            os.makedirs(self.path_channels)
+        self.staging_backend, message = get_staging(
+            self.staging, self.path_swarp, self.estimate_scratch_size(),
+            path_tmpfs=self.path_tmpfs, memory_budget=self.tmpfs_memory_budget)
+        self.say(message)
 
-        self.path_slices = os.path.join(self.path_swarp, 'slices')
-        if not os.path.exists(self.path_slices):
-            os.makedirs(self.path_slices)
+        self.path_channels = self.staging_backend.make_directory('channels')
+        self.path_slices = self.staging_backend.make_directory('slices')
 
         self.list_of_channels = []
         for channel in range(self.max_channels):
             self.list_of_channels.append('channel_{:04d}'.format(channel))
 
+        self.manifest = Manifest(
+            os.path.join(self.path_swarp, 'manifest.json'), resume=self.resume)
+
+        self.slice_cache = None
+        if self.path_slice_cache is not None:
+            self.slice_cache = SliceCache(
+                self.path_slice_cache, max_size=self.slice_cache_max_size)
+
     def mosaic_cubes(self):
         self.check_settings()
-        self.max_channels = self.check_channels()
-        self.initialize_cube_mosaicking()
-        self.slice_cubes()
-        self.swarp_slices()
-        self.assemble_cube()
-        self.clean_up()
+        if self.dry_run:
+            return self.plan_dry_run('cubes')
+        stage = self.instrumentation.stage
+        with self.run_report('mosaic_cubes'):
+            with stage('initialize'):
+                self.max_channels = self.check_channels()
+                if self.plan_resources:
+                    self.apply_execution_plan(self.plan_execution('cubes'))
+                native_grid = None
+                if self.native_coadd:
+                    native_grid = self.plan_native_coadd()
+                if native_grid is None:
+                    if self.plan_footprint:
+                        self.plan_output_grid(self.list_cubes)
+                    self.initialize_cube_mosaicking()
+            if native_grid is not None:
+                with stage('coadd_aligned_cubes'):
+                    self.coadd_aligned_cubes(*native_grid)
+                return self.get_output_hdu()
+            if self.pipeline:
+                with stage('pipeline'):
+                    self.run_pipeline()
+            else:
+                with stage('slice_cubes'):
+                    self.slice_cubes()
+                with stage('swarp_slices'):
+                    self.swarp_slices()
+                with stage('assemble_cube'):
+                    self.assemble_cube()
+            with stage('clean_up'):
+                self.clean_up()
 
-        if self.remove_temporary_files:
-            os.system('rm -r {}'.format(self.path_slices))
-            os.system('rm -r {}'.format(self.path_channels))
-
-        self.restore_values()
+                if self.remove_temporary_files:
+                    self.staging_backend.clean_up()
+                    self.manifest.remove()
+        return self.get_output_hdu()
 
     def mosaic_images(self):
         self.check_settings()
-        self.assemble_image()
-        self.clean_up()
-        self.restore_values()
+        if self.dry_run:
+            return self.plan_dry_run('images')
+        stage = self.instrumentation.stage
+        with self.run_report('mosaic_images'):
+            with stage('initialize'):
+                self.index_inputs(self.list_images)
+                if self.plan_resources:
+                    self.apply_execution_plan(self.plan_execution('images'))
+                if self.plan_footprint:
+                    self.plan_output_grid(self.list_images)
+            if self.tile_size is not None:
+                with stage('assemble_image_tiles'):
+                    self.assemble_image_tiles()
+            elif self.image_batch_size is not None:
+                with stage('assemble_image_batches'):
+                    self.assemble_image_batches()
+            else:
+                with stage('assemble_image'):
+                    self.assemble_image()
+            with stage('clean_up'):
+                self.clean_up()
+                if self.remove_temporary_files:
+                    self.remove_memory_inputs()
+            with stage('restore_values'):
+                self.restore_values()
+        return self.get_output_hdu()
+
+    def get_output_hdu(self):
+        """Return the final mosaic as HDU as requested by 'return_hdu' (`None` if it is not set).
+
+        A cube mosaic assembled in memory is returned without writing 'filename_final'. Mosaics that were written to disk anyway (images swarped by SWarp and cubes with 'stream_assembly') are read back from 'filename_final', either fully ('memory') or with memory mapping ('memmap').
+        """
+        if self.return_hdu is None:
+            return None
+        if self.output_hdu is not None:
+            return self.output_hdu
+        path_to_file = os.path.join(
+            self.path_swarp, '{}.fits'.format(self.filename_final))
+        if self.return_hdu == 'memmap':
+            return fits.open(path_to_file, memmap=True)[0]
+        with fits.open(path_to_file, memmap=False) as hdul:
+            return fits.PrimaryHDU(hdul[0].data, header=hdul[0].header)
+
+    def get_resource_budget(self):
+        """Memory, disk space and cores available to the mosaic, limited by the budget settings."""
+        budget = get_available_resources(self.path_swarp)
+        for key, value in [('memory', self.memory_budget),
+                           ('disk', self.disk_budget),
+                           ('cores', self.core_budget)]:
+            if value is not None:
+                budget[key] = value
+        return budget
+
+    def plan_execution(self, kind):
+        """Estimate the memory and disk space needed for the mosaic from the FITS headers of the inputs.
+
+        If 'plan_resources' is set, the number of workers, the streaming or in-memory assembly of cubes, the number of channels co-added at a time without SWarp and the tiling of images are chosen to fit the resource budget (see 'plan_cube_mosaic' and 'plan_image_mosaic'); otherwise the estimates are made for the current settings.
+
+        Parameters
+        ----------
+        kind : str
+            'cubes' or 'images'.
+
+        Returns
+        -------
+        dict
+            The 'settings', the 'estimates' in bytes, 'warnings' if the budget is exceeded and the 'budget' itself.
+
+        """
+        budget = self.get_resource_budget()
+        choose = self.plan_resources
+        if kind == 'cubes':
+            n_pixels = self.estimate_output_pixels(self.list_cubes)
+            cubes = []
+            for path_to_cube in self.list_cubes:
+                header = self.dict_cube_headers[path_to_cube]
+                n_pixels_cube = header['NAXIS1'] * header['NAXIS2']
+                cubes.append((self.dict_n_channels[path_to_cube], n_pixels_cube,
+                              n_pixels_cube * abs(header['BITPIX']) // 8 *
+                              self.channel_binning))
+            plan = plan_cube_mosaic(
+                cubes, self.max_channels, n_pixels, budget,
+                n_workers=None if choose else self.n_workers,
+                stream_assembly=None if choose else self.stream_assembly,
+                channel_batch_size=None if choose else self.get_channel_batch_size(n_pixels),
+                save_weights=self.save_weighted_coaddition_map,
+                slice_itemsize=4 if self.slice_dtype is None else np.dtype(self.slice_dtype).itemsize,
+                stream_slicing=self.stream_slicing or self.pipeline,
+                write_output=self.return_hdu != 'memory',
+                native=self.native_coadd)
+        else:
+            images = []
+            for path in self.list_images:
+                header = self.get_input_header(path)
+                images.append(header['NAXIS1'] * header['NAXIS2'])
+            plan = plan_image_mosaic(
+                images, self.estimate_output_pixels(self.list_images), budget,
+                n_workers=None if choose else self.n_workers,
+                tile_size=self.tile_size,
+                parallel=self.tile_size is not None or self.image_batch_size is not None,
+                save_weights=self.save_weighted_coaddition_map,
+                allow_tiling=choose and self.output_grid is not None and self.image_batch_size is None)
+        plan['budget'] = budget
+        return plan
+
+    def estimate_output_pixels(self, list_paths):
+        """Number of pixels of the output grid, estimated from the FITS headers of the inputs."""
+        try:
+            width, height = self.get_mosaic_footprint(list_paths)['image_size']
+            return width * height
+        except Exception:
+            #  e.g. output grids without celestial projection
+            return sum(self.get_input_header(path)['NAXIS1'] *
+                       self.get_input_header(path)['NAXIS2']
+                       for path in list_paths)
+
+    def apply_execution_plan(self, plan):
+        self.say_execution_plan(plan)
+        for name, value in plan['settings'].items():
+            setattr(self, name, value)
+
+    def say_execution_plan(self, plan):
+        budget, estimates = plan['budget'], plan['estimates']
+        self.say("resource budget: {} memory, {} disk space, {} core(s)".format(
+            format_size(budget['memory']), format_size(budget['disk']),
+            budget['cores']))
+        self.say("estimated output: {}, temporary files: {}, disk space: {}, peak memory: {} ({} per SWarp process)".format(
+            format_size(estimates['output']), format_size(estimates['scratch']),
+            format_size(estimates['disk']), format_size(estimates['memory']),
+            format_size(estimates['swarp_process'])))
+        self.say("execution settings: {}".format(', '.join(
+            '{} = {}'.format(name, value)
+            for name, value in sorted(plan['settings'].items()))))
+        for warning in plan['warnings']:
+            self.say("warning: {}".format(warning))
+
+    def plan_dry_run(self, kind):
+        """Print the execution plan of the mosaic and return it, without mosaicking anything."""
+        if kind == 'cubes':
+            self.max_channels = self.check_channels()
+        else:
+            self.index_inputs(self.list_images)
+        plan = self.plan_execution(kind)
+        self.say("dry run, the mosaic is not created")
+        self.say_execution_plan(plan)
+        return plan
+
+    @contextmanager
+    def run_report(self, method):
+        """Write the run report of 'method' once it finished or failed."""
+        status = 'failed'
+        try:
+            yield
+            status = 'ok'
+        finally:
+            self.close_executor()
+            if self.manifest is not None:
+                #  keep the completed work of a failed run for 'resume'
+                self.manifest.flush()
+            if self.save_run_report:
+                self.write_run_report(method, status)
+
+    def get_run_report_filename(self, method):
+        filename_final = self.filename_final
+        if filename_final is None:
+            filename_final = 'swarp_final'
+        if method == 'add_to_mosaic':
+            return os.path.join(self.path_swarp, '{}.add_to_mosaic.report.json'.format(
+                filename_final))
+        return os.path.join(self.path_swarp, '{}.report.json'.format(
+            filename_final))
+
+    def write_run_report(self, method, status):
+        """Save the measurements of the instrumentation as JSON file next to the mosaic."""
+        list_inputs = self.list_cubes if self.list_cubes is not None \
+            else self.list_images
+        if isinstance(list_inputs, str):
+            list_inputs = list_inputs.split()
+        path_to_file = self.get_run_report_filename(method)
+        self.instrumentation.write_report(
+            path_to_file, method=method, status=status,
+            filename_final=self.filename_final, n_inputs=len(list_inputs),
+            settings={name: getattr(self, name) for name in [
+                'n_workers', 'executor', 'pipeline', 'stream_slicing',
+                'stream_assembly', 'staging', 'output_grid', 'tile_size',
+                'image_batch_size', 'slice_dtype', 'compress_slices',
+                'resume', 'native_coadd']})
+        self.say("saved run report in {}".format(path_to_file))
+
+    def add_to_mosaic(self):
+        """Add new cubes or images to an existing mosaic.
+
+        Only the new inputs given in 'list_cubes' (or 'list_images') are swarped, onto the section of the grid of the existing mosaic 'filename_final' in 'path_swarp' that they cover. This section of the mosaic is then updated in place as the weighted mean of its current values and the new maps, using the weight cube (or weight map) saved next to the mosaic, which is updated as well. The channels of the new cubes have to correspond to the channels of the mosaic.
+        """
+        self.check_settings()
+        if self.filename_final is None:
+            raise Exception("Need to specify 'filename_final' of the existing mosaic")
+        with self.run_report('add_to_mosaic'):
+            self.update_existing_mosaic()
+
+    def update_existing_mosaic(self):
+        stage = self.instrumentation.stage
+        path_mosaic = os.path.join(
+            self.path_swarp, '{}.fits'.format(self.filename_final))
+        path_weights = self.get_weight_cube_filename()
+        for path in [path_mosaic, path_weights]:
+            if not os.path.exists(path):
+                raise Exception("Could not find '{}'. The mosaic needs to be created with 'save_weighted_coaddition_map' set to `True`.".format(path))
+        header = fits.getheader(path_mosaic)
+
+        if self.list_cubes is not None:
+            with stage('initialize'):
+                if self.check_channels(header_mosaic=header) > header['NAXIS3']:
+                    self.say("channels beyond the {} channels of the mosaic are skipped".format(
+                        header['NAXIS3']))
+                self.max_channels = header['NAXIS3']
+                window = self.get_update_window(header, self.list_cubes)
+                self.initialize_cube_mosaicking()
+                header_template = self.write_mosaic_grid_template(
+                    window['header'], self.path_slices)
+            with stage('slice_cubes'):
+                self.slice_cubes()
+            with stage('swarp_slices'):
+                self.swarp_slices(header_template=header_template)
+
+            self.say("adding cubes to mosaic...")
+            with stage('update_mosaic'):
+                #  the channels are read one at a time while updating
+                planes = ((idx, ) + self.read_channel(idx, weights=True)
+                          for idx, filename in enumerate(self.list_slices)
+                          if filename not in self.list_empty_slices)
+                self.update_mosaic(path_mosaic, path_weights, planes, window)
+
+            if self.remove_temporary_files:
+                self.staging_backend.clean_up()
+                self.manifest.remove()
+        else:
+            list_images = self.get_list_of_images()
+            window = self.get_update_window(header, list_images)
+            self.staging_backend = DiskStaging(self.path_swarp)
+            path_new = self.staging_backend.make_directory('new_images')
+            self.header_suffix = self.get_header_suffix()
+            filename = os.path.join(path_new, 'new_images.fits')
+
+            self.say("swarping new images...")
+            with stage('swarp_images'):
+                result = swarp_channel(self.make_swarp_task(
+                    'new_images', list_images, filename, path_new,
+                    header_template=self.write_mosaic_grid_template(
+                        window['header'], path_new), parallel=False))
+                self.record_swarp_task(result)
+            if result['returncode'] != 0:
+                raise Exception("SWarp failed:\n{}".format(result['stderr']))
+
+            self.say("adding images to mosaic...")
+            with stage('update_mosaic'):
+                self.update_mosaic(path_mosaic, path_weights, [
+                    ((), fits.getdata(filename),
+                     fits.getdata(get_weight_filename(filename)))], window)
+
+            if self.remove_temporary_files:
+                self.staging_backend.clean_up()
+                self.remove_memory_inputs()
+
+        self.say("updated '{}' in {}".format(
+            self.filename_final, self.path_swarp))
+
+    def get_update_window(self, header, list_paths):
+        """Section of the grid of an existing mosaic that is covered by the new inputs (see 'get_footprint_window')."""
+        self.index_inputs(list_paths)
+        window = get_footprint_window(
+            header, [self.get_input_footprint(path) for path in list_paths])
+        if window is None:
+            raise Exception("None of the new inputs overlaps the mosaic")
+        self.say("updating a section of {} x {} of the {} x {} pixels of the mosaic".format(
+            window['nx'], window['ny'], header['NAXIS1'], header['NAXIS2']))
+        return window
+
+    def write_mosaic_grid_template(self, header, path_root):
+        """Write the celestial grid of an existing mosaic as SWarp header template."""
+        grid_header = WCS(header).celestial.to_header()
+        grid_header.insert(0, ('NAXIS', 2))
+        grid_header.insert(1, ('NAXIS1', header['NAXIS1']))
+        grid_header.insert(2, ('NAXIS2', header['NAXIS2']))
+        path_template = os.path.join(path_root, 'output_grid.head')
+        grid_header.totextfile(path_template, overwrite=True)
+        return path_template
+
+    def update_mosaic(self, path_mosaic, path_weights, planes, window=None):
+        """Update a mosaic and its weights in place with newly swarped maps.
+
+        The mosaic and its weights are updated through memory maps, so only the section of the planes covered by the new maps is read and written.
+
+        Parameters
+        ----------
+        path_mosaic : str
+            Path to the mosaic.
+        path_weights : str
+            Path to the weight map (or weight cube) of the mosaic.
+        planes : iterable
+            Tuples of the index of the plane in the mosaic (i.e. the channel, or `()` for images), the new swarped map and its weight map. They are processed one at a time, so they can be read lazily by a generator.
+        window : dict
+            Section of the grid of the mosaic that the new maps cover, given by its lower left pixel ('x0', 'y0') and size ('nx', 'ny') (see 'get_footprint_window'). By default the new maps cover the full grid.
+
+        """
+        with fits.open(path_mosaic, mode='update', memmap=True) as hdul_mosaic, \
+                fits.open(path_weights, mode='update', memmap=True) as hdul_weights:
+            mosaic = hdul_mosaic[0].data
+            weights = hdul_weights[0].data
+            section = ()
+            if window is not None:
+                section = (slice(window['y0'], window['y0'] + window['ny']),
+                           slice(window['x0'], window['x0'] + window['nx']))
+            for idx, data, weight_map in planes:
+                plane = mosaic[idx][section]
+                weight_plane = weights[idx][section]
+                if data.shape != plane.shape:
+                    raise Exception("Shape of the new map {} does not match shape of the mosaic {}".format(
+                        data.shape, plane.shape))
+
+                data = self.finalize_data(data.astype(np.float64))
+                new = np.isfinite(data) & (weight_map > 0)
+                old_weights = weight_plane[new].astype(np.float64)
+                total_weights = old_weights + weight_map[new]
+                plane[new] = (np.nan_to_num(plane[new]) * old_weights +
+                              data[new] * weight_map[new]) / total_weights
+                weight_plane[new] = total_weights
+
+    def slicing_parameters(self):
+        """Parameters that determine the content of the channel slices."""
+        parameters = {'change_header': {'format': 'pp', 'keep_axis': '1'},
+                'dtype': self.slice_dtype,
+                'compress': self.compress_slices,
+                'crop': self.crop_slices,
+                'channel_range': self.channel_range,
+                'binning': self.channel_binning}
+        if self.spectral_grid is not None:
+            parameters['spectral_grid'] = self.spectral_grid
+        return parameters
 
     def slice_cubes(self):
-        total = len(self.list_cubes)
-        for i, path_to_cube in enumerate(self.list_cubes):
-            self.dirname = os.path.dirname(path_to_cube)
-            self.file = os.path.basename(path_to_cube)
-            self.filename, self.file_extension = os.path.splitext(self.file)
-
-            end = '\r'
-            if i + 1 == total:
-                end = '\n'
-            if self.verbose:
-                print("slicing cube {}...".format(self.filename), end=end)
-
-            data = fits.getdata(path_to_cube)
-            header = fits.getheader(path_to_cube)
-
-            if len(data.shape) == 4:
-                data, header = remove_additional_axes(
-                    data, header)
-
-            if i == 0:
-                self.header = header.copy()
-
-            for channel in range(self.max_channels):
-                if channel > (header['NAXIS3'] - 1):
-                    # create 2D array with nan values
-                    slice_data = np.empty(
-                            (header['NAXIS2'], header['NAXIS1']))
-                    slice_data[:] = np.NAN
-                else:
-                    slice_data = data[channel, :, :]
-                slice_header = change_header(header.copy())
-
-                suffix = 'channel_{:04d}'.format(channel)
-
-                filename = '{}_{}.fits'.format(
-                        self.filename, suffix)
-                path_to_file = os.path.join(self.path_channels, filename)
-
-                fits.writeto(path_to_file, slice_data, header=slice_header,
-                             overwrite=self.overwrite)
-
-    def check_channels(self):
-        list_channels = []
+        parameters = self.slicing_parameters()
+        cache_entries = []
+        self.scratch_bytes = {'written': 0, 'uncompacted': 0}
+
+        tasks = []
+        memory_tasks = []
+        dict_channels = {}
         for path_to_cube in self.list_cubes:
-            header = fits.getheader(path_to_cube)
-            list_channels.append(header['NAXIS3'])
-        return max(list_channels)
+            fingerprint, channels = self.get_channels_to_slice(
+                path_to_cube, parameters)
+            dict_channels[path_to_cube] = (fingerprint, channels)
+
+            path_channels = self.path_channels
+            channels_to_slice = channels
+            hdu = self.get_memory_input(path_to_cube)
+            if self.slice_cache is not None and hdu is None:
+                #  slice only channels that are not cached yet
+                path_channels = self.slice_cache.get_entry(
+                    path_to_cube, parameters)
+                cache_entries.append(path_channels)
+                channels_to_slice = [
+                    channel for channel in channels
+                    if not os.path.exists(os.path.join(
+                        path_channels, get_slice_filename(
+                            path_to_cube, channel)))]
+
+            task = {
+                'path_to_cube': path_to_cube,
+                'path_channels': path_channels,
+                'channels': channels_to_slice,
+                'n_skipped': self.get_n_skipped_channels(path_to_cube),
+                'overwrite': self.slice_cache is not None or self.overwrite,
+                'stream': self.stream_slicing,
+                'parameters': parameters}
+            if hdu is not None:
+                task['hdu'] = hdu
+                memory_tasks.append(task)
+            else:
+                tasks.append(task)
+
+        self.say("slicing {} cube(s)...".format(len(tasks) + len(memory_tasks)))
+        pbar = self.instrumentation.progress(len(tasks) + len(memory_tasks))
+        #  cubes held in memory are sliced in this process, so their data
+        #  never has to be passed on to the workers
+        for result in itertools.chain(self.run_tasks(slice_cube, tasks),
+                                      map(slice_cube, memory_tasks)):
+            pbar.update(1)
+            path_to_cube = result['path_to_cube']
+            fingerprint, channels = dict_channels[path_to_cube]
+            self.scratch_bytes['written'] += result['bytes_written']
+            self.scratch_bytes['uncompacted'] += result['bytes_uncompacted']
+            self.instrumentation.record_task(
+                path_to_cube, duration=result['duration'],
+                bytes_written=result['bytes_written'])
+
+            if self.slice_cache is not None and \
+                    path_to_cube not in self.memory_inputs:
+                path_channels = self.slice_cache.get_entry(
+                    path_to_cube, parameters)
+                for channel in channels:
+                    filename = get_slice_filename(path_to_cube, channel)
+                    link_file(os.path.join(path_channels, filename),
+                              os.path.join(self.path_channels, filename))
+
+            self.manifest.set_complete(
+                'slices', path_to_cube, fingerprint, channels)
+
+            if path_to_cube == self.list_cubes[0]:
+                self.header = result['header'].copy()
+        pbar.close()
+        self.manifest.flush()
+
+        self.say_scratch_bytes()
+
+        if self.slice_cache is not None:
+            removed = self.slice_cache.evict(keep=cache_entries)
+            if removed:
+                self.say("removed {} cube(s) from the slice cache".format(
+                    removed))
+
+    def say_scratch_bytes(self):
+        self.say("wrote {:.1f} MB of slices ({:.1f} MB saved by skipping and compacting slices)".format(
+            self.scratch_bytes['written'] / 1024**2,
+            (self.scratch_bytes['uncompacted'] - self.scratch_bytes['written']) / 1024**2))
+
+    def get_n_skipped_channels(self, path_to_cube):
+        """Number of channels of the mosaic that are not covered by a cube."""
+        start, stop = self.dict_channel_coverage[path_to_cube]
+        return self.max_channels - max(min(self.max_channels, stop) - start, 0)
+
+    def get_channels_to_slice(self, path_to_cube, parameters):
+        """Return the fingerprint of a cube and its channels that are missing or stale."""
+        fingerprint = hash_fingerprint(
+            self.get_input_fingerprint(path_to_cube), parameters)
+        completed = self.manifest.completed_items(
+            'slices', path_to_cube, fingerprint)
+        start, stop = self.dict_channel_coverage[path_to_cube]
+        channels = [channel for channel in range(start, min(self.max_channels, stop))
+                    if channel not in completed or not os.path.exists(
+                        os.path.join(self.path_channels, get_slice_filename(
+                            path_to_cube, channel)))]
+        return fingerprint, channels
+
+    def estimate_scratch_size(self):
+        """Estimate the size of the temporary files of a cube mosaic in bytes.
+
+        The channel slices of all cubes are accounted for, as well as the same amount again for the swarped channel maps and their weight maps.
+        """
+        itemsize = 4 if self.slice_dtype is None else np.dtype(
+            self.slice_dtype).itemsize
+        n_bytes = 0
+        for path_to_cube, header in self.dict_cube_headers.items():
+            start, stop = self.dict_channel_coverage[path_to_cube]
+            n_channels = max(min(self.max_channels, stop) - start, 0)
+            n_bytes += n_channels * header['NAXIS1'] * header['NAXIS2'] * itemsize
+        return 3 * n_bytes
+
+    def check_channels(self, header_mosaic=None):
+        """Return the number of channels of the mosaic.
+
+        The 'spectral_range' is converted to the 'channel_range' of the first cube, which is applied to all cubes. The number of channels of each cube is counted after selecting this range and binning it by 'channel_binning'.
+
+        If 'align_spectral_axis' is set, the cubes are instead resampled onto a common spectral grid with the channels of the first cube, which covers the 'channel_range' or else the spectral axes of all cubes (see 'get_common_spectral_grid'). When adding cubes to an existing mosaic, the spectral axis of the mosaic given by 'header_mosaic' is used as grid.
+        """
+        self.index_inputs(self.list_cubes)
+        self.dict_n_channels = {}
+        self.dict_channel_coverage = {}
+        self.dict_cube_headers = {}
+        self.spectral_grid = None
+        for path_to_cube in self.list_cubes:
+            header = self.get_input_header(path_to_cube)
+            self.dict_cube_headers[path_to_cube] = header
+            if path_to_cube == self.list_cubes[0]:
+                self.channel_range = (0, header['NAXIS3'])
+                if self.spectral_range is not None:
+                    self.channel_range = get_channel_range(
+                        header, self.spectral_range,
+                        unit=self.spectral_range_unit)
+            start, stop = self.channel_range
+            self.dict_channel_coverage[path_to_cube] = (0, max(
+                min(stop, header['NAXIS3']) - start, 0) // self.channel_binning)
+
+        if self.align_spectral_axis:
+            if header_mosaic is not None:
+                self.spectral_grid = get_common_spectral_grid(
+                    [header_mosaic], (0, header_mosaic['NAXIS3']))
+            else:
+                self.spectral_grid = get_common_spectral_grid(
+                    list(self.dict_cube_headers.values()),
+                    None if self.spectral_range is None else self.channel_range,
+                    binning=self.channel_binning)
+            for path_to_cube, header in self.dict_cube_headers.items():
+                self.dict_channel_coverage[path_to_cube] = get_channel_coverage(
+                    header, self.spectral_grid)
 
-    def swarp_slices(self):
+        for path_to_cube, (start, stop) in self.dict_channel_coverage.items():
+            self.dict_n_channels[path_to_cube] = stop - start
+        n_channels = max(stop for start, stop in self.dict_channel_coverage.values())
+        if n_channels == 0:
+            raise Exception("The spectral range {} contains no (complete bin of) channels".format(
+                self.spectral_range))
+        if self.spectral_grid is not None:
+            self.say("aligning the spectral axes of the cubes on {} channel(s) of {:g} {}".format(
+                n_channels, self.spectral_grid['step'] * self.spectral_grid['binning'],
+                self.spectral_grid['unit']))
+        elif self.spectral_range is not None or self.channel_binning > 1:
+            self.say("mosaicking channels {} to {} of the cubes, binned by {} into {} channel(s)".format(
+                self.channel_range[0], self.channel_range[1] - 1,
+                self.channel_binning, n_channels))
+        return n_channels
+
+    def swarp_slices(self, header_template=None):
         self.say("swarp slices...")
 
-        self.list_slices = []
+        self.initialize_swarp_tasks(header_template=header_template)
+        tasks = []
+        n_skipped = 0
+        for channel, filename in zip(self.list_of_channels, self.list_slices):
+            channel_tasks = self.get_swarp_tasks(channel)
+            if not channel_tasks and filename not in self.list_empty_slices:
+                n_skipped += 1
+            tasks += channel_tasks
+
+        if n_skipped > 0:
+            self.say("skipping {} already swarped channel(s)...".format(
+                n_skipped))
 
-        pbar = tqdm(total=len(self.list_of_channels))
-        for channel in self.list_of_channels:
+        pbar = self.instrumentation.progress(len(tasks))
+        for result in self.run_tasks(swarp_channel, tasks):
             pbar.update(1)
-            nameListFiles = os.path.join(
-                    self.path_channels, '*{}*'.format(channel))
-            filename = '{}.fits'.format(channel)
-            self.list_slices.append(filename)
-            cwd = os.getcwd()
-            os.chdir(self.path_slices)
-            os.system('swarp {a} -c {b} -IMAGEOUT_NAME {c} -VERBOSE_TYPE QUIET'.format(
-                    a=nameListFiles, b=self.swarp_configuration_file, c=filename))
-            os.chdir(cwd)
+            self.record_swarp_result(result)
+        pbar.close()
+        self.manifest.flush()
+
+        self.check_swarp_failures()
+
+    def run_pipeline(self):
+        """Slice, swarp and assemble the channels of the cubes in a pipeline.
+
+        A slicing thread writes the channels of all cubes one channel after another, 'n_workers' threads run SWarp on the sliced channels, and the swarped channel maps are assembled in the main thread. The stages are connected by queues holding at most 'queue_depth' channels, so channel k can be assembled while channel k+1 is resampled and channel k+2 is sliced, and the number of channels held in between stays bounded. The cubes are always sliced in streaming mode; the slice cache is not used. If the assembly fails, the slicing and SWarp threads are stopped before the error is raised.
+        """
+        self.say("slicing, swarping and assembling channels in a pipeline...")
+
+        parameters = self.slicing_parameters()
+        slicers = []
+        for path_to_cube in self.list_cubes:
+            fingerprint, channels = self.get_channels_to_slice(
+                path_to_cube, parameters)
+            slicer = CubeSlicer(path_to_cube, stream=True, parameters=parameters,
+                                hdu=self.get_memory_input(path_to_cube))
+            slicers.append((slicer, fingerprint, set(channels)))
+        self.header = slicers[0][0].header.copy()
+
+        def slice_channel(channel):
+            for slicer, fingerprint, channels in slicers:
+                if channel in channels:
+                    slicer.write_channel(channel, self.path_channels,
+                                         overwrite=self.overwrite)
+                    self.manifest.set_complete(
+                        'slices', slicer.path_to_cube, fingerprint, [channel])
+
+        #  the output grid template is determined from the first channel
+        #  of each cube
+        first_channels = sorted({slicer.channels.start
+                                 for slicer, fingerprint, channels in slicers
+                                 if slicer.channels})
+        for channel in first_channels:
+            slice_channel(channel)
+        self.initialize_swarp_tasks()
+
+        queue_sliced = queue.Queue(maxsize=self.queue_depth)
+        queue_swarped = queue.Queue(maxsize=self.queue_depth)
+        errors = []
+        #  set if the pipeline ends, so that no thread stays blocked on a queue
+        stop = threading.Event()
+
+        def put(queue_out, item):
+            while not stop.is_set():
+                try:
+                    queue_out.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def get(queue_in):
+            while not stop.is_set():
+                try:
+                    return queue_in.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return None
+
+        def slice_channels():
+            try:
+                for channel in range(self.max_channels):
+                    if stop.is_set():
+                        return
+                    if channel not in first_channels:
+                        slice_channel(channel)
+                    put(queue_sliced, self.list_of_channels[channel])
+            except Exception:
+                errors.append(traceback.format_exc())
+            finally:
+                for _ in range(self.n_workers):
+                    put(queue_sliced, None)
+
+        def swarp_channels():
+            while True:
+                channel = get(queue_sliced)
+                if channel is None:
+                    put(queue_swarped, None)
+                    return
+                returncode = 0
+                try:
+                    for task in self.get_swarp_tasks(channel):
+                        result = swarp_channel(task)
+                        self.record_swarp_result(result)
+                        returncode = returncode or result['returncode']
+                except Exception:
+                    returncode = -1
+                    self.record_swarp_result({
+                        'channel': channel, 'key': channel, 'returncode': -1,
+                        'stderr': traceback.format_exc()})
+                put(queue_swarped, {'channel': channel,
+                                    'returncode': returncode})
+
+        threads = [threading.Thread(target=slice_channels, daemon=True)]
+        for _ in range(self.n_workers):
+            threads.append(threading.Thread(target=swarp_channels, daemon=True))
+        for thread in threads:
+            thread.start()
+
+        self.output_array = None
+        pending = []
+        n_finished = 0
+        pbar = self.instrumentation.progress(self.max_channels)
+        try:
+            while n_finished < self.n_workers:
+                result = queue_swarped.get()
+                if result is None:
+                    n_finished += 1
+                    continue
+                pbar.update(1)
+                if result['returncode'] != 0:
+                    continue
+
+                idx = self.list_of_channels.index(result['channel'])
+                pending.append(idx)
+                if self.output_array is None and \
+                        self.list_slices[idx] not in self.list_empty_slices:
+                    self.initialize_output_cube(
+                        self.get_channel_header(self.list_slices[idx]))
+                if self.output_array is None:
+                    continue
+
+                for idx in pending:
+                    self.assemble_channel(idx, self.list_slices[idx])
+                    if self.remove_temporary_files:
+                        self.remove_channel_files(self.list_of_channels[idx])
+                pending = []
+        finally:
+            #  if the assembly failed, the slicing and SWarp threads stop
+            #  after their current channel, and the error is passed on
+            stop.set()
+            for thread in threads:
+                thread.join()
+            pbar.close()
+            for slicer, fingerprint, channels in slicers:
+                slicer.close()
+
+        self.manifest.flush()
+        self.scratch_bytes = {'written': 0, 'uncompacted': 0}
+        for slicer, fingerprint, channels in slicers:
+            slicer.skip_channels(self.get_n_skipped_channels(slicer.path_to_cube))
+            self.scratch_bytes['written'] += slicer.bytes_written
+            self.scratch_bytes['uncompacted'] += slicer.bytes_uncompacted
+        self.say_scratch_bytes()
+
+        if errors:
+            raise Exception("Slicing of the cubes failed:\n{}".format(errors[0]))
+        self.check_swarp_failures()
+        if self.output_array is None:
+            raise Exception("None of the channels is covered by the cubes.")
+
+        self.save_output_cube()
+
+    def plan_native_coadd(self):
+        """Check whether the cubes can be co-added on their common pixel grid without SWarp.
+
+        Returns
+        -------
+        tuple
+            The slicers of the cubes, the FITS header of the output grid and the offsets of the cubes on it, or `None` if the cubes have to be resampled by SWarp.
+
+        """
+        reason = get_native_coadd_blocker(
+            read_swarp_configuration(self.swarp_configuration_file),
+            self.dict_cube_headers[self.list_cubes[0]])
+        if reason is None and self.plan_footprint:
+            reason = "'plan_footprint' is set"
+        if reason is None:
+            parameters = self.slicing_parameters()
+            slicers = [CubeSlicer(path_to_cube, stream=self.stream_slicing,
+                                  parameters=parameters,
+                                  hdu=self.get_memory_input(path_to_cube))
+                       for path_to_cube in self.list_cubes]
+            header, offsets = get_grid_offsets(
+                [slicer.slice_header for slicer in slicers])
+            if header is None:
+                for slicer in slicers:
+                    slicer.close()
+                reason = "the cubes are not aligned on a common pixel grid"
+        if reason is not None:
+            self.say("co-adding the cubes with SWarp, since {}".format(reason))
+            return None
+        return slicers, header, offsets
+
+    def get_channel_batch_size(self, n_pixels):
+        """Number of channels co-added at a time without SWarp."""
+        if self.channel_batch_size is not None:
+            return self.channel_batch_size
+        return max(1, 256 * 1024**2 // (BYTES_PER_OUTPUT_PIXEL * n_pixels))
+
+    def coadd_aligned_cubes(self, slicers, header, offsets):
+        """Co-add cubes that lie on a common pixel grid without SWarp.
+
+        The cubes are read in blocks of 'channel_batch_size' channels (by default as many as fit into about 256 MB of the output grid), which are averaged directly into the final cube, as SWarp does with a weighted or average co-addition and nearest-neighbour resampling on the grid of the inputs. No slices or swarped channel maps are written.
+        """
+        self.say("cubes are aligned on a common pixel grid, co-adding them without SWarp...")
+        self.header = slicers[0].header.copy()
+        #  like the header of a swarped channel map
+        header = order_primary_keys(header, bitpix=-32)
+        self.initialize_output_cube(header)
+
+        ny, nx = header['NAXIS2'], header['NAXIS1']
+        batch_size = self.get_channel_batch_size(nx * ny)
+
+        pbar = self.instrumentation.progress(self.max_channels)
+        for start in range(0, self.max_channels, batch_size):
+            stop = min(start + batch_size, self.max_channels)
+            time_start = time.perf_counter()
+            inputs = []
+            for slicer, offset in zip(slicers, offsets):
+                start_cube = max(start, slicer.channels.start)
+                stop_cube = min(stop, slicer.channels.stop)
+                if stop_cube > start_cube:
+                    inputs.append((slicer.read_channels(start_cube, stop_cube),
+                                   (start_cube - start, ) + offset))
+            time_read = time.perf_counter()
+            data, weights = coadd_aligned(inputs, (stop - start, ny, nx))
+            self.output_array[start:stop] = self.finalize_data(
+                data.astype(np.float32))
+            if self.weight_array is not None:
+                self.weight_array[start:stop] = weights
+            self.instrumentation.record_task(
+                'channels_{:04d}_{:04d}'.format(start, stop - 1),
+                duration=time.perf_counter() - time_start,
+                read_time=time_read - time_start,
+                bytes_read=sum(data.nbytes for data, offset in inputs))
+            pbar.update(stop - start)
         pbar.close()
 
+        for slicer in slicers:
+            slicer.close()
+        self.save_output_cube()
+
+    def remove_channel_files(self, channel):
+        """Remove the slices and the swarped map (or tiles) of an assembled channel."""
+        paths = glob.glob(os.path.join(self.path_channels, '*{}*'.format(channel)))
+        paths.append(os.path.join(self.path_slices, '{}.fits'.format(channel)))
+        paths.append(get_weight_filename(paths[-1]))
+        paths += glob.glob(os.path.join(self.path_slices, channel, 'tile_*.fits'))
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def initialize_swarp_tasks(self, header_template=None):
+        """Prepare the SWarp runs of the individual channels.
+
+        The output grid template is created here, so at least one slice of each cube has to be written beforehand. If a 'header_template' is given, the channels are swarped onto its grid instead.
+        """
+        with open(self.swarp_configuration_file, 'r') as fobj:
+            self.swarp_configuration = fobj.read()
+
+        self.header_template = None
+        self.header_suffix = self.get_header_suffix()
+        if header_template is not None:
+            self.header_template = header_template
+        elif self.output_grid is not None:
+            inputs = []
+            for path_to_cube in self.list_cubes:
+                filename = os.path.splitext(os.path.basename(path_to_cube))[0]
+                inputs += sorted(glob.glob(os.path.join(
+                    self.path_channels, '{}_channel_*'.format(filename))))[:1]
+            self.header_template = self.create_output_grid_template(
+                self.path_slices, self.list_cubes, inputs)
+        if self.header_template is not None:
+            with open(self.header_template, 'r') as fobj:
+                self.swarp_configuration += fobj.read()
+
+        if self.tile_size is not None:
+            #  the slices of a cube all share the footprint of the cube
+            self.initialize_tiles(
+                self.header_template,
+                {os.path.splitext(os.path.basename(path_to_cube))[0]:
+                 self.get_input_footprint(path_to_cube)
+                 for path_to_cube in self.list_cubes},
+                os.path.join(self.path_slices, 'tiles'))
+
+        self.list_slices = [
+            os.path.join(self.path_slices, '{}.fits'.format(channel))
+            for channel in self.list_of_channels]
+        self.list_empty_slices = []
+        self.list_empty_tiles = set()
+        self.swarp_fingerprints = {}
+        self.failed_channels = []
+
+    def initialize_tiles(self, header_template, dict_footprints, path_tiles):
+        """Split the output grid into tiles and index the footprints of the inputs.
+
+        Parameters
+        ----------
+        header_template : str
+            Path to the header template of the output grid.
+        dict_footprints : dict
+            Sky coordinates of the borders of the inputs (see 'get_input_footprint'), the keys are used to look up the inputs of a tile.
+        path_tiles : str
+            Directory in which the header templates of the tiles are written.
+
+        """
+        if not os.path.exists(path_tiles):
+            os.makedirs(path_tiles)
+        self.output_grid_header = fits.Header.fromtextfile(header_template)
+        self.tiles = split_output_grid(self.output_grid_header, self.tile_size)
+        for tile in self.tiles:
+            tile['header_template'] = os.path.join(
+                path_tiles, 'output_grid_{}.head'.format(tile['name']))
+            tile['header'].totextfile(tile['header_template'], overwrite=True)
+        #  the stitched tiles are written as a FITS file
+        self.output_grid_header = order_primary_keys(
+            self.output_grid_header, bitpix=-32)
+
+        self.footprint_index = FootprintIndex(
+            self.output_grid_header, self.tile_size)
+        for key, coords in dict_footprints.items():
+            self.footprint_index.insert(key, coords)
+
+        self.say("split output grid into {} tile(s) of {} x {} pixels".format(
+            len(self.tiles), self.tile_size, self.tile_size))
+
+    def get_swarp_tasks(self, channel):
+        """Return the SWarp tasks of a channel.
+
+        Without tiling there is one task per channel. With 'tile_size' set there is one task per tile, which gets only the slices of the cubes overlapping the tile. Channels or tiles that are not covered by any cube or that were already swarped with the same inputs and settings are left out.
+        """
+        filename = os.path.join(self.path_slices, '{}.fits'.format(channel))
+        inputs = sorted(glob.glob(os.path.join(
+            self.path_channels, '*{}*'.format(channel))))
+        if not inputs:
+            #  channel is not covered by any cube
+            self.list_empty_slices.append(filename)
+            return []
+
+        if self.tile_size is None:
+            jobs = [(channel, filename, inputs, self.header_template,
+                     os.path.join(self.path_slices, channel))]
+        else:
+            jobs = []
+            for tile in self.tiles:
+                keys = self.footprint_index.query(tile['index'])
+                tile_inputs = [
+                    path for path in inputs if os.path.basename(path).rsplit(
+                        '_channel_', 1)[0] in keys]
+                path_tile = self.get_tile_filename(channel, tile)
+                if not tile_inputs:
+                    self.list_empty_tiles.add(path_tile)
+                    continue
+                jobs.append(('{}/{}'.format(channel, tile['name']), path_tile,
+                             tile_inputs, tile['header_template'],
+                             os.path.join(self.path_slices, channel, tile['name'])))
+
+        tasks = []
+        for key, imageout_name, job_inputs, header_template, path_scratch in jobs:
+            options = self.output_grid_options.copy()
+
+            fingerprint = hash_fingerprint(
+                self.swarp_configuration, options, self.tile_size,
+                [file_fingerprint(path) for path in job_inputs])
+            if self.manifest.is_complete('swarp', key, fingerprint) and \
+                    os.path.exists(imageout_name) and \
+                    os.path.exists(get_weight_filename(imageout_name)):
+                continue
+            self.swarp_fingerprints[key] = fingerprint
+
+            tasks.append(self.make_swarp_task(
+                key, job_inputs, imageout_name, path_scratch, options=options,
+                header_template=header_template, channel=channel))
+        return tasks
+
+    def get_tile_filename(self, channel, tile):
+        return os.path.join(
+            self.path_slices, channel, '{}.fits'.format(tile['name']))
+
+    def get_header_suffix(self):
+        """Suffix of the SWarp header templates of the output images."""
+        return read_swarp_configuration(
+            self.swarp_configuration_file).get('HEADER_SUFFIX', '.head')
+
+    def make_swarp_task(self, key, inputs, imageout_name, path_scratch,
+                        options=None, header_template=None, channel=None,
+                        weightout_name=None, parallel=True):
+        """Return the task of a single SWarp run for 'swarp_channel'.
+
+        The header template is linked with the 'header_suffix' of the SWarp configuration. The weight map is written to 'weightout_name', or next to the output image by default. If the task runs in parallel with others of 'n_workers' processes, SWarp itself runs single-threaded.
+        """
+        options = dict(options or {})
+        if parallel and self.n_workers > 1:
+            #  avoid oversubscribing the cores with SWarp threads
+            options['NTHREADS'] = 1
+        options['WEIGHTOUT_NAME'] = weightout_name or get_weight_filename(
+            imageout_name)
+        return {
+            'channel': key if channel is None else channel,
+            'key': key,
+            'inputs': inputs,
+            'path_scratch': path_scratch,
+            'imageout_name': imageout_name,
+            'swarp_configuration_file': self.swarp_configuration_file,
+            'swarp_executable': self.swarp_executable,
+            'options': options,
+            'header_template': header_template,
+            'header_suffix': self.header_suffix}
+
+    def record_swarp_result(self, result):
+        self.record_swarp_task(result)
+        if result['returncode'] != 0:
+            self.failed_channels.append(result)
+        else:
+            self.manifest.set_complete(
+                'swarp', result['key'], self.swarp_fingerprints[result['key']])
+
+    def record_swarp_task(self, result):
+        """Pass the result of a SWarp run on to the instrumentation."""
+        self.instrumentation.record_task(result['key'], **{
+            key: result[key] for key in [
+                'channel', 'returncode', 'duration', 'bytes_read',
+                'bytes_written'] if key in result})
+
+    def check_swarp_failures(self):
+        failed = self.failed_channels
+        if failed:
+            raise Exception("SWarp failed for {} channel(s): {}\n{}".format(
+                len(failed), ', '.join(r['key'] for r in failed),
+                failed[0]['stderr']))
+
+    def create_output_grid_template(self, path_root, list_paths, inputs):
+        """Compute the output grid once and write it as SWarp header template.
+
+        With 'output_grid' set to 'swarp', the output grid is determined by a header-only SWarp run on the 'inputs' (e.g. one slice of each cube); with 'wcs' it is derived from the WCS of the input files in 'list_paths' with 'get_mosaic_footprint'. All channels (or tiles) are then swarped onto exactly this grid.
+
+        Parameters
+        ----------
+        path_root : str
+            Directory in which the header template is written.
+        list_paths : list
+            Paths to the input cubes or images.
+        inputs : list
+            Paths to the 2D inputs for SWarp.
+
+        Returns
+        -------
+        str
+            Path to the header template.
+
+        """
+        path_template = os.path.join(path_root, 'output_grid.head')
+
+        if self.output_grid == 'wcs':
+            header = self.plan_output_grid(list_paths)['header']
+        else:
+            self.say("determining output grid with SWarp...")
+            path_scratch = os.path.join(path_root, 'output_grid')
+            if not os.path.exists(path_scratch):
+                os.makedirs(path_scratch)
+            path_header = os.path.join(path_scratch, 'output_grid.fits')
+            options = self.output_grid_options.copy()
+            options['HEADER_ONLY'] = 'Y'
+            time_start = time.perf_counter()
+            returncode, stderr = run_swarp(
+                inputs, self.swarp_configuration_file, path_header,
+                cwd=path_scratch, options=options,
+                list_file=os.path.join(path_scratch, 'inputs.list'),
+                executable=self.swarp_executable)
+            self.instrumentation.record_task(
+                'output_grid', returncode=returncode,
+                duration=time.perf_counter() - time_start)
+            if returncode != 0:
+                raise Exception("SWarp failed to determine the output grid:\n{}".format(stderr))
+            header = fits.getheader(path_header)
+
+        #  SWarp only needs the size and WCS of the output grid
+        for key in ['SIMPLE', 'BITPIX', 'EXTEND']:
+            if key in header.keys():
+                header.remove(key)
+        header.totextfile(path_template, overwrite=True)
+
+        return path_template
+
+    def run_tasks(self, function, tasks):
+        """Yield the results of 'function' for all tasks as they complete.
+
+        The tasks are run by the executor chosen with the 'executor' setting: one after another in the current process ('serial'), on a pool of 'n_workers' local processes ('process'), or by worker processes on any number of hosts through a work queue in 'path_swarp' ('queue'). By default, a pool of processes is used if 'n_workers' > 1.
+        """
+        return self.get_executor().map(function, tasks)
+
+    def get_executor(self):
+        if self.executor_backend is None:
+            executor = self.executor
+            if executor is None:
+                executor = 'process' if self.n_workers > 1 else 'serial'
+
+            if executor == 'serial':
+                self.executor_backend = SerialExecutor()
+            elif executor == 'process':
+                self.executor_backend = PoolExecutor(self.n_workers)
+            else:
+                self.say("distributing tasks through the work queue in {}".format(
+                    get_queue_path(self.path_swarp)))
+                self.executor_backend = WorkQueueExecutor(
+                    get_queue_path(self.path_swarp),
+                    chunk_size=self.queue_chunk_size,
+                    poll_interval=self.queue_poll_interval,
+                    n_local_workers=self.queue_local_workers)
+        return self.executor_backend
+
+    def close_executor(self):
+        if self.executor_backend is not None:
+            self.executor_backend.close()
+        self.executor_backend = None
+
     def assemble_cube(self):
         self.say("assembling final cube...")
-        os.chdir(self.path_slices)
 
-        start = True
-        pbar = tqdm(total=len(self.list_slices))
+        filenames = [filename for filename in self.list_slices
+                     if filename not in self.list_empty_slices]
+        if not filenames:
+            raise Exception("None of the {} selected channel(s) is covered by the cubes (spectral_range {}, channel_binning {}), so there is nothing to assemble.".format(
+                len(self.list_slices), self.spectral_range, self.channel_binning))
+        self.initialize_output_cube(self.get_channel_header(filenames[0]))
+
+        pbar = self.instrumentation.progress(len(self.list_slices))
         for idx, filename in enumerate(self.list_slices):
             pbar.update(1)
-            data = fits.getdata(filename)
-            header = fits.getheader(filename)
-            if start:
-                start = False
-                header = restore_header_keys(
-                    header, self.header, remove_keys=self.list_of_keys_to_remove)
-                array = self.initialize_array(header)
-
-            array[idx, :, :] = data
+            self.assemble_channel(idx, filename)
         pbar.close()
 
+        self.save_output_cube()
+
+    def get_channel_header(self, filename):
+        """Header of a swarped channel map (the output grid for tiled channels)."""
+        if self.tile_size is not None:
+            return self.output_grid_header.copy()
+        return fits.getheader(filename)
+
+    def initialize_output_cube(self, header):
+        """Set up the final cube from the header of a swarped channel map."""
         if self.filename_final is None:
             self.filename_final = 'swarp_final'
 
-        os.chdir(self.path_swarp)
+        self.say_finalization_steps()
+        self.output_header = self.finalize_header(header, cube=True)
+        shape = (int(self.max_channels), self.output_header['NAXIS2'],
+                 self.output_header['NAXIS1'])
 
-        path_to_file = os.path.join(
-                self.path_swarp, '{}.fits').format(self.filename_final)
-        fits.writeto(path_to_file, array, header=header,
-                     overwrite=self.overwrite)
+        self.weight_array = None
+        if self.save_weighted_coaddition_map:
+            self.weight_header = self.get_weight_header(self.output_header)
 
-    def assemble_image(self):
-        self.say("list of {} input images:".format(len(self.list_images)))
+        if self.stream_assembly:
+            #  write the header first and fill in the data plane by plane
+            path_to_file = os.path.join(
+                    self.path_swarp, '{}.fits'.format(self.filename_final))
+            self.output_array = create_fits_file(
+                path_to_file, self.output_header, shape,
+                overwrite=self.overwrite)
+            if self.save_weighted_coaddition_map:
+                self.weight_array = create_fits_file(
+                    self.get_weight_cube_filename(), self.weight_header, shape,
+                    overwrite=self.overwrite)
+        else:
+            self.output_array = self.initialize_array(self.output_header)
+            if self.save_weighted_coaddition_map:
+                self.weight_array = self.initialize_array(self.output_header)
+
+    def get_weight_cube_filename(self):
+        """Path to the weight map (or weight cube) of the final mosaic."""
+        return os.path.join(
+            self.path_swarp, '{}.coadd.weight.fits'.format(self.filename_final))
+
+    def get_weight_header(self, header):
+        """Header of the weight map (or weight cube) of a mosaic."""
+        header = header.copy()
+        for key in ['BUNIT', 'BTYPE']:
+            if key in header.keys():
+                header.remove(key)
+        return header
+
+    def assemble_channel(self, idx, filename):
+        """Insert a swarped channel map and its weight map into the final cube."""
+        if filename in self.list_empty_slices:
+            self.output_array[idx, :, :] = np.nan
+            if self.weight_array is not None:
+                self.weight_array[idx, :, :] = 0
+            return
+        time_start = time.perf_counter()
+        data, weight_map = self.read_channel(
+            idx, weights=self.weight_array is not None)
+        if data.shape != self.output_array.shape[1:]:
+            raise Exception("Shape of {} {} does not match shape of output cube {}. Use the 'output_grid' setting to fix the output grid of all channels.".format(
+                filename, data.shape, self.output_array.shape[1:]))
+        time_read = time.perf_counter()
+        self.output_array[idx, :, :] = self.finalize_data(data)
+        if weight_map is not None:
+            self.weight_array[idx, :, :] = weight_map
+        time_end = time.perf_counter()
+
+        n_bytes = data.nbytes
+        if weight_map is not None:
+            n_bytes += weight_map.nbytes
+        self.instrumentation.record_task(
+            self.list_of_channels[idx], duration=time_end - time_start,
+            read_time=time_read - time_start,
+            finalize_time=time_end - time_read, bytes_read=n_bytes)
+
+    def read_channel(self, idx, weights=False):
+        """Return the swarped map of a channel and, if 'weights' is set, its weight map.
+
+        In tiled mode the maps are stitched together from the tiles of the channel.
+        """
+        filename = self.list_slices[idx]
+        if self.tile_size is None:
+            weight_map = None
+            if weights:
+                weight_map = fits.getdata(get_weight_filename(filename))
+            return fits.getdata(filename), weight_map
+
+        shape = (self.output_grid_header['NAXIS2'],
+                 self.output_grid_header['NAXIS1'])
+        data = np.zeros(shape, dtype=np.float32)
+        weight_map = np.zeros(shape, dtype=np.float32) if weights else None
+        self.stitch_tiles(data, weight_map, channel=self.list_of_channels[idx])
+        return data, weight_map
+
+    def stitch_tiles(self, plane, weight_plane=None, channel=None):
+        """Insert the swarped tiles of a channel (or image) into a plane of the output.
+
+        Tiles without any overlapping input are set to zero, like the uncovered parts of a SWarp output. If a 'weight_plane' is given, the weight maps of the tiles are stitched into it.
+        """
+        for tile in self.tiles:
+            if channel is None:
+                path_tile = os.path.join(
+                    self.path_tiles, '{}.fits'.format(tile['name']))
+            else:
+                path_tile = self.get_tile_filename(channel, tile)
+            section = (slice(tile['y0'], tile['y0'] + tile['ny']),
+                       slice(tile['x0'], tile['x0'] + tile['nx']))
+            if path_tile in self.list_empty_tiles:
+                plane[section] = 0
+                if weight_plane is not None:
+                    weight_plane[section] = 0
+                continue
+            data = fits.getdata(path_tile)
+            if data.shape != (tile['ny'], tile['nx']):
+                raise Exception("Shape of {} {} does not match shape of tile {}".format(
+                    path_tile, data.shape, (tile['ny'], tile['nx'])))
+            plane[section] = data
+            if weight_plane is not None:
+                weight_plane[section] = fits.getdata(
+                    get_weight_filename(path_tile))
+
+    def save_output_cube(self):
+        if self.stream_assembly:
+            self.output_array.flush()
+            if self.weight_array is not None:
+                self.weight_array.flush()
+        else:
+            if self.return_hdu == 'memory':
+                #  the mosaic is handed back without writing it to disk
+                self.output_hdu = fits.PrimaryHDU(
+                    self.output_array, header=self.output_header)
+            else:
+                path_to_file = os.path.join(
+                        self.path_swarp, '{}.fits'.format(self.filename_final))
+                fits.writeto(path_to_file, self.output_array,
+                             header=self.output_header, overwrite=self.overwrite)
+            if self.weight_array is not None:
+                fits.writeto(self.get_weight_cube_filename(), self.weight_array,
+                         header=self.weight_header, overwrite=self.overwrite)
+        del self.output_array
+        del self.weight_array
+
+        if self.output_hdu is not None:
+            self.say("assembled '{}' in memory".format(self.filename_final))
+        else:
+            self.say("saved '{}' in {}".format(
+                self.filename_final, self.path_swarp))
+
+    def get_list_of_images(self):
+        """Return the list of input images, with the images held in memory written to disk for SWarp."""
+        list_images = self.list_images
+        self.write_memory_inputs(list_images)
+        self.say("list of {} input images:".format(len(list_images)))
         if self.verbose:
-            pprint(self.list_images)
+            pprint(list_images)
+        return list_images
+
+    def assemble_image(self):
+        list_images = self.get_list_of_images()
         self.say("assembling final image...")
 
-        self.header = fits.getheader(self.list_images[0])
+        self.header = self.get_input_header(list_images[0])
 
-        os.chdir(self.path_swarp)
-        if isinstance(self.list_images, list):
-            string = ''
-            for img in self.list_images:
-                string += img + ' '
-            self.list_images = string
         filename = os.path.join(
             self.path_swarp, '{}.fits'.format(self.filename_final))
+        path_list_file = os.path.join(
+            self.path_swarp, '{}.list'.format(self.filename_final))
+
+        time_start = time.perf_counter()
+        returncode, stderr = run_swarp(
+            list_images, self.swarp_configuration_file, filename,
+            cwd=self.path_swarp, options=self.output_grid_options,
+            list_file=path_list_file, executable=self.swarp_executable)
+        self.instrumentation.record_task(
+            self.filename_final, returncode=returncode,
+            duration=time.perf_counter() - time_start,
+            bytes_read=get_total_size(list_images),
+            bytes_written=get_total_size([filename, os.path.join(
+                self.path_swarp, 'coadd.weight.fits')]))
+        os.remove(path_list_file)
+        if returncode != 0:
+            raise Exception("SWarp failed:\n{}".format(stderr))
+
+    def run_image_tasks(self, tasks, name='tile'):
+        """Run SWarp tasks for parts of an image and raise if any of them failed."""
+        failed = []
+        pbar = self.instrumentation.progress(len(tasks))
+        for result in self.run_tasks(swarp_channel, tasks):
+            pbar.update(1)
+            self.record_swarp_task(result)
+            if result['returncode'] != 0:
+                failed.append(result)
+        pbar.close()
+        if failed:
+            raise Exception("SWarp failed for {} {}(s): {}\n{}".format(
+                len(failed), name, ', '.join(r['key'] for r in failed),
+                failed[0]['stderr']))
+
+    def assemble_image_batches(self):
+        """Co-add the images in parallel batches.
+
+        The images are split into batches of 'image_batch_size' images, which are co-added in parallel with 'n_workers' processes onto the fixed output grid. Each batch keeps its weight map, and the batch results are combined with their weights by 'combine_image_batches'.
+        """
+        list_images = self.get_list_of_images()
+        if self.filename_final is None:
+            self.filename_final = 'swarp_final'
+
+        self.header = self.get_input_header(list_images[0])
+        self.staging_backend = DiskStaging(self.path_swarp)
+        path_batches = self.staging_backend.make_directory('batches')
+        self.header_suffix = self.get_header_suffix()
+        header_template = self.create_output_grid_template(
+            path_batches, list_images, list_images)
+
+        tasks = []
+        for start in range(0, len(list_images), self.image_batch_size):
+            name = 'batch_{:04d}'.format(len(tasks))
+            tasks.append(self.make_swarp_task(
+                name, list_images[start:start + self.image_batch_size],
+                os.path.join(path_batches, '{}.fits'.format(name)),
+                os.path.join(path_batches, name),
+                options=self.output_grid_options,
+                header_template=header_template))
+
+        self.say("co-adding {} images in {} batches...".format(
+            len(list_images), len(tasks)))
+        self.run_image_tasks(tasks, name='batch')
+
+        self.say("assembling final image from {} batches...".format(len(tasks)))
+        self.combine_image_batches(
+            [task['imageout_name'] for task in tasks],
+            os.path.join(self.path_swarp, '{}.fits'.format(self.filename_final)),
+            os.path.join(self.path_swarp, 'coadd.weight.fits'))
+
+        if self.remove_temporary_files:
+            self.staging_backend.clean_up()
+
+    def combine_image_batches(self, paths, path_output, path_weights,
+                              n_rows=1024):
+        """Combine co-added batches of images with their weight maps.
+
+        The batches are combined in blocks of 'n_rows' rows into preallocated output files, so only a block of the output grid is held in memory. As in the output of SWarp, pixels that are not covered by any batch are set to zero, and pixels that are covered but have no valid data are flagged with -1e30.
+
+        Parameters
+        ----------
+        paths : list
+            Paths to the co-added batches, which lie on the same output grid. Their weight maps are expected next to them.
+        path_output : str
+            Path to the combined image.
+        path_weights : str
+            Path to the combined weight map.
+        n_rows : int
+            Number of rows combined at a time.
+
+        """
+        time_start = time.perf_counter()
+        header = fits.getheader(paths[0])
+        shape = (header['NAXIS2'], header['NAXIS1'])
+        output_array = create_fits_file(path_output, header, shape,
+                                        overwrite=True)
+        weight_array = create_fits_file(path_weights, header, shape,
+                                        overwrite=True)
+        for start in range(0, shape[0], n_rows):
+            rows = slice(start, start + n_rows)
+            total = np.zeros(output_array[rows].shape, dtype=np.float64)
+            weights = np.zeros(total.shape, dtype=np.float64)
+            covered = np.zeros(total.shape, dtype=bool)
+            for path in paths:
+                with fits.open(path, memmap=True) as hdul:
+                    data = hdul[0].data[rows].astype(np.float64)
+                with fits.open(get_weight_filename(path), memmap=True) as hdul:
+                    weight_map = hdul[0].data[rows].astype(np.float64)
+                valid = weight_map > 0
+                total[valid] += data[valid] * weight_map[valid]
+                weights += np.where(valid, weight_map, 0)
+                #  uncovered pixels of a batch are zero without weight
+                covered |= valid | (data != 0)
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                data = np.where(weights > 0, total / weights, 0.)
+            data[covered & (weights == 0)] = -1e30
+            output_array[rows] = data
+            weight_array[rows] = weights
+        output_array.flush()
+        weight_array.flush()
+        del output_array, weight_array
+        self.instrumentation.record_task(
+            self.filename_final, returncode=0,
+            duration=time.perf_counter() - time_start, bytes_read=get_total_size(paths + [
+                get_weight_filename(path) for path in paths]),
+            bytes_written=get_total_size([path_output, path_weights]))
 
-        os.system(
-            'swarp {a} -c {b} -IMAGEOUT_NAME {c} -VERBOSE_TYPE QUIET'.format(
-                a=self.list_images, b=self.swarp_configuration_file, c=filename))
+    def assemble_image_tiles(self):
+        """Mosaic the images tile by tile.
+
+        The output grid is split into tiles of 'tile_size' pixels, and each tile is swarped from only those images that overlap it. The tiles are swarped in parallel with 'n_workers' processes and are stitched into a preallocated output file, which is finalized by 'restore_values'.
+        """
+        list_images = self.get_list_of_images()
+        if self.filename_final is None:
+            self.filename_final = 'swarp_final'
+
+        self.header = self.get_input_header(list_images[0])
+        self.staging_backend = DiskStaging(self.path_swarp)
+        self.path_tiles = self.staging_backend.make_directory('tiles')
+        self.header_suffix = self.get_header_suffix()
+
+        header_template = self.create_output_grid_template(
+            self.path_tiles, list_images, list_images)
+        self.initialize_tiles(
+            header_template,
+            {path: self.get_input_footprint(path) for path in list_images},
+            self.path_tiles)
+
+        self.list_empty_tiles = set()
+        tasks = []
+        for tile in self.tiles:
+            path_tile = os.path.join(
+                self.path_tiles, '{}.fits'.format(tile['name']))
+            inputs = self.footprint_index.query(tile['index'])
+            if not inputs:
+                self.list_empty_tiles.add(path_tile)
+                continue
+            tasks.append(self.make_swarp_task(
+                tile['name'], [path for path in list_images if path in inputs],
+                path_tile, os.path.join(self.path_tiles, tile['name']),
+                options=self.output_grid_options,
+                header_template=tile['header_template']))
+
+        self.say("assembling final image from {} tile(s)...".format(len(tasks)))
+        self.run_image_tasks(tasks, name='tile')
+
+        path_to_file = os.path.join(
+            self.path_swarp, '{}.fits'.format(self.filename_final))
+        header = self.output_grid_header
+        shape = (header['NAXIS2'], header['NAXIS1'])
+        output_array = create_fits_file(
+            path_to_file, header, shape, overwrite=self.overwrite)
+        weight_array = None
+        if self.save_weighted_coaddition_map:
+            weight_array = create_fits_file(
+                self.get_weight_cube_filename(), self.get_weight_header(header),
+                shape, overwrite=self.overwrite)
+        self.stitch_tiles(output_array, weight_array)
+        output_array.flush()
+        del output_array
+        if weight_array is not None:
+            weight_array.flush()
+            del weight_array
+
+        if self.remove_temporary_files:
+            self.staging_backend.clean_up()
+
+    def plan_output_grid(self, list_paths):
+        """Determine the output grid of SWarp from the FITS headers of the inputs.
+
+        The center, pixel scale and size of the output grid are passed on to all SWarp calls, so SWarp does not have to derive them from the input files.
+        """
+        self.say("planning output grid from FITS headers...")
+        footprint = self.get_mosaic_footprint(list_paths)
+
+        self.output_grid_options = {
+            'CENTER_TYPE': 'MANUAL',
+            'CENTER': '{:.8f},{:.8f}'.format(*footprint['center']),
+            'PIXELSCALE_TYPE': 'MANUAL',
+            'PIXEL_SCALE': '{:.8f}'.format(footprint['pixel_scale'] * 3600),
+            'IMAGE_SIZE': '{},{}'.format(*footprint['image_size'])}
+        self.say("CENTER {CENTER}, PIXEL_SCALE {PIXEL_SCALE}, IMAGE_SIZE {IMAGE_SIZE}".format(
+            **self.output_grid_options))
+
+        return footprint
+
+    def get_mosaic_footprint(self, list_paths):
+        """Output grid for the inputs according to the SWarp configuration (see 'get_mosaic_footprint')."""
+        configuration = read_swarp_configuration(self.swarp_configuration_file)
+
+        pixel_scale = None
+        if configuration.get('PIXELSCALE_TYPE', '').upper() == 'MANUAL':
+            pixel_scale = float(
+                configuration.get('PIXEL_SCALE', '0').split(',')[0]) / 3600
+            if pixel_scale <= 0:
+                pixel_scale = None
+
+        return get_mosaic_footprint(
+            [self.get_input_header(path) for path in list_paths],
+            projection_type=configuration.get('PROJECTION_TYPE', 'TAN'),
+            celestial_type=configuration.get('CELESTIAL_TYPE', 'NATIVE'),
+            pixel_scale=pixel_scale,
+            footprints=[self.get_input_footprint(path) for path in list_paths])
 
     def initialize_array(self, header):
         x = header['NAXIS1']
@@ -242,31 +2127,54 @@ class Swarp(object):
 
         return array
 
-    def restore_values(self):
-        os.chdir(self.path_swarp)
-
-        data = fits.getdata(self.filename_final + '.fits')
-        header = fits.getheader(self.filename_final + '.fits')
-
+    def say_finalization_steps(self):
         if self.restore_nans:
             self.say("restoring NaN values...")
+        if self.convert_zeros_to_nans:
+            self.say("converting zero values to NaNs...")
+        if self.restore_keys:
+            self.say("restoring FITS header keys...")
+
+    def finalize_data(self, data):
+        """Restore NaN values in (a part of) the mosaicked data in place."""
+        if self.restore_nans:
             data[data < -1e5] = np.nan
 
         if self.convert_zeros_to_nans:
-            self.say("converting zero values to NaNs...")
             data[data == 0] = np.nan
 
+        return data
+
+    def finalize_header(self, header, cube=False):
+        """Build the FITS header of the final mosaic.
+
+        The spectral axis and the unit of the data of a 'cube' are always taken from the header of the first cube, since the swarped channel maps do not describe them; 'restore_keys' restores all other keys as well.
+        """
         if self.restore_keys:
-            self.say("restoring FITS header keys...")
             header = restore_header_keys(
                 header, self.header, remove_keys=self.list_of_keys_to_remove)
+        elif cube:
+            header = restore_spectral_axis_keys(header, self.header)
+
+        return transform_header_from_crota_to_pc(header)
 
-        header = transform_header_from_crota_to_pc(header)
+    def restore_values(self, n_rows=1024):
+        """Finalize the SWarp output in place.
 
+        The data is updated through a memory map in blocks of 'n_rows' rows, so the file is neither fully read into memory nor written a second time. Only if the final header does not fit into the space of the original header is the file rewritten.
+        """
         path_to_file = os.path.join(
                 self.path_swarp, '{}.fits'.format(self.filename_final))
+
+        self.say_finalization_steps()
+
+        with fits.open(path_to_file, mode='update', memmap=True) as hdul:
+            hdu = hdul[0]
+            data = hdu.data
+            for start in range(0, data.shape[-2], n_rows):
+                self.finalize_data(data[..., start:start + n_rows, :])
+            #  the header keywords are updated in place
+            self.finalize_header(hdu.header)
+
         self.say("saved '{}' in {}".format(
             self.filename_final, self.path_swarp))
-
-        fits.writeto(path_to_file, data, header=header,
-                     overwrite=self.overwrite)
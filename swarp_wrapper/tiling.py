@@ -0,0 +1,155 @@
+import numpy as np
+
+from astropy.wcs import WCS
+
+
+def split_output_grid(header, tile_size):
+    """Split an output grid into tiles.
+
+    All tiles are part of the same pixel grid: their header only differs from 'header' in the NAXIS* and CRPIX* keywords, so the swarped tiles can be stitched together without resampling.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        FITS header describing the size and celestial WCS of the output grid.
+    tile_size : int
+        Maximum size of a tile in pixels along both axes.
+
+    Returns
+    -------
+    list
+        For each tile a dict with its 'name', its 'index' (column, row) in the grid of tiles, its lower left pixel ('x0', 'y0'), its size ('nx', 'ny') and its 'header'.
+
+    """
+    tile_size = int(tile_size)
+    if tile_size < 1:
+        raise Exception("'tile_size' needs to be at least 1")
+
+    tiles = []
+    for row, y0 in enumerate(range(0, header['NAXIS2'], tile_size)):
+        for column, x0 in enumerate(range(0, header['NAXIS1'], tile_size)):
+            nx = min(tile_size, header['NAXIS1'] - x0)
+            ny = min(tile_size, header['NAXIS2'] - y0)
+            header_tile = header.copy()
+            header_tile['NAXIS1'] = nx
+            header_tile['NAXIS2'] = ny
+            header_tile['CRPIX1'] = header['CRPIX1'] - x0
+            header_tile['CRPIX2'] = header['CRPIX2'] - y0
+            tiles.append({'name': 'tile_{:04d}'.format(len(tiles)),
+                          'index': (column, row), 'x0': x0, 'y0': y0,
+                          'nx': nx, 'ny': ny, 'header': header_tile})
+    return tiles
+
+
+def get_pixel_bounds(wcs, coords, margin=0):
+    """Bounding box (xmin, xmax, ymin, ymax) in pixels of the border points 'coords' of an input on the grid of 'wcs', enlarged by 'margin' pixels (`None` if no point can be projected)."""
+    xpix, ypix = wcs.world_to_pixel(coords)
+    valid = np.isfinite(xpix) & np.isfinite(ypix)
+    if not valid.any():
+        return None
+    return (xpix[valid].min() - margin, xpix[valid].max() + margin,
+            ypix[valid].min() - margin, ypix[valid].max() + margin)
+
+
+def get_footprint_window(header, footprints, margin=4):
+    """Smallest section of an output grid that contains the footprints of the inputs.
+
+    Like a tile of 'split_output_grid', the section is part of the same pixel grid, so maps swarped onto it can be inserted into the output without resampling.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        FITS header describing the size and celestial WCS of the output grid.
+    footprints : list
+        Sky coordinates of points along the borders of each input (see 'get_edge_coordinates'), or `None` for inputs without celestial footprint.
+    margin : float
+        Number of pixels by which the footprints are enlarged.
+
+    Returns
+    -------
+    dict
+        The lower left pixel ('x0', 'y0'), the size ('nx', 'ny') and the 'header' of the section, or `None` if no input overlaps the output grid.
+
+    """
+    wcs = WCS(header).celestial
+    bounds = [get_pixel_bounds(wcs, coords, margin)
+              for coords in footprints if coords is not None]
+    bounds = [bound for bound in bounds if bound is not None]
+    if not bounds:
+        return None
+    xmin, xmax, ymin, ymax = np.array(bounds).T
+    #  pixel i covers the 0-based pixel coordinates i - 0.5 ... i + 0.5
+    x0 = max(0, int(np.floor(xmin.min() + 0.5)))
+    x1 = min(header['NAXIS1'], int(np.floor(xmax.max() + 0.5)) + 1)
+    y0 = max(0, int(np.floor(ymin.min() + 0.5)))
+    y1 = min(header['NAXIS2'], int(np.floor(ymax.max() + 0.5)) + 1)
+    if x1 <= x0 or y1 <= y0:
+        return None
+
+    header_window = header.copy()
+    header_window['NAXIS1'] = x1 - x0
+    header_window['NAXIS2'] = y1 - y0
+    header_window['CRPIX1'] = header['CRPIX1'] - x0
+    header_window['CRPIX2'] = header['CRPIX2'] - y0
+    return {'x0': x0, 'y0': y0, 'nx': x1 - x0, 'ny': y1 - y0,
+            'header': header_window}
+
+
+class FootprintIndex(object):
+    """Spatial index of the footprints of the inputs on a tiled output grid.
+
+    The points along the borders of each input (e.g. from the 'HeaderIndex') are projected onto the output grid and the input is registered in all tiles overlapped by the bounding box of its footprint, so the inputs of a tile are looked up without testing every input against every tile.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        FITS header describing the size and celestial WCS of the output grid.
+    tile_size : int
+        Size of the tiles in pixels.
+    margin : float
+        Number of pixels by which the footprints are enlarged, so that inputs just outside a tile still contribute to the resampling kernel at its border.
+
+    """
+    def __init__(self, header, tile_size, margin=4):
+        self.wcs = WCS(header).celestial
+        self.tile_size = int(tile_size)
+        self.margin = margin
+        self.naxis = (header['NAXIS1'], header['NAXIS2'])
+        self.n_tiles = (-(-self.naxis[0] // self.tile_size),
+                        -(-self.naxis[1] // self.tile_size))
+        self.buckets = {}
+
+    def get_pixel_bounds(self, coords):
+        """Bounding box (xmin, xmax, ymin, ymax) of the border points 'coords' of an input in output pixels."""
+        return get_pixel_bounds(self.wcs, coords, self.margin)
+
+    def insert(self, key, coords):
+        """Register the input 'key' with the sky coordinates 'coords' of points along its borders (see 'get_edge_coordinates').
+
+        Inputs without celestial footprint ('coords' is `None`) are not registered.
+        """
+        if coords is None:
+            return
+        bounds = self.get_pixel_bounds(coords)
+        if bounds is None:
+            return
+        xmin, xmax, ymin, ymax = bounds
+        if xmax < -0.5 or ymax < -0.5 or xmin > self.naxis[0] - 0.5 or \
+                ymin > self.naxis[1] - 0.5:
+            #  the input lies completely outside of the output grid
+            return
+
+        #  tile i covers the 0-based pixel centers i*tile_size ... (i+1)*tile_size - 1
+        columns = np.clip(np.floor(
+            (np.array([xmin, xmax]) + 0.5) / self.tile_size).astype(int),
+            0, self.n_tiles[0] - 1)
+        rows = np.clip(np.floor(
+            (np.array([ymin, ymax]) + 0.5) / self.tile_size).astype(int),
+            0, self.n_tiles[1] - 1)
+        for row in range(rows[0], rows[1] + 1):
+            for column in range(columns[0], columns[1] + 1):
+                self.buckets.setdefault((column, row), []).append(key)
+
+    def query(self, index):
+        """Return the keys of all inputs overlapping the tile with 'index'."""
+        return self.buckets.get(tuple(index), [])
@@ -0,0 +1,34 @@
+"""Worker process for the work queue executor of the swarp_wrapper.
+
+Start any number of workers on hosts that mount 'path_swarp' with
+
+    python -m swarp_wrapper.worker <path_swarp>
+
+The workers claim chunks of channels (or cubes) from the work queue in 'path_swarp', run them and mark them as done, while the process running 'Swarp' (with 'executor' set to 'queue') assembles the results.
+"""
+import argparse
+
+from .executors import get_queue_path, run_worker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m swarp_wrapper.worker',
+        description="Process the work queue of a mosaic of the swarp_wrapper.")
+    parser.add_argument('path_swarp', help="'path_swarp' directory of the mosaic")
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help="interval in seconds in which the queue is checked for work")
+    parser.add_argument('--idle-timeout', type=float, default=300,
+                        help="exit after this number of seconds without work")
+    parser.add_argument('--stale-timeout', type=float, default=60,
+                        help="claim work again whose worker did not report for this number of seconds")
+    args = parser.parse_args(argv)
+
+    n_chunks = run_worker(
+        get_queue_path(args.path_swarp), poll_interval=args.poll_interval,
+        idle_timeout=args.idle_timeout, stale_timeout=args.stale_timeout)
+    print("worker processed {} chunk(s) of the work queue".format(n_chunks))
+
+
+if __name__ == '__main__':
+    main()
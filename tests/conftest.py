@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from swarp_wrapper.benchmark.runner import SWARP_CONFIGURATION
+from swarp_wrapper.benchmark.standin_swarp import get_standin_command
+from swarp_wrapper.benchmark.synthetic import make_dataset
+from swarp_wrapper.swarp_wrapper import Swarp
+
+
+@pytest.fixture(scope='session')
+def path_data(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('data'))
+
+
+@pytest.fixture(scope='session')
+def configuration_file(path_data):
+    path_to_file = os.path.join(path_data, 'test.swarp')
+    with open(path_to_file, 'w') as fobj:
+        fobj.write(SWARP_CONFIGURATION)
+    return path_to_file
+
+
+@pytest.fixture(scope='session')
+def cubes(path_data):
+    return make_dataset(os.path.join(path_data, 'cubes'), kind='cubes',
+                        n_inputs=3, size=24, n_channels=6)
+
+
+@pytest.fixture(scope='session')
+def aligned_cubes(path_data):
+    return make_dataset(os.path.join(path_data, 'aligned_cubes'), kind='cubes',
+                        n_inputs=3, size=24, n_channels=6, aligned=True)
+
+
+@pytest.fixture(scope='session')
+def images(path_data):
+    return make_dataset(os.path.join(path_data, 'images'), kind='images',
+                        n_inputs=3, size=24)
+
+
+@pytest.fixture(scope='session')
+def swarp_factory(configuration_file):
+    """Factory of 'Swarp' instances that run the stand-in for SWarp in 'path_swarp'."""
+    def make(path_swarp, **settings):
+        swarp = Swarp()
+        swarp.path_swarp = str(path_swarp)
+        swarp.swarp_configuration_file = configuration_file
+        swarp.swarp_executable = get_standin_command()
+        swarp.filename_final = 'mosaic'
+        swarp.verbose = False
+        for name, value in settings.items():
+            setattr(swarp, name, value)
+        return swarp
+    return make
+
+
+@pytest.fixture
+def make_swarp(tmp_path, swarp_factory):
+    """Factory of 'Swarp' instances that run the stand-in for SWarp in a temporary directory."""
+    def make(name='mosaic', **settings):
+        return swarp_factory(tmp_path / name, **settings)
+    return make
@@ -0,0 +1,58 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from astropy.io import fits
+
+from swarp_wrapper.swarp_wrapper import Swarp
+
+
+@pytest.fixture(scope='module')
+def mosaics(swarp_factory, cubes, images, tmp_path_factory):
+    """Mosaics of the cubes and of the images with their weights, by kind of input."""
+    mosaics = {}
+    for kind, inputs in [('list_cubes', cubes), ('list_images', images)]:
+        swarp = swarp_factory(tmp_path_factory.mktemp(kind),
+                              save_weighted_coaddition_map=True,
+                              **{kind: inputs})
+        getattr(swarp, 'mosaic_cubes' if kind == 'list_cubes' else 'mosaic_images')()
+        mosaics[kind] = swarp.path_swarp
+    return mosaics
+
+
+@pytest.mark.parametrize('kind', ['list_cubes', 'list_images'])
+def test_update_of_section_matches_full_grid(swarp_factory, mosaics, cubes,
+                                             images, tmp_path, monkeypatch,
+                                             kind):
+    get_update_window = Swarp.get_update_window
+    windows = []
+
+    results = []
+    for name, full_grid in [('section', False), ('full_grid', True)]:
+        def get_window(self, header, list_paths):
+            window = get_update_window(self, header, list_paths)
+            if full_grid:
+                window = {'x0': 0, 'y0': 0, 'nx': header['NAXIS1'],
+                          'ny': header['NAXIS2'], 'header': header}
+            windows.append((window, header))
+            return window
+        monkeypatch.setattr(Swarp, 'get_update_window', get_window)
+
+        path_swarp = str(tmp_path / name)
+        shutil.copytree(mosaics[kind], path_swarp)
+        #  add the first input once more
+        inputs = {'list_cubes': cubes, 'list_images': images}[kind][:1]
+        swarp = swarp_factory(path_swarp, save_weighted_coaddition_map=True,
+                              **{kind: inputs})
+        swarp.add_to_mosaic()
+        results.append([fits.getdata(path) for path in [
+            '{}/mosaic.fits'.format(path_swarp),
+            swarp.get_weight_cube_filename()]])
+
+    window, header = windows[0]
+    assert window['nx'] < header['NAXIS1'] or window['ny'] < header['NAXIS2']
+    weights_before = fits.getdata('{}/mosaic.coadd.weight.fits'.format(mosaics[kind]))
+    assert np.any(results[0][1] != weights_before)
+    for section, full_grid in zip(*results):
+        np.testing.assert_array_equal(section, full_grid)
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+
+@pytest.mark.parametrize('spectral_range, unit, binning', [
+    ((10, 20), 'channel', 1),
+    #  the cubes cover -50 to -47.5 km/s
+    ((0., 10.), 'km/s', 1),
+    #  less than one bin of channels
+    ((0, 3), 'channel', 4)])
+def test_spectral_range_without_channels(make_swarp, cubes, spectral_range,
+                                         unit, binning):
+    swarp = make_swarp(list_cubes=cubes, spectral_range=spectral_range,
+                       spectral_range_unit=unit, channel_binning=binning)
+    with pytest.raises(Exception, match=r'contains no \(complete bin of\) channels'):
+        swarp.mosaic_cubes()
+    #  the error is raised before any slice is written
+    assert not os.path.exists(os.path.join(swarp.path_swarp, 'channels'))
+    assert not os.path.exists(os.path.join(swarp.path_swarp, 'mosaic.fits'))
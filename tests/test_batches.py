@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+from astropy.io import fits
+
+
+def read_mosaic(swarp):
+    data = fits.getdata(os.path.join(swarp.path_swarp, 'mosaic.fits'))
+    weights = fits.getdata(swarp.get_weight_cube_filename())
+    return data, weights
+
+
+def test_batches_match_single_run(make_swarp, images):
+    mosaics = []
+    for name, image_batch_size in [('single', None), ('batches', 2)]:
+        swarp = make_swarp(name, list_images=images, output_grid='swarp',
+                           image_batch_size=image_batch_size,
+                           save_weighted_coaddition_map=True)
+        swarp.mosaic_images()
+        mosaics.append(read_mosaic(swarp))
+    (data, weights), (data_batches, weights_batches) = mosaics
+
+    #  the output grid has pixels that no image covers
+    assert np.any(weights == 0)
+    np.testing.assert_array_equal(np.isnan(data_batches), np.isnan(data))
+    np.testing.assert_array_equal(data_batches == 0, data == 0)
+    np.testing.assert_allclose(data_batches, data, rtol=1e-6)
+    np.testing.assert_array_equal(weights_batches, weights)
@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+
+@pytest.mark.parametrize('kind', ['cubes', 'images'])
+def test_dry_run_has_no_side_effects(make_swarp, cubes, images, kind):
+    if kind == 'cubes':
+        swarp = make_swarp(list_cubes=cubes, dry_run=True, tile_size=16)
+        plan = swarp.mosaic_cubes()
+    else:
+        swarp = make_swarp(list_images=images, dry_run=True, tile_size=16,
+                           output_grid='wcs')
+        plan = swarp.mosaic_images()
+
+    assert plan['estimates']
+    assert not os.path.exists(swarp.path_swarp)
@@ -0,0 +1,60 @@
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+
+from astropy.io import fits
+
+from swarp_wrapper.executors import WorkQueueExecutor, get_queue_path
+
+
+def test_queue_matches_serial(make_swarp, cubes):
+    mosaics = []
+    for name, settings in [
+            ('serial', {'executor': 'serial'}),
+            ('queue', {'executor': 'queue', 'queue_local_workers': 2,
+                       'queue_poll_interval': 0.1})]:
+        swarp = make_swarp(name, list_cubes=cubes, **settings)
+        swarp.mosaic_cubes()
+        mosaics.append([fits.getdata(os.path.join(swarp.path_swarp, filename))
+                        for filename in ['mosaic.fits', 'mosaic.coadd.weight.fits']])
+    #  the queue is removed once the mosaic is finished
+    assert not os.path.exists(get_queue_path(swarp.path_swarp))
+
+    for serial, queue in zip(*mosaics):
+        np.testing.assert_array_equal(serial, queue)
+
+
+def test_queue_recovers_from_dead_worker(tmp_path):
+    executor = WorkQueueExecutor(
+        get_queue_path(str(tmp_path)), poll_interval=0.1, n_local_workers=2,
+        stale_timeout=1)
+    path_locks = os.path.join(executor.path_queue, 'locks')
+    killed = {}
+
+    def kill_lock_holder():
+        #  kill the worker that claimed the chunk while it is running it
+        while not os.listdir(path_locks):
+            time.sleep(0.01)
+        path_lock = os.path.join(path_locks, os.listdir(path_locks)[0])
+        while not os.path.getsize(path_lock):
+            time.sleep(0.01)
+        with open(path_lock) as fobj:
+            killed['pid'] = int(fobj.read().split(':')[-1])
+        os.kill(killed['pid'], signal.SIGKILL)
+
+    thread = threading.Thread(target=kill_lock_holder, daemon=True)
+    thread.start()
+    try:
+        assert list(executor.map(time.sleep, [2])) == [None]
+    finally:
+        workers = list(executor.local_workers)
+        executor.close()
+    thread.join(timeout=10)
+
+    returncodes = {worker.pid: worker.returncode for worker in workers}
+    assert returncodes.pop(killed['pid']) == -signal.SIGKILL
+    #  the other worker ran the chunk and exited cleanly
+    assert list(returncodes.values()) == [0]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from astropy.wcs import WCS
+
+from swarp_wrapper.benchmark.synthetic import make_header
+from swarp_wrapper.swarp_helper import get_edge_coordinates, get_mosaic_footprint
+
+
+def make_headers(centers, ctypes=('GLON', 'GLAT'), size=24):
+    headers = []
+    for center in centers:
+        header = make_header(center, size)
+        header['CTYPE1'] = '{:-<5}TAN'.format(ctypes[0])
+        header['CTYPE2'] = '{:-<5}TAN'.format(ctypes[1])
+        headers.append(header)
+    return headers
+
+
+@pytest.mark.parametrize('centers, ctypes', [
+    ([(30., 0.), (30.05, 0.), (30., 0.05)], ('GLON', 'GLAT')),
+    #  footprints on both sides of longitude 0/360
+    ([(359.97, 0.), (0.03, 0.02), (0., -0.04)], ('GLON', 'GLAT')),
+    ([(359.98, 20.), (0.02, 20.)], ('RA', 'DEC'))])
+def test_planned_grid_encloses_inputs(centers, ctypes):
+    headers = make_headers(centers, ctypes)
+    footprint = get_mosaic_footprint(headers)
+    header = footprint['header']
+    wcs = WCS(header)
+
+    xpix, ypix = [], []
+    for header_input in headers:
+        x, y = wcs.world_to_pixel(get_edge_coordinates(header_input))
+        xpix.append(x)
+        ypix.append(y)
+    xpix, ypix = np.concatenate(xpix), np.concatenate(ypix)
+    assert xpix.min() >= -0.5 - 1e-6 and xpix.max() <= header['NAXIS1'] - 0.5 + 1e-6
+    assert ypix.min() >= -0.5 - 1e-6 and ypix.max() <= header['NAXIS2'] - 0.5 + 1e-6
+
+    #  the inputs span less than 0.1 deg (36 pixels) plus their size, so
+    #  a grid around the wrong side of the sphere would be far larger
+    assert max(footprint['image_size']) < 24 + 36 + 2
+    assert footprint['header']['CTYPE1'].startswith(ctypes[0])
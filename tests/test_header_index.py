@@ -0,0 +1,45 @@
+import os
+
+from astropy.io import fits
+
+from swarp_wrapper import header_index, swarp_helper, swarp_wrapper
+from swarp_wrapper.header_index import HeaderIndex
+
+
+def test_select_overlapping(images, tmp_path):
+    index = HeaderIndex(str(tmp_path / 'index.json'))
+    index.update(images)
+    #  the lower left corner of the first image, which the others do not reach
+    header = fits.getheader(images[0])
+    header['NAXIS1'] = header['NAXIS2'] = 10
+
+    assert index.select_overlapping(header, images) == [images[0]]
+    assert index.select_overlapping(header, images, margin=10) == images
+    #  the entries are reused from the index file
+    assert HeaderIndex(str(tmp_path / 'index.json')).select_overlapping(
+        header) == [images[0]]
+
+
+def test_tiling_uses_indexed_footprints(make_swarp, images, tmp_path,
+                                        monkeypatch):
+    path_header_index = str(tmp_path / 'index.json')
+    HeaderIndex(path_header_index).update(images)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the footprint of an input was computed again")
+    for module in [header_index, swarp_helper, swarp_wrapper]:
+        monkeypatch.setattr(module, 'get_edge_coordinates', fail)
+
+    swarp = make_swarp(list_images=images, path_header_index=path_header_index,
+                       output_grid='wcs', tile_size=16)
+    swarp.mosaic_images()
+    assert os.path.exists(os.path.join(swarp.path_swarp, 'mosaic.fits'))
+
+
+def test_index_is_updated_for_other_edge_sampling(images, tmp_path):
+    path_to_file = str(tmp_path / 'index.json')
+    HeaderIndex(path_to_file, n_edge_points=10).update(images)
+    index = HeaderIndex(path_to_file)
+    assert index.update(images) == len(images)
+    assert len(index.get_footprint(images[0])) == 4 * index.n_edge_points
+
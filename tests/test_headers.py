@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from astropy.io import fits
+
+
+@pytest.mark.parametrize('restore_keys', [True, False])
+def test_cube_keeps_spectral_axis(make_swarp, cubes, restore_keys):
+    swarp = make_swarp(list_cubes=cubes, restore_keys=restore_keys)
+    swarp.mosaic_cubes()
+
+    header = fits.getheader(os.path.join(swarp.path_swarp, 'mosaic.fits'))
+    header_cube = fits.getheader(cubes[0])
+    for key in ['CTYPE3', 'CRVAL3', 'CDELT3', 'CUNIT3', 'BUNIT']:
+        assert header[key] == header_cube[key]
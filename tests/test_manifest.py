@@ -0,0 +1,33 @@
+import os
+
+from swarp_wrapper.manifest import Manifest
+
+
+def test_saves_are_batched(tmp_path):
+    path_to_file = str(tmp_path / 'manifest.json')
+    manifest = Manifest(path_to_file, resume=False, save_interval=60.)
+    for channel in range(100):
+        manifest.set_complete('slices', 'cube.fits', 'abc', [channel])
+    assert not os.path.exists(path_to_file)
+
+    manifest.flush()
+    resumed = Manifest(path_to_file)
+    assert resumed.completed_items('slices', 'cube.fits', 'abc') == set(range(100))
+
+
+def test_save_after_interval(tmp_path):
+    path_to_file = str(tmp_path / 'manifest.json')
+    manifest = Manifest(path_to_file, resume=False, save_interval=0.)
+    manifest.set_complete('swarp', 'channel_0000', 'abc')
+    assert Manifest(path_to_file).is_complete('swarp', 'channel_0000', 'abc')
+
+
+def test_remove_is_not_undone_by_flush(tmp_path):
+    path_to_file = str(tmp_path / 'manifest.json')
+    manifest = Manifest(path_to_file, resume=False, save_interval=60.)
+    manifest.set_complete('swarp', 'channel_0000', 'abc')
+    manifest.save()
+    manifest.set_complete('swarp', 'channel_0001', 'abc')
+    manifest.remove()
+    manifest.flush()
+    assert not os.path.exists(path_to_file)
@@ -0,0 +1,23 @@
+import os
+
+import numpy as np
+
+from astropy.io import fits
+
+
+def test_cubes_in_memory_match_files(make_swarp, cubes):
+    swarp = make_swarp('files', list_cubes=cubes)
+    swarp.mosaic_cubes()
+    with fits.open(os.path.join(swarp.path_swarp, 'mosaic.fits')) as hdul:
+        data, header = hdul[0].data.copy(), hdul[0].header.copy()
+
+    #  HDU objects and (data, header) tuples, mixed with a filepath
+    inputs = [fits.PrimaryHDU(*fits.getdata(cubes[0], header=True)),
+              fits.getdata(cubes[1], header=True), cubes[2]]
+    swarp = make_swarp('memory', list_cubes=inputs, return_hdu='memory')
+    hdu = swarp.mosaic_cubes()
+
+    assert not os.path.exists(os.path.join(swarp.path_swarp, 'mosaic.fits'))
+    assert isinstance(hdu, fits.PrimaryHDU)
+    np.testing.assert_array_equal(hdu.data, data)
+    assert list(hdu.header.items()) == list(header.items())
@@ -0,0 +1,78 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from astropy.io import fits
+
+from swarp_wrapper.native_coadd import get_native_coadd_blocker
+from swarp_wrapper.swarp_helper import read_swarp_configuration
+from swarp_wrapper.swarp_wrapper import Swarp
+
+
+@pytest.fixture(scope='module')
+def aligned_cubes_with_nans(aligned_cubes, tmp_path_factory):
+    """Copies of the aligned cubes with blank regions, partly overlapping between the cubes."""
+    path_data = tmp_path_factory.mktemp('aligned_cubes_with_nans')
+    blanks = [(slice(1, 3), slice(4, 12), slice(12, 24)),
+              (slice(2, 3), slice(4, 12), slice(0, 6)),
+              None]
+    list_cubes = []
+    for path_to_cube, blank in zip(aligned_cubes, blanks):
+        with fits.open(path_to_cube) as hdul:
+            data, header = hdul[0].data.copy(), hdul[0].header
+        if blank is not None:
+            data[blank] = np.nan
+        list_cubes.append(str(path_data / os.path.basename(path_to_cube)))
+        fits.writeto(list_cubes[-1], data, header)
+    return list_cubes
+
+
+def test_native_coadd_matches_swarp(make_swarp, aligned_cubes_with_nans,
+                                    monkeypatch):
+    mosaics = []
+    headers = []
+    for name, native_coadd in [('native', True), ('swarp', False)]:
+        swarp = make_swarp(name, list_cubes=aligned_cubes_with_nans,
+                           native_coadd=native_coadd,
+                           remove_temporary_files=False)
+        if not native_coadd:
+            #  SWarp co-adds onto the output grid of the native co-add
+            monkeypatch.setattr(
+                Swarp, 'create_output_grid_template',
+                lambda self, path_root, list_paths, inputs:
+                    self.write_mosaic_grid_template(headers[0], path_root))
+            swarp.output_grid = 'swarp'
+        swarp.mosaic_cubes()
+        #  only the native co-add writes no swarped channel maps
+        assert bool(glob.glob(os.path.join(
+            swarp.path_swarp, '**', '*_channel_*.fits'),
+            recursive=True)) != native_coadd
+        mosaics.append([fits.getdata(os.path.join(swarp.path_swarp, filename))
+                        for filename in ['mosaic.fits', 'mosaic.coadd.weight.fits']])
+        headers.append(fits.getheader(os.path.join(swarp.path_swarp, 'mosaic.fits')))
+    (data_native, weights_native), (data_swarp, weights_swarp) = mosaics
+
+    for key in ['NAXIS1', 'NAXIS2', 'CRPIX1', 'CRPIX2', 'CRVAL1', 'CRVAL2']:
+        assert headers[1][key] == headers[0][key]
+
+    #  covered pixels without valid data and uncovered pixels are part of the comparison
+    assert np.isnan(data_swarp).any()
+    assert (weights_swarp == 0).any() and (data_swarp == 0).any()
+    np.testing.assert_array_equal(data_native, data_swarp)
+    np.testing.assert_array_equal(weights_native, weights_swarp)
+
+
+@pytest.mark.parametrize('settings, reason', [
+    ({}, None),
+    ({'RESAMPLE': 'N'}, "RESAMPLE is not set"),
+    ({'RESAMPLING_TYPE': 'LANCZOS3'}, "RESAMPLING_TYPE is LANCZOS3"),
+    ({'RESAMPLING_TYPE': ''}, "RESAMPLING_TYPE is LANCZOS3"),
+    ({'COMBINE_TYPE': 'MEDIAN'}, "COMBINE_TYPE is MEDIAN"),
+    ({'CENTER_TYPE': 'MANUAL'}, "CENTER_TYPE is MANUAL")])
+def test_native_coadd_blocker(configuration_file, aligned_cubes, settings,
+                              reason):
+    configuration = dict(read_swarp_configuration(configuration_file), **settings)
+    header = fits.getheader(aligned_cubes[0])
+    assert get_native_coadd_blocker(configuration, header) == reason
@@ -0,0 +1,43 @@
+import threading
+
+import numpy as np
+
+from astropy.io import fits
+
+from swarp_wrapper.swarp_wrapper import Swarp
+
+
+def test_pipeline_stops_if_assembly_fails(make_swarp, cubes, monkeypatch):
+    def fail(self, idx, filename):
+        raise RuntimeError("assembly failed")
+    monkeypatch.setattr(Swarp, 'assemble_channel', fail)
+
+    swarp = make_swarp(list_cubes=cubes, pipeline=True, queue_depth=1,
+                       n_workers=2)
+    threads = set(threading.enumerate())
+    outcome = {}
+
+    def run():
+        try:
+            swarp.mosaic_cubes()
+        except RuntimeError as error:
+            outcome['error'] = error
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=120)
+    assert not thread.is_alive(), "the pipeline did not stop"
+    assert 'assembly failed' in str(outcome['error'])
+    #  no slicing or SWarp thread is left behind (tqdm runs its own monitor)
+    assert [thread for thread in set(threading.enumerate()) - threads
+            if thread.name != 'tqdm_monitor'] == []
+
+
+def test_pipeline_matches_stages(make_swarp, cubes):
+    data = []
+    for name, pipeline in [('stages', False), ('pipeline', True)]:
+        swarp = make_swarp(name, list_cubes=cubes, pipeline=pipeline,
+                           n_workers=2, queue_depth=1)
+        swarp.mosaic_cubes()
+        data.append(fits.getdata('{}/mosaic.fits'.format(swarp.path_swarp)))
+    np.testing.assert_array_equal(data[0], data[1])
@@ -0,0 +1,33 @@
+import os
+import time
+
+from swarp_wrapper.slice_cache import SliceCache
+
+
+def write_entry(cache, path_to_cube, size):
+    path_entry = cache.get_entry(path_to_cube)
+    with open(os.path.join(path_entry, 'slice.fits'), 'wb') as fobj:
+        fobj.write(b'\0' * size)
+    return path_entry
+
+
+def test_evict_ignores_stray_files(tmp_path):
+    cubes = []
+    for idx in range(3):
+        path_to_cube = str(tmp_path / 'cube_{}.fits'.format(idx))
+        open(path_to_cube, 'w').close()
+        cubes.append(path_to_cube)
+
+    cache = SliceCache(str(tmp_path / 'cache'), max_size=2500)
+    entries = []
+    for path_to_cube in cubes:
+        entries.append(write_entry(cache, path_to_cube, 1000))
+        time.sleep(0.01)
+    for filename in ['.DS_Store', 'cache.lock']:
+        with open(os.path.join(cache.path_cache, filename), 'w') as fobj:
+            fobj.write('stray')
+
+    assert cache.evict(keep=[entries[-1]]) == 1
+    assert not os.path.exists(entries[0])
+    assert os.path.exists(entries[1]) and os.path.exists(entries[2])
+    assert os.path.exists(os.path.join(cache.path_cache, 'cache.lock'))
@@ -0,0 +1,103 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from astropy.io import fits
+from astropy.wcs import WCS
+
+from swarp_wrapper.fits_io_functions import get_padded_size
+from swarp_wrapper.swarp_helper import get_bounding_box
+from swarp_wrapper.swarp_wrapper import CubeSlicer, get_slice_filename
+
+
+@pytest.fixture(scope='module')
+def cubes_of_different_lengths(cubes, tmp_path_factory):
+    """A cube with 6 channels and a cube with only the first 2 of its channels."""
+    path_data = tmp_path_factory.mktemp('cubes_of_different_lengths')
+    data, header = fits.getdata(cubes[1], header=True)
+    header['NAXIS3'] = 2
+    path_short = str(path_data / 'short_cube.fits')
+    fits.writeto(path_short, data[:2], header)
+    return [cubes[0], path_short]
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_skipped_channels_are_reported(make_swarp, cubes_of_different_lengths,
+                                       pipeline):
+    swarp = make_swarp(list_cubes=cubes_of_different_lengths, pipeline=pipeline,
+                       remove_temporary_files=False)
+    swarp.mosaic_cubes()
+
+    paths = glob.glob(os.path.join(swarp.path_channels, '*.fits'))
+    assert len(paths) == 6 + 2
+    assert swarp.scratch_bytes['written'] == sum(
+        os.path.getsize(path) for path in paths)
+
+    #  the 4 channels beyond the short cube were formerly written as
+    #  float64 planes of NaN values (with the header of a slice)
+    size_header = os.path.getsize(paths[0]) - get_padded_size(24 * 24 * 4)
+    assert swarp.scratch_bytes['uncompacted'] - swarp.scratch_bytes['written'] == \
+        4 * (size_header + get_padded_size(24 * 24 * 8))
+
+
+@pytest.fixture(scope='module')
+def cube_with_blank_borders(cubes, tmp_path_factory):
+    """A cube with blank rows and columns at its borders and an all-NaN channel 2."""
+    data, header = fits.getdata(cubes[0], header=True)
+    data[:, :3] = np.nan
+    data[:, :, 19:] = 0
+    data[2] = np.nan
+    path_to_cube = str(tmp_path_factory.mktemp('blank_borders') / 'cube.fits')
+    fits.writeto(path_to_cube, data, header)
+    return path_to_cube
+
+
+def write_slices(path_to_cube, path_channels, stream, crop, channel_range=(0, 6)):
+    """Slice a cube and return the data and header of its first slice and the crop box."""
+    parameters = {'change_header': {'format': 'pp', 'keep_axis': '1'},
+                  'dtype': 'float32', 'compress': False, 'crop': crop,
+                  'channel_range': channel_range, 'binning': 1}
+    os.makedirs(path_channels)
+    slicer = CubeSlicer(path_to_cube, stream=stream, parameters=parameters)
+    for channel in slicer.channels:
+        slicer.write_channel(channel, path_channels)
+    slicer.close()
+    data, header = fits.getdata(os.path.join(
+        path_channels, get_slice_filename(path_to_cube, 0)), header=True)
+    return data, header, slicer.crop_box
+
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_cropped_slices_keep_world_coordinates(cube_with_blank_borders, tmp_path,
+                                               stream):
+    data, header, _ = write_slices(
+        cube_with_blank_borders, str(tmp_path / 'full'), stream, crop=False)
+    data_cropped, header_cropped, crop_box = write_slices(
+        cube_with_blank_borders, str(tmp_path / 'cropped'), stream, crop=True)
+
+    #  the all-NaN channel does not shrink the bounding box of the others
+    ymin, ymax, xmin, xmax = crop_box
+    assert crop_box == (3, 24, 0, 19)
+    np.testing.assert_array_equal(data_cropped, data[ymin:ymax, xmin:xmax])
+
+    ny, nx = data_cropped.shape
+    corners = np.array([[0, 0], [nx - 1, 0], [0, ny - 1], [nx - 1, ny - 1]])
+    np.testing.assert_allclose(
+        WCS(header_cropped).celestial.all_pix2world(corners, 0),
+        WCS(header).celestial.all_pix2world(corners + [xmin, ymin], 0),
+        rtol=0, atol=1e-10)
+
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_crop_of_blank_channel(cube_with_blank_borders, tmp_path, stream):
+    assert get_bounding_box(np.zeros((24, 24), dtype=bool)) is None
+
+    #  a channel range with only the all-NaN channel is sliced uncropped
+    data, header, crop_box = write_slices(
+        cube_with_blank_borders, str(tmp_path / 'channels'), stream, crop=True,
+        channel_range=(2, 3))
+    assert crop_box is None
+    assert data.shape == (24, 24)
+    assert np.all(np.isnan(data))
@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pytest
+
+from astropy.io import fits
+from astropy.wcs import WCS
+
+from swarp_wrapper.benchmark.synthetic import make_header
+from swarp_wrapper.fits_header_functions import get_channel_range, select_spectral_channels
+from swarp_wrapper.swarp_wrapper import CubeSlicer, bin_channels
+
+
+def make_cube_header(n_channels=10, v_start=-50e3, dv=500.):
+    return make_header((30., 0.), 4, n_channels=n_channels, v_start=v_start,
+                       dv=dv)
+
+
+def get_channel_velocities(header):
+    return WCS(header).spectral.pixel_to_world_values(
+        np.arange(header['NAXIS3']))
+
+
+@pytest.mark.parametrize('spectral_range, channels', [
+    ((None, None), (0, 10)),
+    ((2, None), (2, 10)),
+    ((None, 4), (0, 4)),
+    ((-3, 100), (0, 10))])
+def test_channel_range_in_channels(spectral_range, channels):
+    assert get_channel_range(make_cube_header(), spectral_range) == channels
+
+
+@pytest.mark.parametrize('dv, v_start', [(500., -50e3), (-500., -45.5e3)])
+@pytest.mark.parametrize('spectral_range, velocities', [
+    #  channels whose centers lie on the limits are included
+    ((-49., -48.), [-49e3, -48.5e3, -48e3]),
+    ((-48., -49.), [-49e3, -48.5e3, -48e3]),
+    ((-48.9, -48.1), [-48.5e3]),
+    ((-100., 0.), np.arange(-50e3, -45e3, 500.))])
+def test_channel_range_in_velocity(dv, v_start, spectral_range, velocities):
+    #  the same channels of an ascending and a descending spectral axis
+    header = make_cube_header(v_start=v_start, dv=dv)
+    start, stop = get_channel_range(header, spectral_range, unit='km/s')
+    np.testing.assert_allclose(
+        sorted(get_channel_velocities(header)[start:stop]), velocities)
+
+
+@pytest.mark.parametrize('spectral_range', [
+    (10., 20.), (-60., -55.),
+    #  between the centers of two channels
+    (-49.9, -49.6)])
+def test_channel_range_without_channels(spectral_range):
+    start, stop = get_channel_range(
+        make_cube_header(), spectral_range, unit='km/s')
+    assert stop <= start
+
+
+@pytest.mark.parametrize('dv', [500., -500.])
+@pytest.mark.parametrize('cd', [False, True])
+def test_select_spectral_channels(dv, cd):
+    header = make_cube_header(dv=dv)
+    if cd:
+        header.rename_keyword('CDELT3', 'CD3_3')
+    velocities = get_channel_velocities(header)
+
+    header = select_spectral_channels(header, 2, 2, binning=3)
+    assert header['NAXIS3'] == 2
+    assert header['CD3_3' if cd else 'CDELT3'] == 3 * dv
+    #  the centers of the binned channels 2-4 and 5-7
+    np.testing.assert_allclose(get_channel_velocities(header),
+                               [velocities[2:5].mean(), velocities[5:8].mean()])
+
+
+def test_bin_channels():
+    data = np.array([[1., 2.], [3., np.nan], [5., np.nan]])
+    np.testing.assert_array_equal(bin_channels(data), [3., 2.])
+    assert np.isnan(bin_channels(np.full((3, 2), np.nan))).all()
+
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_incomplete_bin_is_left_out(tmp_path, stream):
+    header = make_cube_header()
+    data = np.arange(10 * 4 * 4, dtype=np.float32).reshape(10, 4, 4)
+    data[4, 0, 0] = np.nan
+    path_to_cube = str(tmp_path / 'cube.fits')
+    fits.writeto(path_to_cube, data, header)
+
+    #  channels 1-3 and 4-6 of the range 1-7, channel 7 is left out
+    parameters = {'change_header': {'format': 'pp', 'keep_axis': '1'},
+                  'dtype': 'float32', 'compress': False, 'crop': False,
+                  'channel_range': (1, 8), 'binning': 3}
+    slicer = CubeSlicer(path_to_cube, stream=stream, parameters=parameters)
+    assert list(slicer.channels) == [0, 1]
+    np.testing.assert_array_equal(slicer.read_channel(0), data[1:4].mean(axis=0))
+    np.testing.assert_array_equal(slicer.read_channel(1),
+                                  np.nanmean(data[4:7], axis=0))
+    assert slicer.header['NAXIS3'] == 2
+    np.testing.assert_allclose(get_channel_velocities(slicer.header),
+                               [-49e3, -47.5e3])
+    slicer.close()
+
+
+def test_cubes_offset_by_one_and_a_half_channels(make_swarp, aligned_cubes,
+                                                 tmp_path):
+    data, header = fits.getdata(aligned_cubes[1], header=True)
+    header['CRVAL3'] += 1.5 * header['CDELT3']
+    path_shifted = str(tmp_path / 'shifted_cube.fits')
+    fits.writeto(path_shifted, data, header)
+
+    swarp = make_swarp(list_cubes=[aligned_cubes[0], path_shifted],
+                       align_spectral_axis=True,
+                       save_weighted_coaddition_map=True)
+    swarp.mosaic_cubes()
+
+    #  the grid covers the channels 0-5 of the first cube and the positions
+    #  1.5-6.5 of the shifted cube, which is interpolated onto the channels 2-6
+    weights = fits.getdata(swarp.get_weight_cube_filename())
+    np.testing.assert_array_equal(weights.sum(axis=(1, 2)),
+                                  [576, 576, 1152, 1152, 1152, 1152, 576])
+    header_mosaic = fits.getheader(os.path.join(swarp.path_swarp, 'mosaic.fits'))
+    np.testing.assert_allclose(get_channel_velocities(header_mosaic),
+                               get_channel_velocities(make_cube_header(7)))
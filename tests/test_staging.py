@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from swarp_wrapper.staging import DiskStaging, MemoryStaging, get_staging
+
+
+def test_tmpfs_staging(tmp_path):
+    path_tmpfs = tmp_path / 'tmpfs'
+    path_tmpfs.mkdir()
+    staging, message = get_staging('tmpfs', str(tmp_path / 'mosaic'), 1024,
+                                   path_tmpfs=str(path_tmpfs))
+    assert isinstance(staging, MemoryStaging)
+    assert staging.path_root.startswith(str(path_tmpfs))
+
+
+def test_fallback_if_tmpfs_is_missing(tmp_path):
+    path_swarp = str(tmp_path / 'mosaic')
+    staging, message = get_staging('tmpfs', path_swarp, 1024,
+                                   path_tmpfs=str(tmp_path / 'missing'))
+    assert type(staging) is DiskStaging
+    assert staging.path_root == path_swarp
+    assert 'does not exist or is not writable' in message
+    assert 'memory budget' not in message
+
+
+def test_fallback_if_tmpfs_is_not_writable(tmp_path):
+    path_tmpfs = tmp_path / 'tmpfs'
+    path_tmpfs.mkdir(mode=0o500)
+    if os.access(str(path_tmpfs), os.W_OK):
+        pytest.skip("permissions are not enforced (e.g. for root)")
+    staging, message = get_staging('tmpfs', str(tmp_path / 'mosaic'), 1024,
+                                   path_tmpfs=str(path_tmpfs))
+    assert type(staging) is DiskStaging
+    assert 'does not exist or is not writable' in message
+
+
+def test_fallback_if_memory_budget_is_exceeded(tmp_path):
+    path_tmpfs = tmp_path / 'tmpfs'
+    path_tmpfs.mkdir()
+    path_swarp = str(tmp_path / 'mosaic')
+    staging, message = get_staging('tmpfs', path_swarp, 2 * 1024**2,
+                                   path_tmpfs=str(path_tmpfs),
+                                   memory_budget=1024**2)
+    assert type(staging) is DiskStaging
+    assert staging.path_root == path_swarp
+    assert 'exceed the memory budget' in message
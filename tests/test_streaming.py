@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+from astropy.io import fits
+
+from swarp_wrapper.benchmark.synthetic import make_dataset
+
+
+@pytest.fixture(scope='module')
+def short_cubes(tmp_path_factory):
+    return make_dataset(str(tmp_path_factory.mktemp('short_cubes')),
+                        kind='cubes', n_inputs=3, size=24, n_channels=3)
+
+
+@pytest.fixture(scope='module')
+def stokes_cubes(short_cubes, tmp_path_factory):
+    """Copies of the cubes with a degenerate Stokes axis."""
+    path_data = tmp_path_factory.mktemp('stokes_cubes')
+    list_cubes = []
+    for path_to_cube in short_cubes:
+        data, header = fits.getdata(path_to_cube, header=True)
+        header['NAXIS'] = 4
+        header.insert('NAXIS3', ('NAXIS4', 1), after=True)
+        header['CTYPE4'] = 'STOKES'
+        header['CRVAL4'] = 1.
+        header['CDELT4'] = 1.
+        header['CRPIX4'] = 1.
+        list_cubes.append(str(path_data / os.path.basename(path_to_cube)))
+        fits.writeto(list_cubes[-1], data[np.newaxis], header)
+    return list_cubes
+
+
+def read_mosaic(swarp):
+    with fits.open(os.path.join(swarp.path_swarp, 'mosaic.fits')) as hdul:
+        return hdul[0].data.copy(), hdul[0].header.copy()
+
+
+@pytest.fixture(scope='module')
+def reference_mosaics(swarp_factory, short_cubes, stokes_cubes,
+                      tmp_path_factory):
+    """Mosaics of the cubes without streaming, by kind of input."""
+    mosaics = {}
+    for kind, list_cubes in [('short_cubes', short_cubes),
+                             ('stokes_cubes', stokes_cubes)]:
+        swarp = swarp_factory(tmp_path_factory.mktemp(kind), list_cubes=list_cubes,
+                              stream_slicing=False, stream_assembly=False)
+        swarp.mosaic_cubes()
+        mosaics[kind] = read_mosaic(swarp)
+    return mosaics
+
+
+@pytest.mark.parametrize('kind', ['short_cubes', 'stokes_cubes'])
+@pytest.mark.parametrize('stream_slicing', [True, False])
+@pytest.mark.parametrize('stream_assembly', [True, False])
+def test_streaming_matches_in_memory(make_swarp, request, reference_mosaics,
+                                     kind, stream_slicing, stream_assembly):
+    swarp = make_swarp(list_cubes=request.getfixturevalue(kind),
+                       stream_slicing=stream_slicing,
+                       stream_assembly=stream_assembly)
+    swarp.mosaic_cubes()
+    data, header = read_mosaic(swarp)
+
+    data_reference, header_reference = reference_mosaics[kind]
+    np.testing.assert_array_equal(data, data_reference)
+    assert list(header.items()) == list(header_reference.items())
@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pytest
+
+from astropy.io import fits
+
+
+def read_mosaic(swarp):
+    path_to_file = os.path.join(swarp.path_swarp, 'mosaic.fits')
+    with fits.open(path_to_file) as hdul:
+        hdul.verify('exception')
+        return hdul[0].data.copy()
+
+
+def test_tiled_images_wcs(make_swarp, images):
+    #  a single tile covering the output grid is swarped onto the same
+    #  header template as the tiles
+    data = []
+    for name, tile_size in [('single', 1000), ('tiled', 16)]:
+        swarp = make_swarp(name, list_images=images, output_grid='wcs',
+                           tile_size=tile_size)
+        swarp.mosaic_images()
+        data.append(read_mosaic(swarp))
+    np.testing.assert_array_equal(data[0], data[1])
+
+
+@pytest.mark.parametrize('stream_assembly', [False, True])
+def test_tiled_cubes_wcs(make_swarp, cubes, stream_assembly):
+    data = []
+    for name, tile_size in [('single', None), ('tiled', 24)]:
+        swarp = make_swarp(name, list_cubes=cubes, output_grid='wcs',
+                           tile_size=tile_size, stream_assembly=stream_assembly,
+                           n_workers=4)
+        swarp.mosaic_cubes()
+        data.append(read_mosaic(swarp))
+    np.testing.assert_array_equal(data[0], data[1])